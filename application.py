@@ -1,23 +1,27 @@
+import time
+
 import numpy as np
-import pandas as pd
-from flask import Flask, request, render_template
+from flask import Flask, Response, g, request, render_template, jsonify
 
 # Import your custom classes from the prediction pipeline
-from src.pipeline.prediction_pipeline import CustomData, PredictPipeline
+from src.pipeline.prediction_pipeline import (
+    CustomData, PredictPipeline, PredictPipelineConfig, build_batch_frame, build_raw_batch_frame,
+)
+from src.pipeline.artifact_store import get_artifact_store
+from src.distance_cache import get_distance_cache
 from src.exception import customException
-from src.logger import logging
+from src.logger import logging, log_payload
+from src.metrics import REGISTRY, REQUESTS, REQUEST_LATENCY, stage_timer
 
-application = Flask(__name__)
-app = application
+# Largest number of orders accepted in one /api/v1/predict/batch call
+MAX_BATCH_SIZE = 10000
 
-# Route for the main welcome page (index.html)
-@app.route('/')
+# Main welcome page (index.html)
 def index():
     return render_template('index.html')
 
-# Route for the prediction form (home.html)
+# Prediction form (home.html)
 # This route handles both GET (showing the form) and POST (submitting the form)
-@app.route('/home', methods=['GET', 'POST'])
 def home():
     if request.method == 'GET':
         # Just show the form page
@@ -26,34 +30,12 @@ def home():
         # This is a POST request, so we process the form data
         try:
             
-            data = CustomData(
-                Agent_Age=float(request.form.get('Agent_Age')),
-                Agent_Rating=float(request.form.get('Agent_Rating')),
-                Weather=str(request.form.get('Weather')),
-                Traffic=str(request.form.get('Traffic')),
-                Vehicle=str(request.form.get('Vehicle')),
-                Area=str(request.form.get('Area')),
-                Category=str(request.form.get('Category')),
-                Distance_km=float(request.form.get('Distance_km')),
-                Order_Year=float(request.form.get('Order_Year')),
-                Order_Month=float(request.form.get('Order_Month')),
-                Order_Day=float(request.form.get('Order_Day')),
-                day_of_week=str(request.form.get('day_of_week')),
-                Order_Hour=float(request.form.get('Order_Hour')),
-                Order_Minute=float(request.form.get('Order_Minute')),
-                part_of_day=str(request.form.get('part_of_day')),
-                Pickup_Hour=float(request.form.get('Pickup_Hour')),
-                Pickup_Minute=float(request.form.get('Pickup_Minute')),
-                Total_preparation_time=float(request.form.get('Total_preparation_time'))
-            )
+            with stage_timer("parse_form"):
+                data = CustomData.from_mapping(request.form)
+            log_payload("New prediction input data", data)
 
-            
-            pred_df = data.get_data_as_data_frame()
-            logging.info(f"New prediction input data: {pred_df.to_dict()}")
-            
-            
             predict_pipeline = PredictPipeline()
-            prediction_hours = predict_pipeline.predict(pred_df)
+            prediction_hours = predict_pipeline.predict_record(data)
             
             # Convert prediction to minutes
             prediction_minutes = round(prediction_hours * 60, 2)
@@ -68,6 +50,199 @@ def home():
             raise customException(e)
 
 
+def score_orders(orders, raw=False):
+    '''
+    Validates and scores a list of orders with a single transform/predict.
+    With `raw` the orders are raw (coordinates, dates, times) and their
+    features are engineered for the whole batch first.
+    Returns one result per order, in input order: either the prediction
+    in minutes or the reason the order was rejected.
+    '''
+    with stage_timer("validate"):
+        if raw:
+            features, valid_positions, errors = build_raw_batch_frame(orders, get_distance_cache())
+        else:
+            features, valid_positions, errors = build_batch_frame(orders)
+
+    results = [None] * len(orders)
+    if valid_positions:
+        predictions_hours = PredictPipeline().predict_batch(features)
+        predictions_minutes = np.round(predictions_hours * 60, 2)
+        for position, minutes in zip(valid_positions, predictions_minutes.tolist()):
+            results[position] = {"index": position, "delivery_time_minutes": minutes}
+
+    for position, message in errors.items():
+        results[position] = {"index": position, "error": message}
+
+    return results
+
+
+# JSON API for a single order: the body is one object with the 18 CustomData fields
+def api_predict():
+    order = request.get_json(silent=True)
+    log_payload("API prediction input data", order)
+    if not isinstance(order, dict):
+        return jsonify({"error": "request body must be a JSON object"}), 400
+
+    try:
+        result = score_orders([order])[0]
+    except Exception as e:
+        logging.error("Error occurred in /api/v1/predict route")
+        raise customException(e)
+
+    if "error" in result:
+        return jsonify({"error": result["error"]}), 400
+    return jsonify({"delivery_time_minutes": result["delivery_time_minutes"]})
+
+
+# JSON API for many orders: {"orders": [...]} or a bare list.
+# Bad rows are reported individually instead of failing the batch.
+def api_predict_batch():
+    payload = request.get_json(silent=True)
+    orders = payload.get("orders") if isinstance(payload, dict) else payload
+    if not isinstance(orders, list):
+        return jsonify({"error": "request body must be a list of orders or {\"orders\": [...]}"}), 400
+    if len(orders) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"batch too large, at most {MAX_BATCH_SIZE} orders per request"}), 413
+
+    try:
+        results = score_orders(orders)
+    except Exception as e:
+        logging.error("Error occurred in /api/v1/predict/batch route")
+        raise customException(e)
+
+    n_errors = sum(1 for result in results if "error" in result)
+    return jsonify({
+        "predictions": results,
+        "n_orders": len(results),
+        "n_errors": n_errors,
+    })
+
+
+# JSON API for raw orders as they come from the order system: coordinates,
+# Order_Date, Order_Time, Pickup_Time, ... (see RAW_ORDER_FIELDS). Distance,
+# date and time features are computed server-side, batch-wide.
+# {"orders": [...]}, a bare list, or a single object.
+def api_predict_raw():
+    payload = request.get_json(silent=True)
+    single = isinstance(payload, dict) and "orders" not in payload
+    orders = [payload] if single else payload.get("orders") if isinstance(payload, dict) else payload
+    if not isinstance(orders, list):
+        return jsonify({"error": "request body must be an order, a list of orders or {\"orders\": [...]}"}), 400
+    if len(orders) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"batch too large, at most {MAX_BATCH_SIZE} orders per request"}), 413
+
+    try:
+        results = score_orders(orders, raw=True)
+    except Exception as e:
+        logging.error("Error occurred in /api/v1/predict/raw route")
+        raise customException(e)
+
+    n_errors = sum(1 for result in results if "error" in result)
+    return jsonify({
+        "predictions": results,
+        "n_orders": len(results),
+        "n_errors": n_errors,
+    })
+
+
+# Queue depth and batch sizes of the single-order micro-batcher
+def micro_batching_stats():
+    return jsonify(PredictPipeline().micro_batcher().stats())
+
+
+# Hit rate and quantization error of the raw-order distance cache
+def distance_cache_stats():
+    cache = get_distance_cache()
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(cache.stats(), enabled=True))
+
+
+# Hit rate and deviation of the ETA lookup table (PREDICT_ETA_TABLE=1)
+def eta_table_stats():
+    pipeline = PredictPipeline()
+    if not pipeline.predict_config.eta_table:
+        return jsonify({"enabled": False})
+    table = get_artifact_store().get().eta_table
+    if table is None:
+        return jsonify({"enabled": False, "reason": "no ETA table built for the loaded artifacts"})
+    return jsonify(dict(table.stats(), enabled=True))
+
+
+# Liveness: the process is up and serving requests
+def healthz():
+    return jsonify({"status": "ok"})
+
+
+# Readiness: only OK once the model and preprocessor are loaded, so a load
+# balancer does not send traffic to a worker that would block on unpickling
+def readyz():
+    store = get_artifact_store()
+    if not store.is_loaded:
+        store.warm_in_background()
+        return jsonify({"status": "loading"}), 503
+    bundle = store.get()
+    return jsonify({"status": "ready", "artifacts_version": bundle.version, "loaded_at": bundle.loaded_at})
+
+
+# Prometheus text format; each gunicorn worker reports its own counters
+def metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+def record_request(response):
+    # Route pattern, not the raw path, so label values stay bounded
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    started = g.get("request_started")
+    if started is not None:
+        REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint)
+    return response
+
+
+def create_app(preload_artifacts=False):
+    '''
+    Builds the Flask app. With `preload_artifacts` the model and
+    preprocessor are loaded (and warmed up) right here, which under
+    gunicorn's preload_app happens once in the master before the workers
+    are forked (see gunicorn.conf.py).
+    '''
+    app = Flask(__name__)
+
+    app.add_url_rule('/', 'index', index)
+    app.add_url_rule('/home', 'home', home, methods=['GET', 'POST'])
+    app.add_url_rule('/api/v1/predict', 'api_predict', api_predict, methods=['POST'])
+    app.add_url_rule('/api/v1/predict/batch', 'api_predict_batch', api_predict_batch, methods=['POST'])
+    app.add_url_rule('/api/v1/predict/raw', 'api_predict_raw', api_predict_raw, methods=['POST'])
+    app.add_url_rule('/api/v1/stats/micro-batching', 'micro_batching_stats', micro_batching_stats, methods=['GET'])
+    app.add_url_rule('/api/v1/stats/distance-cache', 'distance_cache_stats', distance_cache_stats, methods=['GET'])
+    app.add_url_rule('/api/v1/stats/eta-table', 'eta_table_stats', eta_table_stats, methods=['GET'])
+    app.add_url_rule('/healthz', 'healthz', healthz, methods=['GET'])
+    app.add_url_rule('/readyz', 'readyz', readyz, methods=['GET'])
+    app.add_url_rule('/metrics', 'metrics', metrics, methods=['GET'])
+
+    app.before_request(start_request_timer)
+    app.after_request(record_request)
+
+    if preload_artifacts:
+        # Build the compiled encoder / flat model only if the config uses them
+        predict_config = PredictPipelineConfig()
+        get_artifact_store().preload(encoder=predict_config.encoder == "compiled",
+                                     flat_model=predict_config.backend == "flat")
+
+    return app
+
+
+# Module-level app for `flask run` and existing `application:application` setups
+application = create_app()
+app = application
+
+
 if __name__ == "__main__":
     
     app.run(host="0.0.0.0", port=5002, debug=True)
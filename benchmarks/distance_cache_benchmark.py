@@ -0,0 +1,68 @@
+'''
+Distance cache benchmark: exact vectorized Haversine vs the geo-cell cache.
+
+    python -m benchmarks.distance_cache_benchmark
+    python -m benchmarks.distance_cache_benchmark --rows 1000000 --cells 0.0001 0.001
+
+Orders are synthesized the way the real data clusters: a few hundred store
+locations, each with a pool of repeat drop locations (plus GPS jitter
+smaller than a cell). Each run streams the orders in request-sized batches
+through one cache and reports hit rate, max error against the exact
+Haversine_distance and time per batch.
+'''
+import time
+import argparse
+
+import numpy as np
+
+from src.distance_cache import DistanceCache, DistanceCacheConfig
+from src.features import Haversine_distance_vectorized
+
+
+def make_clustered_orders(n_rows, n_stores=300, drops_per_store=200, jitter_degrees=0.00002, seed=42):
+    rng = np.random.default_rng(seed)
+    store_lat = rng.uniform(9.0, 31.0, n_stores)
+    store_long = rng.uniform(72.0, 89.0, n_stores)
+    drop_lat = store_lat[:, None] + rng.uniform(-0.2, 0.2, (n_stores, drops_per_store))
+    drop_long = store_long[:, None] + rng.uniform(-0.2, 0.2, (n_stores, drops_per_store))
+
+    store = rng.integers(0, n_stores, n_rows)
+    drop = rng.integers(0, drops_per_store, n_rows)
+    jitter = rng.uniform(-jitter_degrees, jitter_degrees, (4, n_rows))
+    return (store_lat[store] + jitter[0], store_long[store] + jitter[1],
+            drop_lat[store, drop] + jitter[2], drop_long[store, drop] + jitter[3])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare exact and geo-cell cached distances.")
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--cells", type=float, nargs="+", default=[0.0001, 0.001])
+    args = parser.parse_args(argv)
+
+    orders = make_clustered_orders(args.rows)
+    batches = [tuple(column[start:start + args.batch_size] for column in orders)
+               for start in range(0, args.rows, args.batch_size)]
+
+    start = time.perf_counter()
+    for batch in batches:
+        Haversine_distance_vectorized(*batch)
+    exact_us = 1e6 * (time.perf_counter() - start) / len(batches)
+    print(f"{args.rows} orders in batches of {args.batch_size}: exact {exact_us:.1f} us/batch")
+
+    print(f"{'cell (deg)':>10} {'us/batch':>9} {'hit rate':>9} {'max err (m)':>12} {'bound (m)':>10} {'entries':>8}")
+    for cell_degrees in args.cells:
+        cache = DistanceCache(DistanceCacheConfig(cell_degrees=cell_degrees))
+        cache.register_stores(orders[0], orders[1])
+        start = time.perf_counter()
+        for batch in batches:
+            cache.distances(*batch)
+        cached_us = 1e6 * (time.perf_counter() - start) / len(batches)
+        stats = cache.stats()
+        error_km = cache.measure_error(*orders)
+        print(f"{cell_degrees:>10} {cached_us:>9.1f} {stats['hit_rate']:>9.3f} {1000 * error_km:>12.2f} "
+              f"{1000 * cache.error_bound_km:>10.2f} {stats['entries']:>8}")
+
+
+if __name__ == "__main__":
+    main()
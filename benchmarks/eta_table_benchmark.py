@@ -0,0 +1,80 @@
+'''
+ETA lookup table vs the model, on the held-out orders.
+
+    python -m src.components.eta_table_builder   # once per model
+    python -m benchmarks.eta_table_benchmark
+    python -m benchmarks.eta_table_benchmark --orders 500
+
+Scores artifacts/test.csv through PredictPipeline.predict_batch with and
+without the table (hit rate, deviation from the model on the hits), then
+times single-order predict_records calls for orders the table answers,
+orders it does not, and the same orders on the model alone.
+'''
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from src.components.feature_columns import TARGET_COLUMN
+from src.pipeline.prediction_pipeline import CustomData, PredictPipeline, PredictPipelineConfig
+
+
+def single_order_ms(pipeline, records):
+    pipeline.predict_records(records[:1])
+    timings = []
+    for record in records:
+        start = time.perf_counter()
+        pipeline.predict_records([record])
+        timings.append(time.perf_counter() - start)
+    timings = 1000 * np.asarray(timings)
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ETA lookup table benchmark.")
+    parser.add_argument("--test-data", default="artifacts/test.csv")
+    parser.add_argument("--orders", type=int, default=300, help="single orders timed per case")
+    args = parser.parse_args(argv)
+
+    features = pd.read_csv(args.test_data).drop(columns=[TARGET_COLUMN], errors="ignore")
+    model_only = PredictPipeline(config=PredictPipelineConfig(eta_table=False, micro_batching=False))
+    with_table = PredictPipeline(config=PredictPipelineConfig(eta_table=True, micro_batching=False,
+                                                              eta_table_audit_every=0))
+    table = with_table.artifact_store.get().eta_table
+    if table is None:
+        raise SystemExit("No ETA table for the current artifacts; run python -m src.components.eta_table_builder")
+
+    # === 1. HIT RATE AND DEVIATION ON THE WHOLE SET ===
+    # Warm-up: unpickling and the model's first call are not part of it
+    model_only.predict_batch(features.head(100))
+    with_table.predict_batch(features.head(100))
+    start = time.perf_counter()
+    model_predictions = model_only.predict_batch(features)
+    model_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    table_predictions = with_table.predict_batch(features)
+    table_seconds = time.perf_counter() - start
+
+    records = CustomData.many_from_mappings(features.to_dict("records"))
+    hit = table.lookup(*CustomData.many_to_arrays(records))[1]
+    deviation = np.abs(table_predictions - model_predictions)[hit]
+    print(f"{len(features)} orders, {table.n_cells} cells ({table.values.nbytes / 1e6:.1f} MB), "
+          f"{len(table.combos)} combinations")
+    print(f"hit rate {hit.mean():.1%}; deviation on hits (hours): max {deviation.max():.4f}, "
+          f"p99 {np.percentile(deviation, 99):.4f}, mean {deviation.mean():.4f}")
+    print(f"whole set: model {1000 * model_seconds:.0f} ms, table + model for misses {1000 * table_seconds:.0f} ms")
+
+    # === 2. SINGLE ORDERS ===
+    hits = [record for record, is_hit in zip(records, hit) if is_hit][:args.orders]
+    misses = [record for record, is_hit in zip(records, hit) if not is_hit][:args.orders]
+    print(f"\n{'single order':<22} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, pipeline, sample in [("model (table hits)", model_only, hits),
+                                   ("table hit", with_table, hits),
+                                   ("table miss -> model", with_table, misses)]:
+        p50, p99 = single_order_ms(pipeline, sample)
+        print(f"{name:<22} {p50:>8.3f} {p99:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+'''
+Feature-engineering benchmark: row-wise df.apply (old) vs NumPy-vectorized (new).
+
+    python -m benchmarks.ingestion_benchmark
+    python -m benchmarks.ingestion_benchmark --sizes 40000 1000000 --legacy-max-rows 1000000
+
+Raw orders are synthesized with the same columns and value ranges as
+amazon_delivery.csv, so the benchmark runs without the private dataset.
+Both versions are checked to produce the same frame before timing is reported.
+'''
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from src.components.data_ingestion import DataIngestion
+from src.utils import Haversine_distance, get_part_of_day
+
+WEATHER = ['Sunny', 'Stormy', 'Sandstorms', 'Cloudy', 'Fog', 'Windy']
+TRAFFIC = ['Low ', 'Medium ', 'High ', 'Jam ']
+VEHICLE = ['motorcycle ', 'scooter ', 'van']
+AREA = ['Urban ', 'Metropolitian ', 'Semi-Urban ', 'Other']
+CATEGORY = ['Snacks', 'Electronics', 'Books', 'Jewelry', 'Toys', 'Skincare', 'Outdoors', 'Apparel',
+            'Sports', 'Grocery', 'Pet Supplies', 'Home', 'Cosmetics', 'Kitchen', 'Clothing', 'Shoes']
+
+
+def make_raw_orders(n_rows, seed=42):
+    '''
+    Synthetic raw orders shaped like amazon_delivery.csv (including a few NaNs).
+    '''
+    rng = np.random.default_rng(seed)
+    store_lat = rng.uniform(9.0, 31.0, n_rows).round(6)
+    store_long = rng.uniform(72.0, 89.0, n_rows).round(6)
+    order_minutes = rng.integers(0, 24 * 60, n_rows)
+    pickup_minutes = (order_minutes + rng.choice([5, 10, 15], n_rows)) % (24 * 60)
+    dates = pd.Timestamp('2022-02-11') + pd.to_timedelta(rng.integers(0, 55, n_rows), unit='D')
+
+    def clock(minutes):
+        return pd.Series(minutes // 60).map('{:02d}'.format) + ':' + pd.Series(minutes % 60).map('{:02d}:00'.format)
+
+    df = pd.DataFrame({
+        'Order_ID': np.arange(n_rows).astype(str),
+        'Agent_Age': rng.integers(15, 51, n_rows),
+        'Agent_Rating': rng.uniform(2.5, 5.0, n_rows).round(1),
+        'Store_Latitude': store_lat,
+        'Store_Longitude': store_long,
+        'Drop_Latitude': (store_lat + rng.uniform(-0.2, 0.2, n_rows)).round(6),
+        'Drop_Longitude': (store_long + rng.uniform(-0.2, 0.2, n_rows)).round(6),
+        'Order_Date': dates.strftime('%Y-%m-%d'),
+        'Order_Time': clock(order_minutes),
+        'Pickup_Time': clock(pickup_minutes),
+        'Weather': rng.choice(WEATHER, n_rows),
+        'Traffic': rng.choice(TRAFFIC, n_rows),
+        'Vehicle': rng.choice(VEHICLE, n_rows),
+        'Area': rng.choice(AREA, n_rows),
+        'Delivery_Time': rng.integers(10, 270, n_rows),
+        'Category': rng.choice(CATEGORY, n_rows),
+    })
+    missing = rng.random(n_rows) < 0.001
+    df.loc[missing, 'Agent_Rating'] = np.nan
+    return df
+
+
+def legacy_engineer_features(df):
+    '''
+    The feature engineering as it was before vectorization (row-wise apply).
+    '''
+    df['Distance_km'] = df.apply(
+        lambda row: Haversine_distance(
+            row['Store_Latitude'], row['Store_Longitude'],
+            row['Drop_Latitude'], row['Drop_Longitude']
+        ), axis=1
+    )
+    df.dropna(inplace=True)
+    df['Order_Date'] = pd.to_datetime(df['Order_Date'])
+    df['Order_Year'] = df['Order_Date'].dt.year
+    df['Order_Month'] = df['Order_Date'].dt.month
+    df['Order_Day'] = df['Order_Date'].dt.day
+    df['day_of_week'] = df['Order_Date'].dt.day_name()
+    df['Order_Time'] = pd.to_datetime(df['Order_Time'], format='%H:%M:%S')
+    df['Order_Hour'] = df['Order_Time'].dt.hour
+    df['Order_Minute'] = df['Order_Time'].dt.minute
+    df['part_of_day'] = df['Order_Hour'].apply(get_part_of_day)
+    df['Pickup_Time'] = pd.to_datetime(df['Pickup_Time'], format='%H:%M:%S')
+    df['Pickup_Hour'] = df['Pickup_Time'].dt.hour
+    df['Pickup_Minute'] = df['Pickup_Time'].dt.minute
+    order_total_hours = df['Order_Hour'] + (df['Order_Minute'] / 60)
+    pickup_total_hour = df['Pickup_Hour'] + (df['Pickup_Minute'] / 60)
+    df['Total_preparation_time'] = pickup_total_hour - order_total_hours
+    df.loc[df['Total_preparation_time'] < 0, 'Total_preparation_time'] += 24
+    df['Delivery_Time_hour'] = (df['Delivery_Time'] / 60)
+    df.drop(columns=['Order_ID', 'Store_Latitude', 'Store_Longitude', 'Drop_Latitude', 'Drop_Longitude',
+                     'Order_Date', 'Order_Time', 'Pickup_Time', 'Delivery_Time'], inplace=True)
+    return df
+
+
+def _timed(function, df):
+    start = time.perf_counter()
+    result = function(df)
+    return result, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare row-wise and vectorized feature engineering.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[40000, 1000000, 10000000])
+    parser.add_argument("--legacy-max-rows", type=int, default=None,
+                        help="skip the (slow) row-wise version above this many rows")
+    args = parser.parse_args(argv)
+
+    ingestion = DataIngestion()
+    print(f"{'rows':>10} {'row-wise (s)':>14} {'vectorized (s)':>15} {'speedup':>9}")
+    for n_rows in args.sizes:
+        raw = make_raw_orders(n_rows)
+        new_df, new_time = _timed(ingestion.engineer_features, raw.copy())
+
+        if args.legacy_max_rows is not None and n_rows > args.legacy_max_rows:
+            print(f"{n_rows:>10} {'skipped':>14} {new_time:>15.3f} {'-':>9}")
+            continue
+
+        old_df, old_time = _timed(legacy_engineer_features, raw.copy())
+        pd.testing.assert_frame_equal(old_df, new_df, check_exact=False, rtol=1e-12)
+        print(f"{n_rows:>10} {old_time:>14.3f} {new_time:>15.3f} {old_time / new_time:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
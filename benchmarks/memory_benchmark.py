@@ -0,0 +1,110 @@
+'''
+Memory benchmark: old dtypes (object strings, int64, float64 matrices) vs
+the compact DtypePolicy (normalized categoricals, downcast ints, float32).
+
+    python -m benchmarks.memory_benchmark
+    python -m benchmarks.memory_benchmark --rows 5000000
+
+An engineered CSV is synthesized once (same shape as artifacts/train.csv).
+Each policy then runs in its own subprocess, which reads the CSV, applies the
+policy and fits/transforms the preprocessor, so peak RSS is measured per
+policy and not polluted by the other run.
+'''
+import os
+import sys
+import json
+import resource
+import argparse
+import tempfile
+import subprocess
+
+import pandas as pd
+
+from src.components.data_ingestion import DataIngestion
+from src.components.data_transformation import DataTransformation, DataTransformationConfig
+from src.components.dtype_policy import DtypePolicy
+
+POLICIES = {
+    "legacy": DtypePolicy(normalize_categories=False, categorical_dtype=False,
+                          downcast_integers=False, feature_dtype="float64"),
+    "compact": DtypePolicy(),
+}
+
+
+def _peak_rss_mb():
+    # VmHWM is reset by exec; ru_maxrss (kilobytes on Linux) is not, so it
+    # would report the parent's peak for a freshly spawned child.
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(policy_name, csv_path):
+    '''
+    Runs in the child process: read -> policy -> fit_transform -> cast.
+    '''
+    policy = POLICIES[policy_name]
+    baseline = _peak_rss_mb()
+
+    df = policy.apply(pd.read_csv(csv_path, dtype=policy.read_dtypes()))
+    frame_mb = df.memory_usage(deep=True).sum() / 1e6
+    after_read = _peak_rss_mb()
+
+    X = df.drop(columns=["Delivery_Time_hour"])
+    preprocessor = DataTransformation(DataTransformationConfig(dtype_policy=policy)).get_data_transformer_object()
+    matrix = policy.cast_features(preprocessor.fit_transform(X))
+
+    return {
+        "policy": policy_name,
+        "frame_mb": frame_mb,
+        "matrix_mb": matrix.nbytes / 1e6,
+        "read_peak_mb": after_read - baseline,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare peak memory of the old and compact dtype policies.")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--child", nargs=2, metavar=("POLICY", "CSV"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure(*args.child)))
+        return
+
+    # Lazy import: only the parent needs the raw-order generator
+    from benchmarks.ingestion_benchmark import make_raw_orders
+
+    engineered = DataIngestion().engineer_features(make_raw_orders(args.rows))
+    fd, csv_path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    try:
+        engineered.to_csv(csv_path, index=False)
+        del engineered
+        print(f"{args.rows} rows, CSV {os.path.getsize(csv_path) / 1e6:.0f} MB")
+        print(f"{'policy':>8} {'frame (MB)':>11} {'matrix (MB)':>12} {'read peak (MB)':>15} {'peak RSS (MB)':>14}")
+
+        results = {}
+        for name in POLICIES:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.memory_benchmark", "--child", name, csv_path],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = results[name] = json.loads(output.strip().splitlines()[-1])
+            print(f"{name:>8} {result['frame_mb']:>11.1f} {result['matrix_mb']:>12.1f} "
+                  f"{result['read_peak_mb']:>15.1f} {result['peak_rss_mb']:>14.1f}")
+
+        ratio = results["legacy"]["peak_rss_mb"] / results["compact"]["peak_rss_mb"]
+        print(f"peak RSS reduced {ratio:.2f}x")
+    finally:
+        os.remove(csv_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+'''
+Peak memory of in-memory vs out-of-core training on the same raw file.
+
+    python -m benchmarks.out_of_core_benchmark
+    python -m benchmarks.out_of_core_benchmark --rows 300000 1200000 --rounds 50
+
+For every size a raw orders CSV is synthesized (benchmarks.ingestion_benchmark,
+with a delivery time that depends on traffic and rating so the R2 means
+something). Each mode then runs in its own subprocess:
+
+* in_memory:   read the whole CSV, engineer, split, fit_transform, fit
+               XGBRegressor on the dense matrix (what training_pipeline does)
+* out_of_core: OutOfCoreTraining with the xgboost learner
+
+and reports peak RSS (VmHWM), wall time and test R2.
+'''
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+from benchmarks.ingestion_benchmark import make_raw_orders
+from benchmarks.memory_benchmark import _peak_rss_mb
+
+TRAFFIC_MINUTES = {'Low': 0, 'Medium': 20, 'High': 40, 'Jam': 60}
+
+
+def write_orders(csv_path, n_rows, seed=7):
+    df = make_raw_orders(n_rows, seed)
+    rng = np.random.default_rng(seed)
+    traffic = df['Traffic'].str.strip().map(TRAFFIC_MINUTES).fillna(30)
+    df['Delivery_Time'] = (120 + traffic - 8 * df['Agent_Rating'].fillna(4) + rng.normal(0, 10, n_rows)).round()
+    df.to_csv(csv_path, index=False)
+
+
+def run_in_memory(csv_path, work_dir, rounds):
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import r2_score
+    from xgboost import XGBRegressor
+    from src.components.data_ingestion import DataIngestion
+    from src.components.data_transformation import DataTransformation
+
+    ingestion = DataIngestion()
+    dtype_policy = ingestion.ingestion_config.dtype_policy
+    df = dtype_policy.apply(ingestion.engineer_features(pd.read_csv(csv_path, dtype=dtype_policy.read_dtypes())))
+    train, test = train_test_split(df, test_size=0.3, random_state=42)
+    del df
+    preprocessor = DataTransformation().get_data_transformer_object()
+    X_train = dtype_policy.cast_features(preprocessor.fit_transform(train.drop(columns=['Delivery_Time_hour'])))
+    X_test = dtype_policy.cast_features(preprocessor.transform(test.drop(columns=['Delivery_Time_hour'])))
+    model = XGBRegressor(n_estimators=rounds, max_depth=6, learning_rate=0.1, tree_method="hist")
+    model.fit(X_train, train['Delivery_Time_hour'].to_numpy())
+    return r2_score(test['Delivery_Time_hour'].to_numpy(), model.predict(X_test))
+
+
+def run_out_of_core(csv_path, work_dir, rounds):
+    from src.components.out_of_core import OutOfCoreTraining, OutOfCoreTrainingConfig
+    from src.components.data_transformation import DataTransformationConfig
+    from src.components.model_trainer import ModelTrainerConfig
+
+    training = OutOfCoreTraining(
+        OutOfCoreTrainingConfig(source_data_path=csv_path, num_boost_round=rounds,
+                                cache_dir=os.path.join(work_dir, "cache")),
+        transformation_config=DataTransformationConfig(
+            preprocessor_obj_file_path=os.path.join(work_dir, "preprocessor.pkl"),
+            compiled_encoder_file_path=os.path.join(work_dir, "preprocessor_compiled.pkl")),
+        trainer_config=ModelTrainerConfig(
+            trained_model_file_path=os.path.join(work_dir, "model.pkl"),
+            flat_model_file_path=os.path.join(work_dir, "model_flat.npz"), min_r2_score=-np.inf),
+    )
+    return training.initiate_out_of_core_training()[0]
+
+
+MODES = {"in_memory": run_in_memory, "out_of_core": run_out_of_core}
+
+
+def child(mode, csv_path, work_dir, rounds):
+    start = time.perf_counter()
+    r2 = MODES[mode](csv_path, work_dir, rounds)
+    print(json.dumps({"peak_rss_mb": _peak_rss_mb(), "seconds": time.perf_counter() - start, "r2": float(r2)}))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare in-memory and out-of-core training memory.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[300000, 1200000])
+    parser.add_argument("--rounds", type=int, default=50, help="boosting rounds in both modes")
+    parser.add_argument("--child", nargs=4, metavar=("MODE", "CSV", "WORK_DIR", "ROUNDS"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        mode, csv_path, work_dir, rounds = args.child
+        child(mode, csv_path, work_dir, int(rounds))
+        return
+
+    print(f"{'rows':>9} {'mode':<12} {'peak RSS (MB)':>14} {'seconds':>8} {'test R2':>8}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for n_rows in args.rows:
+            csv_path = os.path.join(work_dir, f"orders_{n_rows}.csv")
+            write_orders(csv_path, n_rows)
+            for mode in MODES:
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.out_of_core_benchmark", "--child",
+                     mode, csv_path, work_dir, str(args.rounds)],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"{n_rows:>9} {mode:<12} {result['peak_rss_mb']:>14.0f} "
+                      f"{result['seconds']:>8.1f} {result['r2']:>8.4f}")
+            os.remove(csv_path)
+
+
+if __name__ == "__main__":
+    main()
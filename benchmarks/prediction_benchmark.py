@@ -0,0 +1,285 @@
+'''
+Prediction latency/throughput benchmark with regression gates.
+
+    python -m benchmarks.prediction_benchmark run
+    python -m benchmarks.prediction_benchmark compare
+    python -m benchmarks.prediction_benchmark run --output benchmarks/baselines/prediction.json
+
+`run` measures, on rows sampled from artifacts/test.csv:
+
+* cold_start          fresh interpreter: import, artifact load, first prediction
+* warm/predict_batch/N PredictPipeline.predict_batch at N = 1, 10, 100, 1k, 10k rows
+* warm/predict_record/1 the single-order path (compiled encoder, micro-batcher)
+* e2e/home            POST /home through Flask's test client
+
+and writes one JSON document (schema below). `compare` exits with status 1
+when any result's p50/p99 latency grew, or its rows/sec dropped, by more
+than the threshold against the baseline. By default it compares
+benchmarks/results/prediction.json (the last `run`) with the committed
+reference benchmarks/baselines/prediction.json. Refresh that baseline with
+the third command when a change is meant to move the numbers, and commit it
+with the change. Its "environment" block records the machine it was measured
+on. Compare against a baseline from similar hardware.
+
+Schema (SCHEMA_VERSION 1):
+    {"schema_version": 1, "created_at": "...", "environment": {...},
+     "results": [{"name", "batch_size", "iterations", "p50_ms", "p99_ms",
+                  "mean_ms", "rows_per_sec", "details": {...}}, ...]}
+'''
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+SCHEMA_VERSION = 1
+DEFAULT_OUTPUT = os.path.join("benchmarks", "results", "prediction.json")
+DEFAULT_BASELINE = os.path.join("benchmarks", "baselines", "prediction.json")
+TEST_DATA_PATH = os.path.join("artifacts", "test.csv")
+TARGET_COLUMN = "Delivery_Time_hour"
+BATCH_SIZES = [1, 10, 100, 1000, 10000]
+
+# Runs in a fresh interpreter, prints one JSON line of stage timings (ms)
+COLD_START_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import pandas as pd
+from src.pipeline.prediction_pipeline import PredictPipeline
+imported = time.perf_counter()
+pipeline = PredictPipeline()
+pipeline.artifact_store.get()
+loaded = time.perf_counter()
+pipeline.predict_batch(pd.DataFrame([json.loads(sys.argv[1])]))
+predicted = time.perf_counter()
+print(json.dumps({
+    "import_ms": 1000 * (imported - start),
+    "load_ms": 1000 * (loaded - imported),
+    "first_predict_ms": 1000 * (predicted - loaded),
+}))
+'''
+
+
+def sample_rows(n_rows, seed=42):
+    '''
+    n_rows feature rows drawn from the test split (with replacement when
+    more rows are asked for than the file has).
+    '''
+    features = pd.read_csv(TEST_DATA_PATH).drop(columns=[TARGET_COLUMN])
+    return features.sample(n_rows, replace=n_rows > len(features), random_state=seed).reset_index(drop=True)
+
+
+def summarize(name, batch_size, timings_seconds, details=None):
+    timings_ms = 1000 * np.asarray(timings_seconds)
+    mean_ms = float(timings_ms.mean())
+    return {
+        "name": name,
+        "batch_size": batch_size,
+        "iterations": len(timings_ms),
+        "p50_ms": float(np.percentile(timings_ms, 50)),
+        "p99_ms": float(np.percentile(timings_ms, 99)),
+        "mean_ms": mean_ms,
+        "rows_per_sec": batch_size / (mean_ms / 1000),
+        "details": details or {},
+    }
+
+
+def _iterations(batch_size, target_rows, min_iterations, max_iterations):
+    return int(min(max_iterations, max(min_iterations, target_rows // batch_size)))
+
+
+def _time_calls(function, argument, iterations, warmup=3):
+    for _ in range(warmup):
+        function(argument)
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function(argument)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_cold_start(record, repeats):
+    runs = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", COLD_START_SCRIPT, json.dumps(record)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        process_seconds = time.perf_counter() - start
+        run = json.loads(output.strip().splitlines()[-1])
+        run["process_ms"] = 1000 * process_seconds
+        runs.append(run)
+
+    details = {key: float(np.median([run[key] for run in runs])) for key in runs[0]}
+    return summarize("cold_start", 1, [run["process_ms"] / 1000 for run in runs], details)
+
+
+def bench_warm(pipeline, rows, batch_sizes, target_rows, min_iterations, max_iterations):
+    results = []
+    for batch_size in batch_sizes:
+        frame = rows.iloc[:batch_size].reset_index(drop=True)
+        iterations = _iterations(batch_size, target_rows, min_iterations, max_iterations)
+        timings = _time_calls(pipeline.predict_batch, frame, iterations)
+        results.append(summarize(f"warm/predict_batch/{batch_size}", batch_size, timings))
+
+    record = rows.iloc[0].to_dict()
+    timings = _time_calls(pipeline.predict_record, record, max_iterations)
+    results.append(summarize("warm/predict_record/1", 1, timings))
+    return results
+
+
+def bench_home(record, iterations):
+    from application import create_app
+
+    client = create_app().test_client()
+    form = {field: str(value) for field, value in record.items()}
+
+    def post(data):
+        response = client.post("/home", data=data)
+        if response.status_code != 200:
+            raise RuntimeError(f"/home returned {response.status_code}")
+
+    return summarize("e2e/home", 1, _time_calls(post, form, iterations))
+
+
+def environment():
+    import sklearn
+    from src.pipeline.artifact_store import get_artifact_store
+
+    bundle = get_artifact_store().get()
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "model": type(bundle.model).__name__,
+        "artifacts_version": bundle.version,
+    }
+
+
+def run(args):
+    from src.pipeline.prediction_pipeline import PredictPipeline
+
+    rows = sample_rows(max(args.batch_sizes), seed=args.seed)
+    record = {key: (value.item() if hasattr(value, "item") else value) for key, value in rows.iloc[0].items()}
+
+    results = [bench_cold_start(record, args.cold_repeats)]
+    print(f"cold_start done ({results[0]['p50_ms']:.0f} ms)")
+    results += bench_warm(PredictPipeline(), rows, args.batch_sizes, args.target_rows,
+                          args.min_iterations, args.max_iterations)
+    results.append(bench_home(record, args.max_iterations))
+
+    document = {
+        "schema_version": SCHEMA_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as file_obj:
+        json.dump(document, file_obj, indent=2)
+
+    print(f"{'name':<26} {'iters':>6} {'p50 (ms)':>10} {'p99 (ms)':>10} {'rows/sec':>12}")
+    for result in results:
+        print(f"{result['name']:<26} {result['iterations']:>6} {result['p50_ms']:>10.3f} "
+              f"{result['p99_ms']:>10.3f} {result['rows_per_sec']:>12.0f}")
+    print(f"Results written to {args.output}")
+
+
+def compare_results(baseline, current, threshold, p99_threshold, min_delta_ms=0.0):
+    '''
+    Returns (rows, regressions): one row per benchmark present in both
+    documents, and the list of "<name>: <metric> ..." regressions.
+    Latency changes smaller than `min_delta_ms` never count, so timer
+    noise on sub-millisecond paths does not fail the gate.
+    '''
+    for document in (baseline, current):
+        if document.get("schema_version") != SCHEMA_VERSION:
+            raise ValueError(f"unsupported schema_version {document.get('schema_version')}")
+
+    current_by_name = {result["name"]: result for result in current["results"]}
+    rows, regressions = [], []
+    for old in baseline["results"]:
+        new = current_by_name.get(old["name"])
+        if new is None:
+            regressions.append(f"{old['name']}: missing from current results")
+            continue
+        checks = [
+            ("p50_ms", new["p50_ms"] / old["p50_ms"] - 1, threshold),
+            ("p99_ms", new["p99_ms"] / old["p99_ms"] - 1, p99_threshold),
+            # Throughput regresses when it goes down
+            ("rows_per_sec", 1 - new["rows_per_sec"] / old["rows_per_sec"], threshold),
+        ]
+        changes = {}
+        for metric, worse_by, limit in checks:
+            changes[metric] = worse_by
+            if metric.endswith("_ms") and new[metric] - old[metric] < min_delta_ms:
+                continue
+            if worse_by > limit:
+                regressions.append(f"{old['name']}: {metric} {old[metric]:.3f} -> {new[metric]:.3f} "
+                                   f"({100 * worse_by:+.1f}% worse, limit {100 * limit:.0f}%)")
+        rows.append((old["name"], changes))
+    return rows, regressions
+
+
+def compare(args):
+    with open(args.baseline) as file_obj:
+        baseline = json.load(file_obj)
+    with open(args.current) as file_obj:
+        current = json.load(file_obj)
+
+    rows, regressions = compare_results(baseline, current, args.threshold, args.p99_threshold, args.min_delta_ms)
+    print(f"{'name':<26} {'p50':>8} {'p99':>8} {'rows/sec':>9}   (positive = worse)")
+    for name, changes in rows:
+        print(f"{name:<26} {100 * changes['p50_ms']:>+7.1f}% {100 * changes['p99_ms']:>+7.1f}% "
+              f"{100 * changes['rows_per_sec']:>+8.1f}%")
+
+    if regressions:
+        print("\nREGRESSIONS:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("\nNo regressions beyond the thresholds.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prediction latency/throughput benchmark.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks and write a results JSON")
+    run_parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    run_parser.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+    run_parser.add_argument("--cold-repeats", type=int, default=3)
+    run_parser.add_argument("--target-rows", type=int, default=50000,
+                            help="rows scored per batch size (bounded by the iteration limits)")
+    run_parser.add_argument("--min-iterations", type=int, default=10)
+    run_parser.add_argument("--max-iterations", type=int, default=300)
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = subparsers.add_parser("compare", help="fail if CURRENT regressed against BASELINE")
+    compare_parser.add_argument("baseline", nargs="?", default=DEFAULT_BASELINE)
+    compare_parser.add_argument("current", nargs="?", default=DEFAULT_OUTPUT)
+    compare_parser.add_argument("--threshold", type=float, default=0.10,
+                                help="allowed relative p50 / rows-per-sec regression")
+    compare_parser.add_argument("--p99-threshold", type=float, default=0.25,
+                                help="allowed relative p99 regression (tails are noisier)")
+    compare_parser.add_argument("--min-delta-ms", type=float, default=0.25,
+                                help="ignore latency increases smaller than this")
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
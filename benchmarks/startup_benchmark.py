@@ -0,0 +1,113 @@
+'''
+Serving worker startup benchmark: import + artifact load + first prediction.
+
+    python -m benchmarks.startup_benchmark
+    python -m benchmarks.startup_benchmark --repeats 10 --target-ms 400
+
+Every run is a fresh interpreter that does what a serving worker does
+before it can answer: `import application`, get the artifact bundle and
+score one order through PredictPipeline.predict_record. Each backend
+(PREDICT_BACKEND) is measured separately, and the heavy libraries that
+ended up imported are listed, since those are most of the cost.
+
+The tracked number is the median total for the --tracked backend; the
+script exits with status 1 when it is above --target-ms. Results can be
+written as JSON (--output) to keep a history.
+'''
+import os
+import sys
+import json
+import argparse
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Libraries the serving path should only import when it really needs them
+HEAVY_MODULES = ["pandas", "sklearn", "scipy", "catboost", "xgboost", "pyarrow", "joblib"]
+
+# Runs in a fresh interpreter, prints one JSON line of stage timings (ms)
+STARTUP_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import application
+imported = time.perf_counter()
+from src.pipeline.prediction_pipeline import CustomData, PredictPipeline
+pipeline = PredictPipeline()
+pipeline.artifact_store.get()
+loaded = time.perf_counter()
+pipeline.predict_record(CustomData.from_mapping(json.loads(sys.argv[1])))
+predicted = time.perf_counter()
+heavy = json.loads(sys.argv[2])
+print(json.dumps({
+    "import_ms": 1000 * (imported - start),
+    "load_ms": 1000 * (loaded - imported),
+    "first_predict_ms": 1000 * (predicted - loaded),
+    "total_ms": 1000 * (predicted - start),
+    "heavy_modules": sorted(name for name in heavy if name in sys.modules),
+}))
+'''
+
+SAMPLE_ORDER = {
+    "Agent_Age": 30, "Agent_Rating": 4.7, "Weather": "Sunny", "Traffic": "Low", "Vehicle": "motorcycle",
+    "Area": "Urban", "Category": "Food", "Distance_km": 5.2, "Order_Year": 2022, "Order_Month": 3,
+    "Order_Day": 19, "day_of_week": "Saturday", "Order_Hour": 12, "Order_Minute": 30,
+    "part_of_day": "Afternoon", "Pickup_Hour": 12, "Pickup_Minute": 45, "Total_preparation_time": 0.25,
+}
+
+
+def run_once(backend):
+    env = dict(os.environ, PREDICT_BACKEND=backend, LOG_LEVEL="WARNING")
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT, json.dumps(SAMPLE_ORDER), json.dumps(HEAVY_MODULES)],
+        check=True, capture_output=True, text=True, env=env,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(backend, repeats):
+    runs = [run_once(backend) for _ in range(repeats)]
+    result = {"backend": backend, "repeats": repeats, "heavy_modules": runs[-1]["heavy_modules"]}
+    for key in ("import_ms", "load_ms", "first_predict_ms", "total_ms"):
+        result[key] = float(np.median([run[key] for run in runs]))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serving worker startup benchmark.")
+    parser.add_argument("--backends", nargs="+", default=["native", "flat"])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--tracked", default="flat", help="backend whose total is checked against the target")
+    parser.add_argument("--target-ms", type=float, default=500.0,
+                        help="maximum median import + load + first prediction time of the tracked backend")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = [measure(backend, args.repeats) for backend in args.backends]
+
+    print(f"{'backend':<8} {'import':>8} {'load':>8} {'1st pred':>9} {'total':>8}  heavy modules imported")
+    for result in results:
+        print(f"{result['backend']:<8} {result['import_ms']:>8.0f} {result['load_ms']:>8.0f} "
+              f"{result['first_predict_ms']:>9.0f} {result['total_ms']:>8.0f}  "
+              f"{', '.join(result['heavy_modules']) or '-'}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as file_obj:
+            json.dump({
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "target_ms": args.target_ms,
+                "tracked": args.tracked,
+                "results": results,
+            }, file_obj, indent=2)
+
+    tracked = [result for result in results if result["backend"] == args.tracked]
+    if tracked and tracked[0]["total_ms"] > args.target_ms:
+        print(f"\nStartup of the {args.tracked} backend took {tracked[0]['total_ms']:.0f} ms, "
+              f"above the {args.target_ms:.0f} ms target")
+        sys.exit(1)
+    print(f"\nWithin the {args.target_ms:.0f} ms startup target ({args.tracked} backend).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+'''
+Production serving: gunicorn -c gunicorn.conf.py
+
+The app (and with it the model and preprocessor) is built once in the
+master and the workers are forked from it, so the unpickled artifacts are
+shared copy-on-write instead of being deserialized N times.
+'''
+import gc
+import os
+
+wsgi_app = "application:create_app(preload_artifacts=True)"
+preload_app = True
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5002")
+workers = int(os.environ.get("GUNICORN_WORKERS", "4"))
+# gthread lets the micro-batcher group single-order requests of one worker
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+timeout = 60
+
+# No collections while the master imports and loads the artifacts: every
+# collection writes to the headers of the objects it visits, and in the
+# workers that would turn the shared pages into private copies.
+gc.disable()
+
+
+def when_ready(server):
+    # The app is loaded at this point. Move everything that exists now into
+    # the permanent generation, which the collector never scans.
+    gc.collect()
+    gc.freeze()
+    server.log.info(f"Froze {gc.get_freeze_count()} objects before forking workers")
+
+
+def post_fork(server, worker):
+    # Workers collect their own (request-time) garbage as usual
+    gc.enable()
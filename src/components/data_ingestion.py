@@ -1,77 +1,82 @@
 import os
 import sys
+import time
+import inspect
 import pandas as pd
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Optional
 from sklearn.model_selection import train_test_split
 
 from src.exception import customException
 from src.logger import logging
-from src.utils import Haversine_distance,get_part_of_day
-from src.components.data_transformation import DataTransformation
-from src.components.data_transformation import DataTransformationConfig
-
-from src.components.model_trainer import ModelTrainer
-from src.components.model_trainer import ModelTrainerConfig
+from src.utils import write_frame
+from src.features import compute_order_features
+from src.distance_cache import DistanceCache, DistanceCacheConfig
+from src.components.stage_cache import StageCache
+from src.components.dtype_policy import DtypePolicy
 
 @dataclass
 class DataIngestionConfig:
+    source_data_path: str = os.path.join('Notebook','data','amazon_delivery.csv')
     raw_data_path: str = os.path.join('artifacts','data.csv')
+    engineered_data_path: str = os.path.join('artifacts','engineered.csv')
     train_data_path: str = os.path.join('artifacts','train.csv')
     test_data_path: str = os.path.join('artifacts','test.csv')
+    # Distinct store locations of the orders, registered in the serving
+    # DistanceCache (src.distance_cache.get_distance_cache)
+    stores_data_path: str = os.path.join('artifacts','stores.csv')
+    # Format of the engineered frame and the split: "csv", "parquet" or "feather"
+    artifact_format: str = "csv"
+    # Column dtypes of the engineered frame (categoricals, integer widths)
+    dtype_policy: DtypePolicy = field(default_factory=DtypePolicy)
+    # Compute Distance_km on a lat/long grid of this many degrees through
+    # a DistanceCache; None keeps the exact Haversine distance
+    distance_cell_degrees: Optional[float] = None
+
+    def __post_init__(self):
+        if self.artifact_format not in ("csv", "parquet", "feather"):
+            raise ValueError(f"Unknown artifact_format {self.artifact_format!r}")
+        extension = "." + self.artifact_format
+        self.engineered_data_path = os.path.splitext(self.engineered_data_path)[0] + extension
+        self.train_data_path = os.path.splitext(self.train_data_path)[0] + extension
+        self.test_data_path = os.path.splitext(self.test_data_path)[0] + extension
 
 class DataIngestion:
-    def __init__(self):
-        self.ingestion_config = DataIngestionConfig()
-
-    def initiate_data_ingestion(self):
-        logging.info('Starting Data Ingestion')
+    def __init__(self, ingestion_config=None):
+        self.ingestion_config = ingestion_config or DataIngestionConfig()
+        self.cache = StageCache("data_ingestion")
+
+    def engineer_features(self, df):
+        '''
+        Turns the raw order rows into the model's feature columns
+        plus the target (Delivery_Time_hour).
+        '''
         try:
-            df=pd.read_csv(r'Notebook\data\amazon_delivery.csv')
-            logging.info('Read the Dataset')
-            os.makedirs(os.path.dirname(self.ingestion_config.raw_data_path), exist_ok=True)
-            df.to_csv(self.ingestion_config.raw_data_path, index=False, header=True)
             logging.info("Starting Feature Engineering...")
-            
+        
             # === 2. FEATURE ENGINEERING (from your notebook) ===
-            
-            # Calculate Haversine distance
-            df['Distance_km'] = df.apply(
-                lambda row: Haversine_distance(
-                    row['Store_Latitude'], row['Store_Longitude'],
-                    row['Drop_Latitude'], row['Drop_Longitude']
-                ), axis=1
-            )
-           
+
             # Handle missing values
             df.dropna(inplace=True)
-           
-            # Process Order date
-            df['Order_Date'] = pd.to_datetime(df['Order_Date'])
-            df['Order_Year'] = df['Order_Date'].dt.year
-            df['Order_Month'] = df['Order_Date'].dt.month
-            df['Order_Day'] = df['Order_Date'].dt.day
-            df['day_of_week'] = df['Order_Date'].dt.day_name()
-           
-            #Process Order time
-            df['Order_Time'] = pd.to_datetime(df['Order_Time'], format='%H:%M:%S')
-            df['Order_Hour'] = df['Order_Time'].dt.hour
-            df['Order_Minute'] = df['Order_Time'].dt.minute
-            
-            # Create 'order_part_of_day'
-            df['part_of_day'] = df['Order_Hour'].apply(get_part_of_day)
-            
-            # Process Pickup_Time
-            df['Pickup_Time'] = pd.to_datetime(df['Pickup_Time'], format='%H:%M:%S')
-            df['Pickup_Hour'] = df['Pickup_Time'].dt.hour
-            df['Pickup_Minute'] = df['Pickup_Time'].dt.minute
-           
-            # Calculate Total_preparation_time
-            order_total_hours = df['Order_Hour'] + (df['Order_Minute'] / 60)
-            pickup_total_hour = df['Pickup_Hour'] + (df['Pickup_Minute'] / 60)
-            df['Total_preparation_time'] = pickup_total_hour - order_total_hours
-            df.loc[df['Total_preparation_time'] < 0, 'Total_preparation_time'] += 24
-            
+
+            # Distance, date, time and part-of-day features for all rows at
+            # once; the raw-order API computes them with the same code
+            stores = df[['Store_Latitude', 'Store_Longitude']].drop_duplicates()
+            stores.to_csv(self.ingestion_config.stores_data_path, index=False, header=True)
+            distance_cache = None
+            if self.ingestion_config.distance_cell_degrees is not None:
+                distance_cache = DistanceCache(DistanceCacheConfig(cell_degrees=self.ingestion_config.distance_cell_degrees))
+                distance_cache.register_stores(stores['Store_Latitude'], stores['Store_Longitude'])
+            features, problems = compute_order_features(df, distance_cache)
+            if distance_cache is not None:
+                logging.info(f"Distance cache: {distance_cache.stats()}")
+            for column, bad_rows in problems.items():
+                if bad_rows.any():
+                    raise ValueError(f"{int(bad_rows.sum())} orders have an unparseable {column}")
+            for column, values in features.items():
+                df[column] = values
+
             # Process Delivery_Time (This is our target variable)
             df['Delivery_Time_hour'] = (df['Delivery_Time'] / 60)
 
@@ -79,13 +84,59 @@ class DataIngestion:
             df.drop(columns=['Order_ID', 'Store_Latitude', 'Store_Longitude', 'Drop_Latitude', 'Drop_Longitude', 'Order_Date', 'Order_Time', 'Pickup_Time','Delivery_Time'], inplace=True)
             logging.info("Feature Engineering and cleaning complete")
 
+            return df
+
+        except Exception as e:
+            raise customException(e)
+
+    def initiate_data_ingestion(self, force=False):
+        '''
+        Reads the raw orders, engineers the features and writes the
+        train/test split. Skipped (outputs restored from the stage cache)
+        when the raw file, the config and this code are unchanged, unless
+        `force` is True.
+        '''
+        logging.info('Starting Data Ingestion')
+        try:
+            outputs = {
+                "raw": self.ingestion_config.raw_data_path,
+                "engineered": self.ingestion_config.engineered_data_path,
+                "train": self.ingestion_config.train_data_path,
+                "test": self.ingestion_config.test_data_path,
+                "stores": self.ingestion_config.stores_data_path,
+            }
+            cache_key = self.cache.compute_key(
+                input_files=[self.ingestion_config.source_data_path],
+                stage_config=self.ingestion_config,
+                code_files=[__file__, inspect.getfile(compute_order_features), inspect.getfile(DistanceCache),
+                            inspect.getfile(DtypePolicy)],
+            )
+            if force:
+                logging.info("Cache bypassed (force=True), rerunning stage")
+            elif self.cache.restore(cache_key, outputs) is not None:
+                return (
+                    self.ingestion_config.train_data_path,
+                    self.ingestion_config.test_data_path
+                )
+
+            start = time.perf_counter()
+            df=pd.read_csv(self.ingestion_config.source_data_path)
+            logging.info('Read the Dataset')
+            os.makedirs(os.path.dirname(self.ingestion_config.raw_data_path), exist_ok=True)
+            df.to_csv(self.ingestion_config.raw_data_path, index=False, header=True)
+            df = self.engineer_features(df)
+            df = self.ingestion_config.dtype_policy.apply(df)
+            write_frame(df, self.ingestion_config.engineered_data_path)
+
            # === 3. TRAIN TEST SPLIT ===
             logging.info("Splitting data into train and test sets")
             train_set,test_set=train_test_split(df,test_size=0.3,random_state=42)
-            train_set.to_csv(self.ingestion_config.train_data_path, index=False, header=True)
-            test_set.to_csv(self.ingestion_config.test_data_path, index=False, header=True)
+            write_frame(train_set, self.ingestion_config.train_data_path)
+            write_frame(test_set, self.ingestion_config.test_data_path)
             logging.info('Ingestion of the data is complete')
 
+            self.cache.store(cache_key, outputs, time.perf_counter() - start)
+
             return (
                 self.ingestion_config.train_data_path,
                 self.ingestion_config.test_data_path
@@ -96,6 +147,9 @@ class DataIngestion:
             raise customException(e)
         
 # if __name__=="__main__":
+#     from src.components.data_transformation import DataTransformation
+#     from src.components.model_trainer import ModelTrainer
+#
 #     obj=DataIngestion()
 #     train_data,test_data = obj.initiate_data_ingestion()
 
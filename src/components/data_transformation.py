@@ -1,31 +1,58 @@
 import os
 import sys
+import time
+import inspect
 
 import pandas as pd
 import numpy as np
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from sklearn.compose import ColumnTransformer
 from sklearn.impute import SimpleImputer
 from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import OneHotEncoder, RobustScaler
+from sklearn.preprocessing import OneHotEncoder, RobustScaler, FunctionTransformer
 
 from src.exception import customException
 from src.logger import logging
-from src.utils import save_object
+from src.utils import save_object, load_object, read_frame, save_matrix, load_matrix, file_sha256
+from src.components.stage_cache import StageCache
+from src.components.dtype_policy import DtypePolicy, normalize_category_values
+from src.components import feature_columns
+from src.components.feature_columns import NUMERICAL_COLUMNS, CATEGORICAL_COLUMNS, TARGET_COLUMN
+from src.pipeline.compiled_encoder import CompiledEncoder
 
 @dataclass
 class DataTransformationConfig:
     preprocessor_obj_file_path: str = os.path.join('artifacts', 'preprocessor.pkl')
+    # Pandas/sklearn-free copy of the preprocessor for serving workers
+    compiled_encoder_file_path: str = os.path.join('artifacts', 'preprocessor_compiled.pkl')
+    # Features and target are stored separately so training can memory-map
+    # them (np.load(mmap_mode='r')) without joining or re-slicing
+    X_train_file_path: str = os.path.join('artifacts', 'X_train.npy')
+    y_train_file_path: str = os.path.join('artifacts', 'y_train.npy')
+    X_test_file_path: str = os.path.join('artifacts', 'X_test.npy')
+    y_test_file_path: str = os.path.join('artifacts', 'y_test.npy')
+    # Keep the preprocessor output as a CSR matrix (.npz) instead of dense .npy.
+    # With float32 this only saves memory below ~50% density, and XGBoost
+    # reads absent CSR entries as missing rather than 0, so it is off by default.
+    sparse_features: bool = False
+    # Column dtypes after reading the split, and dtype of the saved matrices
+    dtype_policy: DtypePolicy = field(default_factory=DtypePolicy)
+
+    def __post_init__(self):
+        extension = ".npz" if self.sparse_features else ".npy"
+        self.X_train_file_path = os.path.splitext(self.X_train_file_path)[0] + extension
+        self.X_test_file_path = os.path.splitext(self.X_test_file_path)[0] + extension
 
 class DataTransformation:
-    def __init__(self):
-        self.data_transformation_config = DataTransformationConfig()
+    def __init__(self, data_transformation_config=None):
+        self.data_transformation_config = data_transformation_config or DataTransformationConfig()
+        self.cache = StageCache("data_transformation")
 
     def get_data_transformer_object(self):
         try:
-            numerical_columns=['Agent_Age','Agent_Rating','Distance_km','Order_Year','Order_Month','Order_Day','Order_Hour','Order_Minute','Pickup_Hour','Pickup_Minute','Total_preparation_time']
-            categorical_columns=['Weather','Traffic','Vehicle','Area','Category','day_of_week','part_of_day']
+            numerical_columns=list(NUMERICAL_COLUMNS)
+            categorical_columns=list(CATEGORICAL_COLUMNS)
 
             logging.info(f"Numerical columns: {numerical_columns}")
             logging.info(f"Categorical columns: {categorical_columns}")
@@ -35,19 +62,24 @@ class DataTransformation:
                     ("scaler", RobustScaler())                  
                 ]
             )
-            cat_pipeline = Pipeline(
-                steps=[
-                    ("imputer", SimpleImputer(strategy="most_frequent")), 
-                    ("one_hot_encoder", OneHotEncoder(handle_unknown='ignore')), 
-                    ("scaler", RobustScaler(with_centering=False)) 
-                ]
-            )
+            dtype_policy = self.data_transformation_config.dtype_policy
+            cat_steps = [
+                ("imputer", SimpleImputer(strategy="most_frequent")), 
+                ("one_hot_encoder", OneHotEncoder(handle_unknown='ignore', dtype=np.dtype(dtype_policy.feature_dtype))), 
+                ("scaler", RobustScaler(with_centering=False)) 
+            ]
+            if dtype_policy.normalize_categories:
+                # Serving inputs are raw strings, so the preprocessor strips them itself
+                cat_steps.insert(0, ("normalizer", FunctionTransformer(normalize_category_values, feature_names_out="one-to-one")))
+            cat_pipeline = Pipeline(steps=cat_steps)
 
             preprocessor = ColumnTransformer(
                 [
                     ("num_pipeline", num_pipeline, numerical_columns), # Apply num_pipeline to numerical_columns
                     ("cat_pipeline", cat_pipeline, categorical_columns)  # Apply cat_pipeline to categorical_columns
-                ]
+                ],
+                # Always sparse (CSR) or always dense, so the saved format is known up front
+                sparse_threshold=1.0 if self.data_transformation_config.sparse_features else 0.0
             )
 
             logging.info("Preprocessor ColumnTransformer object created.")
@@ -57,15 +89,42 @@ class DataTransformation:
         except Exception as e:
             raise customException(e)
         
-    def initiate_data_transformation(self,train_path,test_path):
+    def initiate_data_transformation(self,train_path,test_path,force=False):
+        '''
+        Fits the preprocessor on the train split and transforms both splits.
+        Skipped (preprocessor and arrays restored from the stage cache) when
+        the split files, the config and this code are unchanged, unless
+        `force` is True.
+        '''
         try:
-            train_df = pd.read_csv(train_path)
-            test_df = pd.read_csv(test_path)
+            config = self.data_transformation_config
+            outputs = {
+                "preprocessor": config.preprocessor_obj_file_path,
+                "X_train": config.X_train_file_path,
+                "y_train": config.y_train_file_path,
+                "X_test": config.X_test_file_path,
+                "y_test": config.y_test_file_path,
+            }
+            cache_key = self.cache.compute_key(
+                input_files=[train_path, test_path],
+                stage_config=config,
+                code_files=[__file__, inspect.getfile(DtypePolicy), inspect.getfile(feature_columns)],
+            )
+            if force:
+                logging.info("Cache bypassed (force=True), rerunning stage")
+            elif self.cache.restore(cache_key, outputs) is not None:
+                self.export_compiled_encoder()
+                return self.load_transformed_data()
+
+            start = time.perf_counter()
+            dtype_policy = config.dtype_policy
+            train_df = dtype_policy.apply(read_frame(train_path, csv_dtypes=dtype_policy.read_dtypes()))
+            test_df = dtype_policy.apply(read_frame(test_path, csv_dtypes=dtype_policy.read_dtypes()))
             logging.info("Read train and test data completed.")
             logging.info("Obtaining preprocessing object...")
 
             preprocessing_obj = self.get_data_transformer_object()
-            target_column_name = "Delivery_Time_hour"
+            target_column_name = TARGET_COLUMN
             #Training data
             input_feature_train_df = train_df.drop(columns=[target_column_name], axis=1)
             target_feature_train_df = train_df[target_column_name]
@@ -75,32 +134,68 @@ class DataTransformation:
 
             logging.info("Applying preprocessing object on training and testing dataframes.")
 
-            input_feature_train_arr = preprocessing_obj.fit_transform(input_feature_train_df)
+            input_feature_train_arr = dtype_policy.cast_features(preprocessing_obj.fit_transform(input_feature_train_df))
             
-            input_feature_test_arr = preprocessing_obj.transform(input_feature_test_df)
+            input_feature_test_arr = dtype_policy.cast_features(preprocessing_obj.transform(input_feature_test_df))
 
-            train_arr = np.c_[
-                input_feature_train_arr, np.array(target_feature_train_df)
-            ]
-            test_arr = np.c_[
-                input_feature_test_arr, np.array(target_feature_test_df)
-            ]
-
-            logging.info('Saving preprocessing object')
+            logging.info('Saving preprocessing object and transformed matrices')
 
             save_object(
                 file_path=self.data_transformation_config.preprocessor_obj_file_path,
                 obj=preprocessing_obj
             )
-            return (
-                train_arr,
-                test_arr,
-                self.data_transformation_config.preprocessor_obj_file_path
-            )
+            save_matrix(config.X_train_file_path, input_feature_train_arr)
+            save_matrix(config.y_train_file_path, target_feature_train_df.to_numpy())
+            save_matrix(config.X_test_file_path, input_feature_test_arr)
+            save_matrix(config.y_test_file_path, target_feature_test_df.to_numpy())
+            self.cache.store(cache_key, outputs, time.perf_counter() - start)
+            self.export_compiled_encoder()
+
+            # Hand back memory-mapped views of what was just written, so the
+            # in-memory copies can be freed before training starts
+            return self.load_transformed_data()
 
         except Exception as e:
             raise customException(e)
-        
 
+    def export_compiled_encoder(self):
+        '''
+        Saves the CompiledEncoder of the saved preprocessor, stamped with
+        the preprocessor pickle's sha256, so a serving worker can load it
+        without unpickling the preprocessor (and importing sklearn).
+        Returns the export path, or None if the preprocessor cannot be
+        compiled.
+        '''
+        try:
+            config = self.data_transformation_config
+            try:
+                encoder = CompiledEncoder.from_preprocessor(load_object(config.preprocessor_obj_file_path))
+            except (ValueError, AttributeError) as e:
+                logging.warning(f"Preprocessor cannot be compiled, no encoder export: {e}")
+                if os.path.exists(config.compiled_encoder_file_path):
+                    os.remove(config.compiled_encoder_file_path)
+                return None
+
+            encoder.source_sha256 = file_sha256(config.preprocessor_obj_file_path)
+            save_object(file_path=config.compiled_encoder_file_path, obj=encoder)
+            return config.compiled_encoder_file_path
+
+        except Exception as e:
+            raise customException(e)
 
-                                  
+    def load_transformed_data(self):
+        '''
+        Loads the saved matrices without copying them into RAM (dense ones
+        are memory-mapped read-only). Returns
+        ((X_train, y_train), (X_test, y_test), preprocessor_path).
+        '''
+        try:
+            config = self.data_transformation_config
+            return (
+                (load_matrix(config.X_train_file_path), load_matrix(config.y_train_file_path)),
+                (load_matrix(config.X_test_file_path), load_matrix(config.y_test_file_path)),
+                config.preprocessor_obj_file_path
+            )
+
+        except Exception as e:
+            raise customException(e)
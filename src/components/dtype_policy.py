@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+
+from src.logger import logging
+
+# Fixed vocabulary of every categorical feature, after stripping whitespace.
+# Values outside it become missing (and are then imputed) during training.
+CATEGORY_VOCABULARY = {
+    'Weather': ['Cloudy', 'Fog', 'Sandstorms', 'Stormy', 'Sunny', 'Windy'],
+    'Traffic': ['High', 'Jam', 'Low', 'Medium'],
+    'Vehicle': ['bicycle', 'motorcycle', 'scooter', 'van'],
+    'Area': ['Metropolitian', 'Other', 'Semi-Urban', 'Urban'],
+    'Category': ['Apparel', 'Books', 'Clothing', 'Cosmetics', 'Electronics', 'Grocery', 'Home', 'Jewelry',
+                 'Kitchen', 'Outdoors', 'Pet Supplies', 'Shoes', 'Skincare', 'Snacks', 'Sports', 'Toys'],
+    'day_of_week': ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
+    'part_of_day': ['Morning', 'Afternoon', 'Evening', 'Night'],
+}
+
+# Whole-number features that fit in int8/int16
+INTEGER_COLUMNS = ['Agent_Age', 'Order_Year', 'Order_Month', 'Order_Day',
+                   'Order_Hour', 'Order_Minute', 'Pickup_Hour', 'Pickup_Minute']
+
+
+def normalize_category_values(X):
+    '''
+    Strips surrounding whitespace from categorical values ("Medium " ->
+    "Medium"). Used as the first step of the categorical pipeline, so the
+    preprocessor treats raw and cleaned inputs the same way at serving time.
+    '''
+    if isinstance(X, pd.DataFrame):
+        return X.apply(lambda column: column.astype(object).str.strip())
+    return pd.DataFrame(X).apply(lambda column: column.astype(object).str.strip()).to_numpy(dtype=object)
+
+
+@dataclass
+class DtypePolicy:
+    '''
+    How compact the engineered frame and the feature matrices are.
+    DtypePolicy(False, False, False, "float64") reproduces the old
+    object-string / int64 / float64 behaviour.
+    '''
+    # Strip whitespace from categorical values ("scooter " -> "scooter")
+    normalize_categories: bool = True
+    # Store categoricals as pandas 'category' with CATEGORY_VOCABULARY
+    categorical_dtype: bool = True
+    # int64 -> smallest integer type that holds the values
+    downcast_integers: bool = True
+    # dtype of the transformed feature matrices handed to training
+    feature_dtype: str = "float32"
+
+    def apply(self, df):
+        '''
+        Converts the columns of an engineered frame in place and returns it.
+        Safe to call again on an already converted frame.
+        '''
+        for column, vocabulary in CATEGORY_VOCABULARY.items():
+            if column not in df.columns:
+                continue
+            values = df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype) and list(values.cat.categories) == vocabulary:
+                continue
+
+            if not self.categorical_dtype:
+                if self.normalize_categories:
+                    values = values.astype(object).str.strip()
+                df[column] = values
+                continue
+
+            # Normalize the (few) distinct labels, then remap the integer
+            # codes onto the fixed vocabulary; no per-row string work.
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype('category')
+            labels = values.cat.categories
+            if self.normalize_categories:
+                labels = [label.strip() if isinstance(label, str) else label for label in labels]
+            position = {label: i for i, label in enumerate(vocabulary)}
+            lookup = np.array([position.get(label, -1) for label in labels] + [-1], dtype=np.int16)
+            old_codes = values.cat.codes.to_numpy()
+            codes = lookup[old_codes]
+
+            unknown = int(((codes == -1) & (old_codes != -1)).sum())
+            if unknown:
+                logging.warning(f"{unknown} values of {column} are outside its vocabulary and set to missing")
+            df[column] = pd.Categorical.from_codes(codes, categories=vocabulary)
+
+        if self.downcast_integers:
+            for column in INTEGER_COLUMNS:
+                if column in df.columns and pd.api.types.is_integer_dtype(df[column]):
+                    df[column] = pd.to_numeric(df[column], downcast='integer')
+
+        return df
+
+    def read_dtypes(self):
+        '''
+        dtype= mapping for pd.read_csv, so categoricals are parsed straight
+        into 'category' columns instead of one Python string per cell.
+        apply() still normalizes them afterwards.
+        '''
+        if not self.categorical_dtype:
+            return None
+        return {column: 'category' for column in CATEGORY_VOCABULARY}
+
+    def cast_features(self, matrix):
+        '''
+        Casts a transformed (dense or sparse) matrix to feature_dtype.
+        '''
+        return matrix.astype(np.dtype(self.feature_dtype), copy=False)
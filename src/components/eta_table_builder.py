@@ -0,0 +1,282 @@
+import os
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from src.exception import customException
+from src.logger import logging
+from src.utils import load_object, read_frame, file_sha256
+from src.components.feature_columns import NUMERICAL_COLUMNS, CATEGORICAL_COLUMNS, TARGET_COLUMN
+from src.pipeline.eta_table import EtaLookupTable
+from src.pipeline.compiled_encoder import CompiledEncoder
+
+
+@dataclass
+class EtaTableBuilderConfig:
+    train_data_path: str = os.path.join('artifacts', 'train.csv')
+    # Held-out orders the hit rate and deviation are measured on
+    test_data_path: str = os.path.join('artifacts', 'test.csv')
+    model_file_path: str = os.path.join('artifacts', 'best_model.pkl')
+    preprocessor_file_path: str = os.path.join('artifacts', 'preprocessor.pkl')
+    # JSON header; the values go to eta_table-<hash>.npy next to it
+    table_file_path: str = os.path.join('artifacts', 'eta_table.json')
+    # Categorical inputs of the key; the table covers their `max_combos`
+    # most frequent combinations in the training data
+    key_categorical: list = field(default_factory=lambda: [
+        'Area', 'Vehicle', 'Traffic', 'Weather', 'Category', 'part_of_day',
+    ])
+    max_combos: int = 300
+    # Numerical inputs of the key: name -> (grid step, largest |value - grid
+    # point| answered from the table). A bound of step / 2 accepts every
+    # value in range; 0 only the grid points themselves. Prep times come in
+    # 5 minute steps. Agent age and rating move the prediction as much as
+    # the distance does, so they get bands too.
+    key_numerical: dict = field(default_factory=lambda: {
+        'Distance_km': (1.0, 0.5),
+        'Total_preparation_time': (1 / 12, 0.0),
+        'Agent_Age': (2.0, 1.0),
+        'Agent_Rating': (0.2, 0.1),
+    })
+    # The grid of each key feature spans these training quantiles;
+    # values outside it go to the model
+    range_quantiles: tuple = (0.005, 0.995)
+    # The other inputs are fixed per combination, at the median (numerical)
+    # or mode (categorical) of its training orders; a categorical one must
+    # match exactly, and each numerical one needs a bound here (name ->
+    # largest |value - reference|): orders further away go to the model.
+    fixed_max_error: dict = field(default_factory=lambda: {
+        'Order_Year': 0.0,
+        'Order_Month': 1.0,
+        'Order_Day': 15.0,
+        'Order_Hour': 1.0,
+        'Order_Minute': 15.0,
+        'Pickup_Hour': 1.0,
+        'Pickup_Minute': 15.0,
+    })
+    # A cell is only kept when the model's predictions at both ends of
+    # every bound (grid point +- max_error of each key feature, reference
+    # +- max_error of each fixed one) are within this many hours of its
+    # own; other cells are stored as NaN and their orders go to the model
+    cell_tolerance: float = 0.025
+    # The build fails when the held-out max deviation (hours) exceeds this
+    max_deviation_tolerance: float = 0.08
+    # Grid cells predicted per model call
+    chunk_cells: int = 200_000
+
+
+class EtaTableBuilder:
+    '''
+    Runs the trained model over a quantized grid of the most frequent
+    feature combinations and saves the predictions as an EtaLookupTable,
+    for PredictPipeline's table mode (PREDICT_ETA_TABLE=1).
+    '''
+
+    def __init__(self, config=None):
+        self.config = config or EtaTableBuilderConfig()
+
+    @staticmethod
+    def stripped_columns(preprocessor):
+        '''
+        Categorical columns the preprocessor strips whitespace from. The
+        table must tell values apart exactly when the preprocessor does
+        ("Jam " and "Jam" are different categories for an older one).
+        '''
+        try:
+            encoder = CompiledEncoder.from_preprocessor(preprocessor)
+        except (ValueError, AttributeError):
+            return set()
+        return {column for column, strip in zip(encoder.cat_columns, encoder.cat_strip) if strip}
+
+    def plan_table(self, train_df, stripped):
+        '''
+        Key combinations, grids and reference values from the (raw) training
+        data. Returns the EtaLookupTable arguments, without values.
+        '''
+        config = self.config
+
+        def categories(name):
+            column = train_df[name].astype(object)
+            return column.str.strip() if name in stripped else column
+
+        for name in config.key_categorical:
+            if name not in CATEGORICAL_COLUMNS:
+                raise ValueError(f"{name} is not a categorical input")
+        for name in list(config.key_numerical) + list(config.fixed_max_error):
+            if name not in NUMERICAL_COLUMNS:
+                raise ValueError(f"{name} is not a numerical input")
+        unbounded = [name for name in NUMERICAL_COLUMNS
+                     if name not in config.key_numerical and name not in config.fixed_max_error]
+        if unbounded:
+            raise ValueError(f"No fixed_max_error for {unbounded}")
+
+        # === 1. MOST FREQUENT CATEGORICAL COMBINATIONS ===
+        keys = pd.DataFrame({name: categories(name) for name in config.key_categorical})
+        counts = keys.dropna().value_counts()
+        combos = [tuple(combo) for combo in counts.index[:config.max_combos]]
+        coverage = float(counts.iloc[:config.max_combos].sum() / len(train_df))
+
+        # === 2. A GRID PER NUMERICAL KEY FEATURE, ANCHORED ON MULTIPLES OF ITS STEP ===
+        numeric = []
+        for name, (step, max_error) in config.key_numerical.items():
+            low, high = np.rint(train_df[name].quantile(list(config.range_quantiles)).to_numpy() / step)
+            numeric.append({
+                "name": name, "low": float(low * step), "step": float(step),
+                "n_bins": int(high - low + 1), "max_error": float(max_error),
+            })
+
+        # === 3. REFERENCE VALUES OF EVERYTHING ELSE, PER COMBINATION ===
+        # An observed value (lower median), so a morning combination is
+        # fixed at a morning hour
+        combo_ids = {combo: i for i, combo in enumerate(combos)}
+        combo_of_row = keys.apply(tuple, axis=1).map(combo_ids)
+        in_table = combo_of_row.notna()
+        groups = train_df[in_table].groupby(combo_of_row[in_table].astype(int))
+        fixed_numerical = {
+            name: {
+                "values": [float(value) for value in groups[name].quantile(0.5, interpolation="lower")],
+                "max_error": float(config.fixed_max_error[name]),
+            }
+            for name in NUMERICAL_COLUMNS if name not in config.key_numerical
+        }
+        fixed_categorical = {
+            name: list(categories(name)[in_table].groupby(combo_of_row[in_table].astype(int))
+                       .agg(lambda column: column.mode()[0]))
+            for name in CATEGORICAL_COLUMNS if name not in config.key_categorical
+        }
+        logging.info(
+            f"ETA table plan: {len(combos)} combinations ({coverage:.1%} of training orders) x "
+            f"{' x '.join(str(spec['n_bins']) for spec in numeric)} grid points"
+        )
+        return {
+            "key_categorical": config.key_categorical, "combos": combos, "numeric": numeric,
+            "strip_categorical": sorted(stripped),
+            "fixed_numerical": fixed_numerical, "fixed_categorical": fixed_categorical,
+        }
+
+    def predict_grid(self, plan, preprocessor, model, limits):
+        '''
+        Model predictions for every cell, in the table's flat order, NaN
+        where the model moves by more than `cell_tolerance` within the
+        values the cell answers. `limits` (name -> (min, max) in training)
+        keeps the probes of the fixed inputs on values that occur.
+        '''
+        grids = [spec["low"] + spec["step"] * np.arange(spec["n_bins"]) for spec in plan["numeric"]]
+        cells_per_combo = int(np.prod([len(grid) for grid in grids]))
+        # Grid coordinates of one combination's cells, last feature fastest
+        mesh = [axis.ravel() for axis in np.meshgrid(*grids, indexing="ij")]
+
+        values = np.empty(len(plan["combos"]) * cells_per_combo, dtype=np.float32)
+        combos_per_chunk = max(1, self.config.chunk_cells // cells_per_combo)
+        columns = list(preprocessor.feature_names_in_)
+
+        for first in range(0, len(plan["combos"]), combos_per_chunk):
+            chunk = plan["combos"][first:first + combos_per_chunk]
+            n_rows = len(chunk) * cells_per_combo
+            frame = {}
+            for position, name in enumerate(plan["key_categorical"]):
+                frame[name] = np.repeat(np.array([combo[position] for combo in chunk], dtype=object), cells_per_combo)
+            for spec, axis in zip(plan["numeric"], mesh):
+                frame[spec["name"]] = np.tile(axis, len(chunk))
+            for name, spec in plan["fixed_numerical"].items():
+                frame[name] = np.repeat(spec["values"][first:first + len(chunk)], cells_per_combo)
+            for name, references in plan["fixed_categorical"].items():
+                frame[name] = np.repeat(np.array(references[first:first + len(chunk)], dtype=object), cells_per_combo)
+
+            features = pd.DataFrame(frame, columns=columns)
+            chunk_values = model.predict(preprocessor.transform(features))
+            # Probe both ends of every bound
+            bounds = [(spec["name"], spec["max_error"], None) for spec in plan["numeric"]]
+            bounds += [(name, spec["max_error"], limits.get(name)) for name, spec in plan["fixed_numerical"].items()]
+            flat = np.ones(n_rows, dtype=bool)
+            for name, max_error, limit in bounds:
+                if max_error <= 0:
+                    continue
+                center = frame[name]
+                for offset in (-max_error, max_error):
+                    edge = center + offset
+                    features[name] = edge if limit is None else np.clip(edge, *limit)
+                    edge_values = model.predict(preprocessor.transform(features))
+                    flat &= np.abs(edge_values - chunk_values) <= self.config.cell_tolerance
+                features[name] = center
+            chunk_values[~flat] = np.nan
+
+            start = first * cells_per_combo
+            values[start:start + n_rows] = chunk_values
+        return values
+
+    def measure(self, table, test_df, preprocessor, model):
+        '''
+        Hit rate of the table on held-out orders, and how far its answers
+        are from the model's on the orders it answers.
+        '''
+        features = test_df.drop(columns=[TARGET_COLUMN], errors="ignore")
+        numerical = features[NUMERICAL_COLUMNS].to_numpy(dtype=np.float64)
+        categorical = features[CATEGORICAL_COLUMNS].astype(object).to_numpy()
+        table_values, hit = table.lookup(numerical, categorical)
+        # Measuring is not serving: leave the table's counters at zero
+        table.hits = table.misses = table._hits_since_audit = 0
+
+        report = {"orders": int(len(hit)), "hit_rate": float(hit.mean()) if len(hit) else 0.0,
+                  "nan_cells": int(np.isnan(table.values).sum())}
+        if hit.any():
+            deviation = np.abs(table_values[hit] - model.predict(preprocessor.transform(features[hit])))
+            report.update({
+                "max_deviation": float(deviation.max()),
+                "p99_deviation": float(np.percentile(deviation, 99)),
+                "mean_deviation": float(deviation.mean()),
+            })
+        return report
+
+    def initiate_eta_table_build(self):
+        '''
+        Builds, measures and saves the table. Returns its build report.
+        '''
+        try:
+            config = self.config
+            logging.info("Building the ETA lookup table...")
+            start = time.perf_counter()
+
+            preprocessor = load_object(config.preprocessor_file_path)
+            model = load_object(config.model_file_path)
+            # As written by ingestion, the way serving receives the values
+            train_df = read_frame(config.train_data_path)
+            plan = self.plan_table(train_df, self.stripped_columns(preprocessor))
+            limits = {name: (float(train_df[name].min()), float(train_df[name].max())) for name in NUMERICAL_COLUMNS}
+            values = self.predict_grid(plan, preprocessor, model, limits)
+
+            table = EtaLookupTable(
+                values=values,
+                source_sha256=file_sha256(config.model_file_path),
+                preprocessor_sha256=file_sha256(config.preprocessor_file_path),
+                **plan,
+            )
+            report = self.measure(table, read_frame(config.test_data_path), preprocessor, model)
+            report.update({
+                "cells": table.n_cells,
+                "size_bytes": int(values.nbytes),
+                "build_seconds": time.perf_counter() - start,
+            })
+            table.report = report
+            if report.get("max_deviation", 0.0) > config.max_deviation_tolerance:
+                raise ValueError(
+                    f"ETA table deviates from the model by up to {report['max_deviation']:.4f} h on held-out "
+                    f"orders (tolerance {config.max_deviation_tolerance} h); not saving it"
+                )
+            table.save(config.table_file_path)
+
+            logging.info(
+                f"Saved ETA table to {config.table_file_path}: {table.n_cells} cells "
+                f"({report['size_bytes'] / 1e6:.1f} MB), held-out hit rate {report['hit_rate']:.1%}, "
+                f"max deviation {report.get('max_deviation', 0.0):.4f} h"
+            )
+            return report
+
+        except Exception as e:
+            logging.error(f"Error building the ETA table: {e}")
+            raise customException(e)
+
+
+if __name__ == "__main__":
+    EtaTableBuilder().initiate_eta_table_build()
@@ -0,0 +1,52 @@
+'''
+Column layout shared by training and serving. Only plain Python here, so
+the serving path can import it without pulling in pandas or sklearn.
+'''
+
+TARGET_COLUMN = "Delivery_Time_hour"
+
+# Input columns of the num_pipeline / cat_pipeline of the preprocessor
+NUMERICAL_COLUMNS = ['Agent_Age', 'Agent_Rating', 'Distance_km', 'Order_Year', 'Order_Month', 'Order_Day',
+                     'Order_Hour', 'Order_Minute', 'Pickup_Hour', 'Pickup_Minute', 'Total_preparation_time']
+CATEGORICAL_COLUMNS = ['Weather', 'Traffic', 'Vehicle', 'Area', 'Category', 'day_of_week', 'part_of_day']
+
+# The 18 model inputs, in the order CustomData and the preprocessor expect them
+FEATURE_FIELDS = {
+    "Agent_Age": float,
+    "Agent_Rating": float,
+    "Weather": str,
+    "Traffic": str,
+    "Vehicle": str,
+    "Area": str,
+    "Category": str,
+    "Distance_km": float,
+    "Order_Year": float,
+    "Order_Month": float,
+    "Order_Day": float,
+    "day_of_week": str,
+    "Order_Hour": float,
+    "Order_Minute": float,
+    "part_of_day": str,
+    "Pickup_Hour": float,
+    "Pickup_Minute": float,
+    "Total_preparation_time": float,
+}
+
+# Fields of a raw order, as in amazon_delivery.csv, accepted by
+# /api/v1/predict/raw; the derived features are computed by src.features
+RAW_ORDER_FIELDS = {
+    "Agent_Age": float,
+    "Agent_Rating": float,
+    "Store_Latitude": float,
+    "Store_Longitude": float,
+    "Drop_Latitude": float,
+    "Drop_Longitude": float,
+    "Order_Date": str,
+    "Order_Time": str,
+    "Pickup_Time": str,
+    "Weather": str,
+    "Traffic": str,
+    "Vehicle": str,
+    "Area": str,
+    "Category": str,
+}
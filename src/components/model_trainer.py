@@ -1,55 +1,217 @@
 import os
 import sys
-import pandas as pd
+import numpy as np
 from dataclasses import dataclass
-
-
-from sklearn.linear_model import LinearRegression, Ridge, Lasso
-from sklearn.neighbors import KNeighborsRegressor
-from sklearn.tree import DecisionTreeRegressor
-from sklearn.ensemble import RandomForestRegressor, AdaBoostRegressor,GradientBoostingRegressor
-from xgboost import XGBRegressor
-from catboost import CatBoostRegressor
+from typing import Optional
 
 from src.exception import customException
 from src.logger import logging
 
-from src.utils import evaluate_model, save_object
+from src.utils import evaluate_model, save_object, file_sha256
+from src.pipeline.flat_trees import FlatTreeEnsemble
 
 
 @dataclass
 class ModelTrainerConfig:
     trained_model_file_path: str = os.path.join("artifacts", "best_model.pkl")
+    # Tree models are also exported as flat arrays for the "flat" serving backend
+    flat_model_file_path: str = os.path.join("artifacts", "best_model_flat.npz")
+    # Largest allowed |flat - model.predict| on the test set for the export
+    flat_model_tolerance: float = 1e-6
+    # Cores shared by all candidate fits of all models (-1 = every core)
+    n_jobs: int = -1
+    cv_folds: int = 3
+    # "grid" = exhaustive search, "staged" = exhaustive but n_estimators
+    # values scored from one fit, "halving" = successive halving
+    search_strategy: str = "grid"
+    halving_factor: int = 3
+    halving_min_resources: int = 1000
+    # "n_samples" (rows per fold) or "iterations" (n_estimators/iterations)
+    halving_resource: str = "n_samples"
+    # Optional limits in seconds for the halving search; None = no limit
+    model_time_budget: Optional[float] = None
+    total_time_budget: Optional[float] = None
+    # How the winner is picked from the model report:
+    # "best_r2"        = highest test R2 (the old behaviour)
+    # "latency_budget" = highest R2 among models whose p99 single-row
+    #                    latency is under max_single_row_p99_ms
+    # "weighted"       = highest R2 - latency_weight * log2(p99 / fastest p99),
+    #                    i.e. every doubling of latency costs latency_weight R2
+    selection_policy: str = "best_r2"
+    max_single_row_p99_ms: Optional[float] = None
+    latency_weight: float = 0.01
+    # The winner must still reach this test R2
+    min_r2_score: float = 0.6
+    # Finished CV fits and refits are kept here, keyed by data and
+    # parameters, so a rerun (e.g. after a crash) only fits what is
+    # missing; None = no checkpoint
+    search_checkpoint_path: Optional[str] = os.path.join("artifacts", "cache", "search_checkpoint.sqlite")
 
 class ModelTrainer:
     def __init__(self):
         
         self.model_trainer_config = ModelTrainerConfig()
 
-    def initiate_model_training(self, train_array, test_array):
-        
-        
+    @staticmethod
+    def get_candidate_models():
+        '''
+        The contestants, untrained. The model libraries (xgboost and
+        catboost especially) are imported here rather than at module level,
+        so importing this module stays cheap.
+        '''
+        from sklearn.linear_model import LinearRegression, Ridge, Lasso
+        from sklearn.neighbors import KNeighborsRegressor
+        from sklearn.tree import DecisionTreeRegressor
+        from sklearn.ensemble import RandomForestRegressor, AdaBoostRegressor,GradientBoostingRegressor
+        from xgboost import XGBRegressor
+        from catboost import CatBoostRegressor
+
+        return {
+            "Linear Regression": LinearRegression(),
+            "Lasso": Lasso(),
+            "Ridge": Ridge(),
+            "K-Neighbors Regressor": KNeighborsRegressor(),
+            "Decision Tree": DecisionTreeRegressor(),
+            "Random Forest": RandomForestRegressor(),
+            "XGBRegressor": XGBRegressor(),
+            "CatBoost Regressor": CatBoostRegressor(verbose=False),
+            "AdaBoost Regressor": AdaBoostRegressor(),
+            "Gradient Boosting": GradientBoostingRegressor(),
+        }
+
+    def get_search_options(self):
+        '''
+        evaluate_model keyword arguments for the configured search strategy.
+        '''
+        config = self.model_trainer_config
+        if config.search_strategy != "halving":
+            return {"strategy": config.search_strategy}
+        return {
+            "strategy": "halving",
+            "factor": config.halving_factor,
+            "min_resources": config.halving_min_resources,
+            "resource": config.halving_resource,
+            "model_time_budget": config.model_time_budget,
+            "total_time_budget": config.total_time_budget,
+        }
+
+    def select_best_model(self, model_report):
+        '''
+        Name of the winning model under the configured selection_policy.
+        Only models reaching min_r2_score take part; when none of them
+        meets the latency budget, the budget is ignored (with a warning).
+        '''
+        config = self.model_trainer_config
+        policies = ("best_r2", "latency_budget", "weighted")
+        if config.selection_policy not in policies:
+            raise ValueError(f"Unknown selection policy {config.selection_policy!r}, expected one of {list(policies)}")
+
+        candidates = {
+            name: report for name, report in model_report.items()
+            if report['r2_score'] >= config.min_r2_score
+        }
+        if not candidates:
+            best_r2 = max(report['r2_score'] for report in model_report.values())
+            logging.warning(f"No model performed well. Best R2 score: {best_r2}")
+            raise customException(f"No model reached the minimum R2 score of {config.min_r2_score}")
+
+        if config.selection_policy != "best_r2" and any(
+            'single_row_p99_ms' not in report for report in candidates.values()
+        ):
+            raise ValueError(f"The {config.selection_policy} policy needs evaluate_model(measure_serving=True)")
+
+        if config.selection_policy == "latency_budget":
+            if config.max_single_row_p99_ms is None:
+                raise ValueError("The latency_budget policy needs max_single_row_p99_ms")
+            within_budget = {
+                name: report for name, report in candidates.items()
+                if report['single_row_p99_ms'] <= config.max_single_row_p99_ms
+            }
+            if within_budget:
+                candidates = within_budget
+            else:
+                logging.warning(
+                    f"No model meets the p99 budget of {config.max_single_row_p99_ms} ms; "
+                    f"falling back to the best R2"
+                )
+
+        if config.selection_policy == "weighted":
+            fastest = min(report['single_row_p99_ms'] for report in candidates.values())
+            scores = {
+                name: report['r2_score'] - config.latency_weight * np.log2(report['single_row_p99_ms'] / fastest)
+                for name, report in candidates.items()
+            }
+        else:
+            scores = {name: report['r2_score'] for name, report in candidates.items()}
+
+        return max(scores, key=scores.get)
+
+    def export_flat_model(self, model, X_test):
+        '''
+        Flattens a tree model (FlatTreeEnsemble) next to the saved pickle,
+        after checking it reproduces model.predict on X_test. Models that
+        cannot be flattened, or whose flattened copy does not reproduce
+        them, are not exported and a stale export is removed; the trained
+        model itself is kept either way. Returns the export path, or None.
+        '''
+        config = self.model_trainer_config
+        try:
+            flat_model = FlatTreeEnsemble.from_model(model)
+        except ValueError as e:
+            logging.info(f"No flat export: {e}")
+            self.remove_flat_export()
+            return None
+
+        max_difference = float(np.max(np.abs(flat_model.predict(X_test) - model.predict(X_test)), initial=0.0))
+        if max_difference > config.flat_model_tolerance:
+            logging.warning(
+                f"No flat export: flattened {flat_model.source} differs from the model by {max_difference} "
+                f"(tolerance {config.flat_model_tolerance}); serve it with PREDICT_BACKEND=native"
+            )
+            self.remove_flat_export()
+            return None
+
+        # Ties the export to this exact pickle; the ArtifactStore ignores
+        # an export whose hash does not match the model it loaded
+        flat_model.source_sha256 = file_sha256(config.trained_model_file_path)
+        flat_model.save(config.flat_model_file_path)
+        logging.info(
+            f"Exported {flat_model.n_trees} flattened trees to {config.flat_model_file_path} "
+            f"(max difference {max_difference:.2e})"
+        )
+        return config.flat_model_file_path
+
+    def remove_flat_export(self):
+        flat_model_file_path = self.model_trainer_config.flat_model_file_path
+        if os.path.exists(flat_model_file_path):
+            os.remove(flat_model_file_path)
+
+    @staticmethod
+    def split_features_target(data):
+        '''
+        Accepts either an (X, y) pair, as returned by DataTransformation
+        (possibly memory-mapped, used as-is without copying), or a legacy
+        array with the target in the last column.
+        '''
+        if isinstance(data, tuple):
+            return data
+        return data[:, :-1], data[:, -1]
+
+    def initiate_model_training(self, train_array, test_array, force=False):
+        '''
+        `force` ignores the fits stored in the search checkpoint (the new
+        ones are still stored).
+        '''
         try:
             logging.info("Starting model training component...")
             logging.info("Splitting training and test data into X and y")
             
             
-            X_train, y_train = train_array[:, :-1], train_array[:, -1]
-            X_test, y_test = test_array[:, :-1], test_array[:, -1]
+            X_train, y_train = self.split_features_target(train_array)
+            X_test, y_test = self.split_features_target(test_array)
 
             
-            models = {
-                "Linear Regression": LinearRegression(),
-                "Lasso": Lasso(),
-                "Ridge": Ridge(),
-                "K-Neighbors Regressor": KNeighborsRegressor(),
-                "Decision Tree": DecisionTreeRegressor(),
-                "Random Forest": RandomForestRegressor(),
-                "XGBRegressor": XGBRegressor(),
-                "CatBoost Regressor": CatBoostRegressor(verbose=False),
-                "AdaBoost Regressor": AdaBoostRegressor(),
-                "Gradient Boosting": GradientBoostingRegressor(),
-            }
+            models = self.get_candidate_models()
             
             params = {
                 "Decision Tree": {
@@ -91,32 +253,32 @@ class ModelTrainer:
                 X_train=X_train, y_train=y_train,
                 X_test=X_test, y_test=y_test,
                 models=models,
-                param_grid=params  # <-- You might have added this
+                param_grid=params,
+                n_jobs=self.model_trainer_config.n_jobs,
+                cv=self.model_trainer_config.cv_folds,
+                checkpoint_path=self.model_trainer_config.search_checkpoint_path,
+                reuse_checkpoint=not force,
+                **self.get_search_options()
             )
             
             # === 4. FIND THE WINNER ===
-            # Get the best model's name and score from the report
-            
-            # Get all the scores (R2 score) from the report
-            all_scores = [model['r2_score'] for model in model_report.values()]
-            best_model_score = max(all_scores)
-            
-            # Get the name of the model that had the best score
-            best_model_name = list(model_report.keys())[
-                all_scores.index(best_model_score)
-            ]
-            
+            # Accuracy first, but (depending on the selection policy) a
+            # model that is much slower to serve can lose to a slightly
+            # less accurate one
+            best_model_name = self.select_best_model(model_report)
+            best_model_score = model_report[best_model_name]['r2_score']
+
             # Get the actual model object (the "winner")
             best_model = fitted_models[best_model_name]
 
-            # Set a minimum score. We don't want to save a bad model.
-            if best_model_score < 0.6:
-                logging.warning(f"No model performed well. Best R2 score: {best_model_score}")
-                raise customException("No model reached the minimum R2 score of 0.6")
-
-            logging.info(f"Best model found:")
+            logging.info(f"Best model found ({self.model_trainer_config.selection_policy} policy):")
             logging.info(f"Model Name: {best_model_name}")
             logging.info(f"Model R2 Score: {best_model_score}")
+            if 'single_row_p99_ms' in model_report[best_model_name]:
+                logging.info(
+                    f"Single-row p99 latency: {model_report[best_model_name]['single_row_p99_ms']:.3f} ms, "
+                    f"artifact size: {model_report[best_model_name]['artifact_size_bytes'] / 1e6:.2f} MB"
+                )
 
             # === 5. SAVE THE WINNER ===
             # Use our "Vacuum Sealer" tool from utils.py
@@ -125,6 +287,9 @@ class ModelTrainer:
                 file_path=self.model_trainer_config.trained_model_file_path,
                 obj=best_model
             )
+            # Tree models also go out as flat arrays, for the pure-NumPy
+            # "flat" serving backend of PredictPipeline
+            self.export_flat_model(best_model, X_test)
 
             # === 6. RETURN THE SCORE ===
             # Return the winner's score so we know how well it did.
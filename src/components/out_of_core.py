@@ -0,0 +1,279 @@
+import os
+import time
+import shutil
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from src.exception import customException
+from src.logger import logging
+from src.utils import save_object
+from src.components.data_ingestion import DataIngestion, DataIngestionConfig
+from src.components.data_transformation import DataTransformation
+from src.components.model_trainer import ModelTrainer
+from src.components.feature_columns import CATEGORICAL_COLUMNS, TARGET_COLUMN
+
+
+@dataclass
+class OutOfCoreTrainingConfig:
+    source_data_path: str = DataIngestionConfig.source_data_path
+    # Raw rows read (and engineered/transformed) at a time
+    chunk_rows: int = 50_000
+    # Each engineered row goes to the test split with this probability
+    # (a seeded draw per row, so every pass over the file agrees)
+    test_size: float = 0.3
+    random_state: int = 42
+    # Train rows kept in a uniform reservoir sample; the preprocessor's
+    # medians and quantiles are fitted on it
+    sample_rows: int = 100_000
+    # "xgboost" = external-memory ExtMemQuantileDMatrix + xgb.train,
+    # "sgd" = SGDRegressor.partial_fit over the chunks
+    learner: str = "xgboost"
+    xgb_params: dict = field(default_factory=lambda: {
+        "objective": "reg:squarederror", "tree_method": "hist", "max_depth": 6,
+        "learning_rate": 0.1, "max_bin": 256,
+    })
+    num_boost_round: int = 200
+    sgd_epochs: int = 5
+    # XGBoost's on-disk pages, removed after training
+    cache_dir: str = os.path.join('artifacts', 'out_of_core_cache')
+
+
+class ReservoirSample:
+    '''
+    Uniform sample of at most `capacity` rows of a stream of DataFrames
+    (Algorithm R, vectorized per chunk).
+    '''
+
+    def __init__(self, capacity, seed):
+        self.capacity = capacity
+        self.seen = 0
+        self.sample = None
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, chunk):
+        chunk = chunk.reset_index(drop=True)
+        if self.sample is None:
+            self.sample = chunk.iloc[:0].copy()
+
+        # Fill up first
+        room = self.capacity - len(self.sample)
+        if room > 0:
+            self.sample = pd.concat([self.sample, chunk.iloc[:room]], ignore_index=True)
+            self.seen += min(room, len(chunk))
+            chunk = chunk.iloc[room:].reset_index(drop=True)
+        if len(chunk) == 0:
+            return
+
+        # Row t (0-based over the stream) replaces slot j ~ U[0, t] if j < capacity;
+        # with repeated slots the last row wins, as in the sequential algorithm
+        stream_index = self.seen + np.arange(len(chunk))
+        slots = self._rng.integers(0, stream_index + 1)
+        rows = np.flatnonzero(slots < self.capacity)
+        slots = slots[rows]
+        replaced, last = np.unique(slots[::-1], return_index=True)
+        rows = rows[::-1][last]
+
+        # Slots are interchangeable, so replaced rows are dropped and the
+        # new ones appended instead of written in place
+        kept = np.ones(len(self.sample), dtype=bool)
+        kept[replaced] = False
+        self.sample = pd.concat([self.sample[kept], chunk.iloc[rows]], ignore_index=True)
+        self.seen += len(chunk)
+
+
+class OutOfCoreTraining:
+    '''
+    Ingestion -> transformation -> training for order files that do not
+    fit in memory. The raw CSV is streamed in `chunk_rows` chunks; every
+    chunk is engineered (DataIngestion.engineer_features) and split on its
+    own, so no stage ever holds the full data or the full feature matrix:
+
+    1. One streaming pass collects the category vocabularies (exact, every row)
+       and a reservoir sample of the train rows. The usual preprocessor is
+       fitted on the sample, with its one-hot categories fixed to the full
+       vocabulary, so its medians and quantiles are sample estimates.
+    2. The learner trains on the transformed train chunks: XGBoost through
+       an iterator-built external-memory DMatrix, or SGDRegressor through
+       partial_fit for `sgd_epochs` passes.
+    3. A last pass scores the test chunks (R2/MAE from running sums).
+
+    The preprocessor and model are saved where the in-memory pipeline
+    saves them, with the same serving exports.
+    '''
+
+    def __init__(self, config=None, ingestion_config=None, transformation_config=None, trainer_config=None):
+        self.config = config or OutOfCoreTrainingConfig()
+        self.ingestion = DataIngestion(ingestion_config)
+        self.transformation = DataTransformation(transformation_config)
+        self.trainer = ModelTrainer()
+        if trainer_config is not None:
+            self.trainer.model_trainer_config = trainer_config
+
+    # === STREAMING THE DATA ===
+
+    def iter_chunks(self):
+        '''
+        Yields (engineered chunk, test mask) over the whole source file.
+        '''
+        dtype_policy = self.ingestion.ingestion_config.dtype_policy
+        split_rng = np.random.default_rng(self.config.random_state)
+        reader = pd.read_csv(self.config.source_data_path, chunksize=self.config.chunk_rows,
+                             dtype=dtype_policy.read_dtypes())
+        for raw_chunk in reader:
+            chunk = dtype_policy.apply(self.ingestion.engineer_features(raw_chunk))
+            if len(chunk) == 0:
+                continue
+            yield chunk.reset_index(drop=True), split_rng.random(len(chunk)) < self.config.test_size
+
+    def iter_split(self, test=False):
+        '''
+        Yields (features frame, target) chunks of the train (or test) split.
+        '''
+        for chunk, test_mask in self.iter_chunks():
+            part = chunk[test_mask if test else ~test_mask]
+            if len(part):
+                yield part.drop(columns=[TARGET_COLUMN]), part[TARGET_COLUMN].to_numpy(dtype=np.float64)
+
+    def transform(self, preprocessor, features):
+        dtype_policy = self.transformation.data_transformation_config.dtype_policy
+        return dtype_policy.cast_features(preprocessor.transform(features))
+
+    # === 1. PREPROCESSOR FROM ONE STREAMING PASS ===
+
+    def fit_preprocessor(self):
+        reservoir = ReservoirSample(self.config.sample_rows, self.config.random_state)
+        vocabulary = {column: set() for column in CATEGORICAL_COLUMNS}
+        n_train = n_test = 0
+
+        for chunk, test_mask in self.iter_chunks():
+            n_test += int(test_mask.sum())
+            n_train += int((~test_mask).sum())
+            train_part = chunk[~test_mask]
+            reservoir.add(train_part.drop(columns=[TARGET_COLUMN]))
+            for column in CATEGORICAL_COLUMNS:
+                vocabulary[column].update(train_part[column].dropna().astype(str).unique())
+
+        if n_train == 0:
+            raise ValueError(f"No training rows in {self.config.source_data_path}")
+        logging.info(f"Streamed {n_train} train / {n_test} test rows; fitting the preprocessor "
+                     f"on a sample of {len(reservoir.sample)}")
+
+        preprocessor = self.transformation.get_data_transformer_object()
+        # What fitting on all train rows would give: the sorted seen values
+        preprocessor.set_params(cat_pipeline__one_hot_encoder__categories=[
+            np.array(sorted(vocabulary[column]), dtype=object) for column in CATEGORICAL_COLUMNS
+        ])
+        preprocessor.fit(reservoir.sample)
+        return preprocessor, n_train, n_test
+
+    # === 2. INCREMENTAL LEARNERS ===
+
+    def train_sgd(self, preprocessor):
+        from sklearn.linear_model import SGDRegressor
+
+        model = SGDRegressor(random_state=self.config.random_state)
+        shuffle_rng = np.random.default_rng(self.config.random_state)
+        for epoch in range(self.config.sgd_epochs):
+            for features, target in self.iter_split():
+                X = self.transform(preprocessor, features)
+                order = shuffle_rng.permutation(len(target))
+                model.partial_fit(X[order], target[order])
+            logging.info(f"SGD epoch {epoch + 1}/{self.config.sgd_epochs} done")
+        return model
+
+    def train_xgboost(self, preprocessor):
+        import xgboost
+
+        trainer = self
+
+        class ChunkIter(xgboost.DataIter):
+            # Hands XGBoost one transformed train chunk per next() call
+            def __init__(self):
+                super().__init__(cache_prefix=os.path.join(trainer.config.cache_dir, "xgb"))
+                self._chunks = None
+
+            def next(self, input_data):
+                if self._chunks is None:
+                    self._chunks = trainer.iter_split()
+                try:
+                    features, target = next(self._chunks)
+                except StopIteration:
+                    return False
+                input_data(data=trainer.transform(preprocessor, features), label=target)
+                return True
+
+            def reset(self):
+                self._chunks = None
+
+        os.makedirs(self.config.cache_dir, exist_ok=True)
+        try:
+            params = dict(self.config.xgb_params, seed=self.config.random_state)
+            dtrain = xgboost.ExtMemQuantileDMatrix(ChunkIter(), max_bin=params.pop("max_bin", 256))
+            booster = xgboost.train(params, dtrain, num_boost_round=self.config.num_boost_round)
+            # Releases the page files before the directory is removed
+            del dtrain
+        finally:
+            shutil.rmtree(self.config.cache_dir, ignore_errors=True)
+
+        # Wrapped as an XGBRegressor, like the in-memory pipeline's models
+        model = xgboost.XGBRegressor()
+        model.load_model(bytearray(booster.save_raw(raw_format="json")))
+        return model
+
+    # === 3. TEST SCORES FROM RUNNING SUMS ===
+
+    def evaluate(self, preprocessor, model):
+        n = sum_y = sum_y2 = sse = sae = 0.0
+        check_rows = None
+        for features, target in self.iter_split(test=True):
+            X = self.transform(preprocessor, features)
+            residual = target - model.predict(X)
+            n += len(target)
+            sum_y += target.sum()
+            sum_y2 += (target ** 2).sum()
+            sse += (residual ** 2).sum()
+            sae += np.abs(residual).sum()
+            if check_rows is None:
+                # Rows to check the flat model export against
+                check_rows = X
+        if n == 0:
+            raise ValueError("No test rows to evaluate on")
+        r2 = 1 - sse / (sum_y2 - sum_y ** 2 / n)
+        return float(r2), float(sae / n), check_rows
+
+    def initiate_out_of_core_training(self):
+        '''
+        Runs the three passes and saves the preprocessor and the model.
+        Returns (test R2, preprocessor path, model path).
+        '''
+        try:
+            config = self.config
+            if config.learner not in ("xgboost", "sgd"):
+                raise ValueError(f"Unknown learner {config.learner!r}, expected 'xgboost' or 'sgd'")
+            logging.info(f"Starting out-of-core training ({config.learner}, {config.chunk_rows} rows per chunk)")
+            start = time.perf_counter()
+
+            preprocessor, n_train, n_test = self.fit_preprocessor()
+            model = self.train_xgboost(preprocessor) if config.learner == "xgboost" else self.train_sgd(preprocessor)
+            r2, mae, check_rows = self.evaluate(preprocessor, model)
+            logging.info(f"Out-of-core {config.learner}: test R2 {r2:.4f}, MAE {mae:.4f} "
+                         f"({n_train} train / {n_test} test rows, {time.perf_counter() - start:.1f}s)")
+
+            min_r2 = self.trainer.model_trainer_config.min_r2_score
+            if r2 < min_r2:
+                raise customException(f"Out-of-core model reached R2 {r2:.4f}, below the minimum of {min_r2}")
+
+            preprocessor_path = self.transformation.data_transformation_config.preprocessor_obj_file_path
+            model_path = self.trainer.model_trainer_config.trained_model_file_path
+            save_object(file_path=preprocessor_path, obj=preprocessor)
+            save_object(file_path=model_path, obj=model)
+            self.transformation.export_compiled_encoder()
+            self.trainer.export_flat_model(model, check_rows)
+
+            return r2, preprocessor_path, model_path
+
+        except Exception as e:
+            logging.error(f"Error in out-of-core training: {e}")
+            raise customException(e)
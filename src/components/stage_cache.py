@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+from dataclasses import dataclass, asdict, is_dataclass
+
+from src.exception import customException
+from src.logger import logging
+from src.utils import file_sha256, replace_file
+
+# Bump to invalidate every cached stage output at once
+CACHE_FORMAT_VERSION = 1
+
+
+@dataclass
+class StageCacheConfig:
+    cache_dir: str = os.path.join('artifacts', 'cache')
+    enabled: bool = True
+    # Entries kept per stage; storing one more deletes the least recently
+    # used (stored or restored) ones. None keeps everything.
+    max_entries_per_stage: int = 3
+
+
+class StageCache:
+    '''
+    Content-addressed store for the outputs of one pipeline stage.
+
+    The key is a sha256 over the stage name, the bytes of its input files,
+    its config dataclass and the source of the code that computes it. The
+    outputs (plain files) are copied into cache_dir/<stage>/<key>/ together
+    with how long the stage took, so a rerun with the same key can restore
+    them instead of recomputing.
+
+    Each stage keeps at most `max_entries_per_stage` entries: a restore
+    marks its entry as used, and a store evicts the least recently used
+    ones beyond the limit.
+    '''
+
+    def __init__(self, stage_name, config=None):
+        self.stage_name = stage_name
+        self.config = config or StageCacheConfig()
+
+    def compute_key(self, input_files, stage_config, code_files):
+        try:
+            sha = hashlib.sha256()
+            sha.update(f"{self.stage_name}:{CACHE_FORMAT_VERSION}".encode())
+            for file_path in input_files:
+                sha.update(file_sha256(file_path).encode())
+            config = asdict(stage_config) if is_dataclass(stage_config) else stage_config
+            sha.update(json.dumps(config, sort_keys=True, default=str).encode())
+            for file_path in code_files:
+                sha.update(file_sha256(file_path).encode())
+            return sha.hexdigest()
+
+        except Exception as e:
+            raise customException(e)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.config.cache_dir, self.stage_name, key)
+
+    def restore(self, key, outputs):
+        '''
+        Copies the cached outputs of `key` to the paths in `outputs`
+        ({output name: destination path}). Returns the seconds the stage
+        originally took, or None on a cache miss.
+        '''
+        try:
+            if not self.config.enabled:
+                return None
+            meta_path = os.path.join(self._entry_dir(key), "meta.json")
+            if not os.path.exists(meta_path):
+                logging.info(f"Cache miss for {self.stage_name} (key {key[:12]})")
+                return None
+
+            with open(meta_path) as file_obj:
+                meta = json.load(file_obj)
+            if set(outputs) - set(meta["outputs"]):
+                return None
+
+            for name, destination in outputs.items():
+                _copy_atomic(os.path.join(self._entry_dir(key), meta["outputs"][name]), destination)
+            # meta.json's mtime is the entry's last use, for the eviction
+            os.utime(meta_path)
+
+            logging.info(
+                f"Cache hit for {self.stage_name} (key {key[:12]}): "
+                f"skipped stage, saved ~{meta['compute_seconds']:.1f}s"
+            )
+            return meta["compute_seconds"]
+
+        except Exception as e:
+            raise customException(e)
+
+    def store(self, key, outputs, compute_seconds):
+        '''
+        Saves copies of `outputs` ({output name: file path}) under `key`.
+        '''
+        try:
+            if not self.config.enabled:
+                return
+            entry_dir = self._entry_dir(key)
+            os.makedirs(entry_dir, exist_ok=True)
+
+            names = {}
+            for name, source in outputs.items():
+                names[name] = name + os.path.splitext(source)[1]
+                _copy_atomic(source, os.path.join(entry_dir, names[name]))
+
+            # meta.json is written last: an entry without it is never used
+            meta = {"outputs": names, "compute_seconds": compute_seconds, "created_at": time.time()}
+            fd, tmp_path = tempfile.mkstemp(dir=entry_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as file_obj:
+                json.dump(meta, file_obj, indent=2)
+            replace_file(tmp_path, os.path.join(entry_dir, "meta.json"))
+
+            logging.info(f"Stored {self.stage_name} outputs in cache (key {key[:12]}, stage took {compute_seconds:.1f}s)")
+            self._evict(keep=key)
+
+        except Exception as e:
+            raise customException(e)
+
+    def _evict(self, keep):
+        # Only complete entries (with meta.json) are counted and removed; one
+        # without it may still be being written by another run
+        if self.config.max_entries_per_stage is None:
+            return
+        stage_dir = os.path.join(self.config.cache_dir, self.stage_name)
+        last_used = {}
+        for key in os.listdir(stage_dir):
+            try:
+                last_used[key] = os.path.getmtime(os.path.join(stage_dir, key, "meta.json"))
+            except OSError:
+                continue
+        stale = sorted((key for key in last_used if key != keep), key=last_used.get, reverse=True)
+        for key in stale[max(0, self.config.max_entries_per_stage - 1):]:
+            shutil.rmtree(os.path.join(stage_dir, key), ignore_errors=True)
+            logging.info(f"Evicted {self.stage_name} cache entry {key[:12]}")
+
+
+def _copy_atomic(source, destination):
+    # Always a real copy: stages rewrite their outputs in place, which would
+    # corrupt the cache through a hard link.
+    dir_path = os.path.dirname(destination) or "."
+    os.makedirs(dir_path, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dir_path, suffix=".tmp")
+    os.close(fd)
+    shutil.copyfile(source, tmp_path)
+    replace_file(tmp_path, destination)
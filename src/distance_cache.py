@@ -0,0 +1,268 @@
+import os
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from src.features import Haversine_distance_vectorized
+
+# Cell indices are packed into int64 keys: 22 bits per coordinate for a
+# cell key, and the store's table index above the 44 bits of a drop cell
+_COORD_BITS = 22
+_DROP_KEY_BITS = 2 * _COORD_BITS
+_MAX_STORES = 1 << (63 - _DROP_KEY_BITS)
+# Mean km per degree of latitude (R = 6371 km)
+_KM_PER_DEGREE = 6371 * np.pi / 180
+
+
+@dataclass
+class DistanceCacheConfig:
+    # Side of a grid cell in degrees: 0.0001 ~ 11 m, 0.001 ~ 111 m
+    cell_degrees: float = 0.0001
+    # (store cell, drop cell) distances kept before the least recently
+    # used ones are evicted
+    max_entries: int = 200_000
+    # Every this many rows answered, the exact distance is also computed
+    # and the difference kept as max_observed_error_km (0 = never)
+    audit_every: int = 100
+
+
+class DistanceCache:
+    '''
+    Store->drop distances keyed on lat/long grid cells.
+
+    Both points are snapped to the centre of a `cell_degrees` grid cell.
+    Store cells go into a table with their trigonometric terms precomputed
+    (`register_stores`, also done on first sight). Distances per
+    (store cell, drop cell) pair are kept in a bounded LRU. Everything is
+    vectorized: keys are int64, lookups are np.searchsorted on the sorted
+    key array, and only the missing pairs are computed.
+
+    The result differs from the exact Haversine_distance by at most
+    `error_bound_km` (both points move at most half a cell diagonal).
+    One row in `audit_every` is also computed exactly, so stats() reports
+    the largest difference actually served; `measure_error` checks given
+    orders in full.
+    '''
+
+    def __init__(self, config: Optional[DistanceCacheConfig] = None):
+        self.config = config or DistanceCacheConfig()
+        if self.config.cell_degrees * (1 << (_COORD_BITS - 1)) < 180:
+            raise ValueError("cell_degrees too small to pack into the cache keys")
+        self._lock = threading.Lock()
+
+        # Known store cells (sorted keys) and their precomputed terms
+        self._store_keys = np.empty(0, dtype=np.int64)
+        self._store_ids = np.empty(0, dtype=np.int64)
+        self._store_lat_rad = np.empty(0)
+        self._store_long = np.empty(0)
+        self._store_cos_lat = np.empty(0)
+
+        # The LRU: sorted pair keys, distances and last-use ticks
+        self._keys = np.empty(0, dtype=np.int64)
+        self._values = np.empty(0)
+        self._last_used = np.empty(0, dtype=np.int64)
+        self._tick = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rows = 0
+        self.audited_rows = 0
+        self.max_observed_error_km = 0.0
+
+    @property
+    def error_bound_km(self):
+        # Each point moves at most half a cell diagonal (<= cell * sqrt(2)/2
+        # degrees of arc); the distance changes by at most the sum of both
+        return np.sqrt(2) * self.config.cell_degrees * _KM_PER_DEGREE
+
+    def register_stores(self, store_lat, store_long):
+        '''
+        Adds store locations to the store table ahead of time.
+        '''
+        with self._lock:
+            self._store_index(self._cell_keys(store_lat, store_long))
+
+    def distances(self, store_lat, store_long, drop_lat, drop_long):
+        '''
+        Distances in km for arrays of orders, like
+        Haversine_distance_vectorized but from the cell centres and cached.
+        Rows with a missing coordinate get NaN.
+        '''
+        store_lat = np.asarray(store_lat, dtype=np.float64)
+        store_long = np.asarray(store_long, dtype=np.float64)
+        drop_lat = np.asarray(drop_lat, dtype=np.float64)
+        drop_long = np.asarray(drop_long, dtype=np.float64)
+        out = np.full(store_lat.shape, np.nan)
+        known = ~(np.isnan(store_lat) | np.isnan(store_long) | np.isnan(drop_lat) | np.isnan(drop_long))
+        if not known.any():
+            return out
+
+        with self._lock:
+            store_index = self._store_index(self._cell_keys(store_lat[known], store_long[known]))
+            drop_keys = self._cell_keys(drop_lat[known], drop_long[known])
+            pair_keys = (store_index << _DROP_KEY_BITS) | drop_keys
+            self._tick += 1
+
+            # === 1. LOOK UP EVERY PAIR ===
+            position = np.searchsorted(self._keys, pair_keys)
+            position[position == len(self._keys)] = 0
+            hit = (self._keys[position] == pair_keys) if len(self._keys) else np.zeros(len(pair_keys), dtype=bool)
+            values = np.empty(len(pair_keys))
+            values[hit] = self._values[position[hit]]
+            self._last_used[position[hit]] = self._tick
+            self.hits += int(hit.sum())
+            self.misses += int((~hit).sum())
+
+            # === 2. COMPUTE EACH MISSING PAIR ONCE AND CACHE IT ===
+            if not hit.all():
+                new_keys, inverse = np.unique(pair_keys[~hit], return_inverse=True)
+                new_values = self._pair_distances(new_keys)
+                values[~hit] = new_values[inverse]
+                self._insert(new_keys, new_values)
+
+            # === 3. SAMPLE THE ERROR AGAINST THE EXACT DISTANCE ===
+            if self.config.audit_every > 0:
+                audited = (self.rows + np.arange(len(values))) % self.config.audit_every == 0
+                if audited.any():
+                    rows = np.flatnonzero(known)[audited]
+                    exact = Haversine_distance_vectorized(store_lat[rows], store_long[rows], drop_lat[rows], drop_long[rows])
+                    error = float(np.max(np.abs(values[audited] - exact)))
+                    self.max_observed_error_km = max(self.max_observed_error_km, error)
+                    self.audited_rows += int(audited.sum())
+            self.rows += len(values)
+
+        out[known] = values
+        return out
+
+    def measure_error(self, store_lat, store_long, drop_lat, drop_long):
+        '''
+        Max |cached - exact| (km) over the given orders. Also kept as
+        max_observed_error_km in stats().
+        '''
+        exact = Haversine_distance_vectorized(store_lat, store_long, drop_lat, drop_long)
+        cached = self.distances(store_lat, store_long, drop_lat, drop_long)
+        error = float(np.nanmax(np.abs(cached - exact))) if len(exact) else 0.0
+        with self._lock:
+            self.max_observed_error_km = max(self.max_observed_error_km, error)
+        return error
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._keys),
+            "evictions": self.evictions,
+            "store_cells": len(self._store_keys),
+            "cell_degrees": self.config.cell_degrees,
+            "error_bound_km": self.error_bound_km,
+            "audited_rows": self.audited_rows,
+            "max_observed_error_km": self.max_observed_error_km,
+        }
+
+    def _cell_keys(self, lat, long):
+        offset = 1 << (_COORD_BITS - 1)
+        lat_index = np.floor(np.asarray(lat) / self.config.cell_degrees).astype(np.int64) + offset
+        long_index = np.floor(np.asarray(long) / self.config.cell_degrees).astype(np.int64) + offset
+        return (lat_index << _COORD_BITS) | long_index
+
+    def _cell_centres(self, keys):
+        offset = 1 << (_COORD_BITS - 1)
+        mask = (1 << _COORD_BITS) - 1
+        lat = ((keys >> _COORD_BITS) - offset + 0.5) * self.config.cell_degrees
+        long = ((keys & mask) - offset + 0.5) * self.config.cell_degrees
+        return lat, long
+
+    def _store_index(self, store_keys):
+        # Table index of every store cell, adding unseen cells
+        unique_keys = np.unique(store_keys)
+        new_keys = np.setdiff1d(unique_keys, self._store_keys, assume_unique=True)
+        if len(new_keys):
+            if len(self._store_keys) + len(new_keys) > _MAX_STORES:
+                raise ValueError("too many store cells for the distance cache")
+            lat, long = self._cell_centres(new_keys)
+            ids = np.arange(len(self._store_keys), len(self._store_keys) + len(new_keys))
+            keys = np.concatenate([self._store_keys, new_keys])
+            order = np.argsort(keys, kind="stable")
+            self._store_keys = keys[order]
+            self._store_ids = np.concatenate([self._store_ids, ids])[order]
+            # Per-store terms, indexed by store id (append order)
+            self._store_lat_rad = np.concatenate([self._store_lat_rad, np.radians(lat)])
+            self._store_long = np.concatenate([self._store_long, long])
+            self._store_cos_lat = np.concatenate([self._store_cos_lat, np.cos(np.radians(lat))])
+        return self._store_ids[np.searchsorted(self._store_keys, store_keys)]
+
+    def _pair_distances(self, pair_keys):
+        store_id = pair_keys >> _DROP_KEY_BITS
+        drop_lat, drop_long = self._cell_centres(pair_keys & ((1 << _DROP_KEY_BITS) - 1))
+        store_lat_rad = self._store_lat_rad[store_id]
+        drop_lat_rad = np.radians(drop_lat)
+
+        # Haversine with the store's radians/cos(lat) taken from the table
+        dlat = drop_lat_rad - store_lat_rad
+        dlon = np.radians(drop_long - self._store_long[store_id])
+        a = np.sin(dlat / 2)**2 + self._store_cos_lat[store_id] * np.cos(drop_lat_rad) * np.sin(dlon / 2)**2
+        return 2 * 6371 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    def _insert(self, new_keys, new_values):
+        # new_keys come sorted from np.unique: merge them in place of a re-sort
+        position = np.searchsorted(self._keys, new_keys)
+        self._keys = np.insert(self._keys, position, new_keys)
+        self._values = np.insert(self._values, position, new_values)
+        self._last_used = np.insert(self._last_used, position, self._tick)
+
+        if len(self._keys) > self.config.max_entries:
+            # Evict down to 90% of the limit at once, so the (sorting)
+            # eviction runs rarely instead of on every batch
+            target = int(self.config.max_entries * 0.9)
+            overflow = len(self._keys) - target
+            keep = np.sort(np.argpartition(self._last_used, overflow)[overflow:])
+            self._keys, self._values, self._last_used = self._keys[keep], self._values[keep], self._last_used[keep]
+            self.evictions += overflow
+
+
+_cache: Optional[DistanceCache] = None
+_cache_lock = threading.Lock()
+
+
+def load_store_locations(file_path):
+    '''
+    (latitudes, longitudes) of the stores listed by data ingestion
+    (DataIngestionConfig.stores_data_path), or None if there is no file.
+    '''
+    if not os.path.exists(file_path):
+        return None
+    # NumPy only: the serving path does not import pandas
+    locations = np.loadtxt(file_path, delimiter=",", skiprows=1, ndmin=2)
+    return locations[:, 0], locations[:, 1]
+
+
+def get_distance_cache() -> Optional[DistanceCache]:
+    '''
+    The process-wide cache used by the raw-order endpoint, or None (exact
+    distances) unless DISTANCE_CACHE_CELL_DEGREES is set. The stores seen
+    in the training data (DISTANCE_CACHE_STORES_PATH) are registered up
+    front.
+    '''
+    global _cache
+    cell_degrees = os.environ.get("DISTANCE_CACHE_CELL_DEGREES")
+    if not cell_degrees:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                cache = DistanceCache(DistanceCacheConfig(
+                    cell_degrees=float(cell_degrees),
+                    max_entries=int(os.environ.get("DISTANCE_CACHE_MAX_ENTRIES", "200000")),
+                    audit_every=int(os.environ.get("DISTANCE_CACHE_AUDIT_EVERY", "100")),
+                ))
+                stores = load_store_locations(
+                    os.environ.get("DISTANCE_CACHE_STORES_PATH", os.path.join("artifacts", "stores.csv")))
+                if stores is not None:
+                    cache.register_stores(*stores)
+                _cache = cache
+    return _cache
@@ -1,6 +1,7 @@
 import sys
 from typing import Any
 from src.logger import logging
+from src.metrics import record_error
 
 def error_message_detail(error:Exception) -> str:
     _, _, exc_tb = sys.exc_info()
@@ -19,6 +20,9 @@ class customException(Exception):
         super().__init__(formatted_message)
         self.error_message = formatted_message
         logging.error(self.error_message)
+        # Re-wrapping an already counted customException is not a new error
+        if not isinstance(error, customException):
+            record_error(error)
 
 
     def __str__(self) -> str:
@@ -0,0 +1,198 @@
+'''
+Feature engineering on arrays of raw orders, shared by training
+(DataIngestion.engineer_features, whole dataset at once) and serving
+(/api/v1/predict/raw, one request batch at once).
+
+Everything works on whole columns: dates and clock times are parsed from
+the character codes of fixed-width NumPy string arrays, with no Python
+loop over rows. Only values that are not in the expected ISO layout go
+through pandas' parser.
+'''
+import numpy as np
+
+R_EARTH_KM = 6371
+
+DAY_NAMES = np.array(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'], dtype=object)
+
+# Raw columns the engineered features are computed from
+RAW_FEATURE_SOURCES = ['Store_Latitude', 'Store_Longitude', 'Drop_Latitude', 'Drop_Longitude',
+                       'Order_Date', 'Order_Time', 'Pickup_Time']
+
+
+def Haversine_distance_vectorized(lat1,long1,lat2,long2):
+    '''
+    Haversine_distance on whole arrays (or Series) at once, in km.
+    Same formula and operation order as the scalar version.
+    '''
+    R=R_EARTH_KM
+    lat1 = np.asarray(lat1, dtype=np.float64)
+    long1 = np.asarray(long1, dtype=np.float64)
+    lat2 = np.asarray(lat2, dtype=np.float64)
+    long2 = np.asarray(long2, dtype=np.float64)
+
+    dlat = np.radians(lat2 - lat1)
+    dlon = np.radians(long2 - long1)
+    a = np.sin(dlat / 2)**2 + np.cos(np.radians(lat1)) * np.cos(np.radians(lat2)) * np.sin(dlon / 2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    distance = R * c
+    return distance
+
+
+def get_part_of_day_vectorized(hours):
+    '''
+    get_part_of_day on a whole array of hours. Returns an object array of
+    labels; like the scalar version, anything outside 5-21 (including NaN)
+    is 'Night'.
+    '''
+    hours = np.asarray(hours, dtype=np.float64)
+    return np.select(
+        [
+            (hours >= 5) & (hours < 12),
+            (hours >= 12) & (hours < 17),
+            (hours >= 17) & (hours < 21),
+        ],
+        ['Morning', 'Afternoon', 'Evening'],
+        default='Night',
+    ).astype(object)
+
+
+def _char_codes(values, width):
+    # One row of unicode code points per value; one spare column so values
+    # longer than `width` are detected instead of silently truncated
+    strings = np.asarray(values, dtype=f"U{width + 1}")
+    return strings.reshape(-1).view(np.uint32).reshape(-1, width + 1)
+
+
+def _number(codes, positions):
+    digits = codes[:, positions].astype(np.int64) - ord('0')
+    ok = ((digits >= 0) & (digits <= 9)).all(axis=1)
+    value = np.zeros(len(codes), dtype=np.int64)
+    for column in range(len(positions)):
+        value = value * 10 + digits[:, column]
+    return value, ok
+
+
+def parse_dates(values):
+    '''
+    'YYYY-MM-DD' strings -> datetime64[D] array (NaT where unparseable).
+    Values in another layout fall back to pd.to_datetime.
+    '''
+    codes = _char_codes(values, 10)
+    year, year_ok = _number(codes, [0, 1, 2, 3])
+    month, month_ok = _number(codes, [5, 6])
+    day, day_ok = _number(codes, [8, 9])
+    ok = (year_ok & month_ok & day_ok & (codes[:, 4] == ord('-')) & (codes[:, 7] == ord('-'))
+          & (codes[:, 10] == 0) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31))
+
+    months = (np.where(ok, year, 1970) - 1970) * 12 + np.where(ok, month, 1) - 1
+    dates = months.astype('datetime64[M]').astype('datetime64[D]') + (np.where(ok, day, 1) - 1).astype('timedelta64[D]')
+    # Day 31 of a 30-day month rolls into the next month: not a real date
+    ok &= (dates.astype('datetime64[M]') - months.astype('datetime64[M]')).astype(np.int64) == 0
+    dates[~ok] = np.datetime64('NaT')
+
+    if not ok.all():
+        dates[~ok] = _pandas_fallback(np.asarray(values, dtype=object).reshape(-1)[~ok], None).astype('datetime64[D]')
+    return dates
+
+
+def parse_clock(values):
+    '''
+    'HH:MM:SS' strings -> (hour, minute) float arrays (NaN where
+    unparseable). Values in another layout fall back to pd.to_datetime
+    with format '%H:%M:%S', as training always used.
+    '''
+    codes = _char_codes(values, 8)
+    hour, hour_ok = _number(codes, [0, 1])
+    minute, minute_ok = _number(codes, [3, 4])
+    second, second_ok = _number(codes, [6, 7])
+    ok = (hour_ok & minute_ok & second_ok & (codes[:, 2] == ord(':')) & (codes[:, 5] == ord(':'))
+          & (codes[:, 8] == 0) & (hour <= 23) & (minute <= 59) & (second <= 59))
+
+    hours = np.where(ok, hour, np.nan)
+    minutes = np.where(ok, minute, np.nan)
+    if not ok.all():
+        parsed = _pandas_fallback(np.asarray(values, dtype=object).reshape(-1)[~ok], '%H:%M:%S')
+        hours[~ok] = _time_component(parsed, 'h')
+        minutes[~ok] = _time_component(parsed, 'm')
+    return hours, minutes
+
+
+def _pandas_fallback(values, date_format):
+    import pandas as pd
+
+    if len(values) == 0:
+        return np.array([], dtype='datetime64[ns]')
+    # "mixed": each leftover value is parsed on its own, like training's
+    # format-less pd.to_datetime did
+    parsed = pd.to_datetime(pd.Series(values, dtype=object), format=date_format or 'mixed', errors='coerce')
+    return parsed.to_numpy(dtype='datetime64[ns]')
+
+
+def _time_component(timestamps, unit):
+    since_midnight = timestamps - timestamps.astype('datetime64[D]')
+    minutes = since_midnight.astype('timedelta64[m]').astype(np.float64)
+    component = np.floor(minutes / 60) if unit == 'h' else minutes % 60
+    return np.where(np.isnat(timestamps), np.nan, component)
+
+
+def compute_order_features(orders, distance_cache=None):
+    '''
+    Engineered features for many raw orders at once. With a
+    `distance_cache` (src.distance_cache.DistanceCache) Distance_km comes
+    from the geo-cell cache instead of the exact formula.
+
+    `orders` maps the RAW_FEATURE_SOURCES column names to equally long
+    arrays (a DataFrame works too). Returns (features, problems):
+    `features` is {column: array} in the engineered column order
+    (Distance_km ... Total_preparation_time), and `problems` is
+    {raw column: bool mask} of the rows whose date or time could not be
+    parsed. Their features hold placeholder values.
+    '''
+    distance_function = distance_cache.distances if distance_cache is not None else Haversine_distance_vectorized
+    distance = distance_function(
+        orders['Store_Latitude'], orders['Store_Longitude'],
+        orders['Drop_Latitude'], orders['Drop_Longitude'],
+    )
+
+    # === 1. ORDER DATE ===
+    dates = parse_dates(orders['Order_Date'])
+    bad_date = np.isnat(dates)
+    dates = np.where(bad_date, np.datetime64('1970-01-01'), dates)
+    years = dates.astype('datetime64[Y]')
+    months = dates.astype('datetime64[M]')
+    order_year = years.astype(np.int64) + 1970
+    order_month = (months - years.astype('datetime64[M]')).astype(np.int64) + 1
+    order_day = (dates - months.astype('datetime64[D]')).astype(np.int64) + 1
+    # 1970-01-01 (day 0) was a Thursday
+    day_of_week = DAY_NAMES[(dates.astype(np.int64) + 3) % 7]
+
+    # === 2. ORDER AND PICKUP TIMES ===
+    order_hour, order_minute = parse_clock(orders['Order_Time'])
+    pickup_hour, pickup_minute = parse_clock(orders['Pickup_Time'])
+    bad_order_time = np.isnan(order_hour)
+    bad_pickup_time = np.isnan(pickup_hour)
+
+    # Pickup after midnight counts from the previous day's order time
+    order_total_hours = order_hour + (order_minute / 60)
+    pickup_total_hour = pickup_hour + (pickup_minute / 60)
+    total_preparation_time = pickup_total_hour - order_total_hours
+    total_preparation_time[total_preparation_time < 0] += 24
+
+    def whole(values):
+        return np.where(np.isnan(values), 0, values).astype(np.int32)
+
+    features = {
+        'Distance_km': distance,
+        'Order_Year': order_year.astype(np.int32),
+        'Order_Month': order_month.astype(np.int32),
+        'Order_Day': order_day.astype(np.int32),
+        'day_of_week': day_of_week,
+        'Order_Hour': whole(order_hour),
+        'Order_Minute': whole(order_minute),
+        'part_of_day': get_part_of_day_vectorized(order_hour),
+        'Pickup_Hour': whole(pickup_hour),
+        'Pickup_Minute': whole(pickup_minute),
+        'Total_preparation_time': total_preparation_time,
+    }
+    problems = {'Order_Date': bad_date, 'Order_Time': bad_order_time, 'Pickup_Time': bad_pickup_time}
+    return features, problems
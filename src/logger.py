@@ -1,16 +1,131 @@
 import logging
+import logging.handlers
 import os
+import queue
+import random
+import atexit
 from datetime import datetime
 
 LOG_FILE = f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log"
+# Created with the log file, when the first record is written: importing
+# this module touches nothing on disk
 logs_path = os.path.join(os.getcwd(),"logs")
-os.makedirs(logs_path,exist_ok=True)
 
 LOG_FILE_PATH = os.path.join(logs_path,LOG_FILE)
 
+LOG_FORMAT = "[%(asctime)s] - %(name)s - %(levelname)s - %(message)s"
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# Size-based rotation of the log file
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", "5"))
+# Records waiting for the writer thread; beyond this they are dropped
+# instead of blocking the request
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+# Fraction of request payloads written by log_payload (0 = never, 1 = all)
+PAYLOAD_SAMPLE_RATE = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+
+
+# Message arguments that cannot change after the call, so formatting them
+# can be left to the writer thread
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None))
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    '''
+    QueueHandler that hands the record over, formatted only when it has to be.
+
+    The stock prepare() formats the message in the calling thread (so the
+    record can be pickled). The queue here never leaves the process, so a
+    message whose arguments are all immutable scalars is %-formatted by the
+    writer thread. Anything else (a DataFrame, a list, a dict the caller
+    goes on to change) is formatted here, so the log shows its value at the
+    time of the call; only the file I/O is deferred then. A full queue drops
+    the record instead of blocking.
+    '''
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # A lone dict argument arrives as record.args itself, never a tuple
+        args = record.args
+        if isinstance(record.msg, str) and isinstance(args, (tuple, type(None))) \
+                and all(isinstance(arg, _IMMUTABLE_ARGS) for arg in args or ()):
+            return record
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _LazyRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    '''
+    RotatingFileHandler (with delay=True) that also creates the log
+    directory only when the file is first opened.
+    '''
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+def _file_handler(file_path):
+    handler = _LazyRotatingFileHandler(
+        file_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, delay=True
+    )
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return handler
+
+
+def _start_listener(file_path):
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    listener = logging.handlers.QueueListener(log_queue, _file_handler(file_path), respect_handler_level=True)
+    listener.start()
+    return log_queue, listener
+
+
+_queue, _listener = _start_listener(LOG_FILE_PATH)
+queue_handler = DeferredQueueHandler(_queue)
+
 logging.basicConfig(
-    filename=LOG_FILE_PATH,
-    format="[%(asctime)s] - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO,
+    handlers=[queue_handler],
+    level=LOG_LEVEL,
 )
 
+
+def _restart_in_child():
+    # The writer thread does not survive fork (gunicorn workers). Each child
+    # gets its own queue, writer and file, since several processes rotating
+    # one file would clobber each other's output.
+    global _queue, _listener
+    base, extension = os.path.splitext(LOG_FILE_PATH)
+    _queue, _listener = _start_listener(f"{base}_{os.getpid()}{extension}")
+    queue_handler.queue = _queue
+    queue_handler.dropped = 0
+
+
+def _stop_listener():
+    # Flushes whatever is still queued when the process exits
+    try:
+        _listener.stop()
+    except Exception:
+        pass
+
+
+os.register_at_fork(after_in_child=_restart_in_child)
+atexit.register(_stop_listener)
+
+
+def log_payload(message, payload):
+    '''
+    Logs a request payload for a sampled fraction (PAYLOAD_SAMPLE_RATE) of
+    calls. Unsampled calls cost one random() and nothing is formatted.
+    '''
+    if PAYLOAD_SAMPLE_RATE > 0 and random.random() < PAYLOAD_SAMPLE_RATE:
+        logging.info("%s: %s", message, payload)
@@ -0,0 +1,220 @@
+import time
+import bisect
+import threading
+from collections import deque
+
+# Upper bounds (seconds) of the latency histogram buckets: 50µs .. 10s
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Quantiles reported from the most recent observations of every series
+QUANTILES = (0.5, 0.95, 0.99)
+RECENT_OBSERVATIONS = 1024
+
+
+class Counter:
+    '''
+    Monotonic count per label set, e.g. requests per endpoint/status.
+    '''
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, key, (), value) for key, value in items]
+
+
+class Gauge(Counter):
+    '''
+    Current value per label set, e.g. the micro-batcher queue depth.
+    '''
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    '''
+    Bucketed latency distribution per label set (aggregatable across
+    processes by Prometheus), plus p50/p95/p99 over the last
+    RECENT_OBSERVATIONS values, exported as a separate summary family.
+    '''
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0, deque(maxlen=RECENT_OBSERVATIONS)]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+            series[3].append(value)
+
+    def quantiles(self, **labels):
+        '''
+        {quantile: value} over the recent observations of one series.
+        '''
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            recent = sorted(self._series[key][3]) if key in self._series else []
+        return _quantiles(recent)
+
+    def samples(self):
+        with self._lock:
+            series = [(key, list(counts), total, count, sorted(recent))
+                      for key, (counts, total, count, recent) in self._series.items()]
+        samples = []
+        for key, counts, total, count, _ in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append((self.name + "_bucket", key, (("le", _format_value(bound)),), cumulative))
+            samples.append((self.name + "_sum", key, (), total))
+            samples.append((self.name + "_count", key, (), count))
+        return samples, [(key, recent) for key, _, _, _, recent in series]
+
+
+class MetricsRegistry:
+    '''
+    Holds the process's metrics and renders them in the Prometheus text
+    exposition format. Every gunicorn worker has its own registry, so a
+    scrape reports the worker that answered it.
+    '''
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if metric.kind != "histogram":
+                for name, key, extra, value in metric.samples():
+                    lines.append(_sample_line(name, metric.labelnames, key, extra, value))
+                continue
+
+            samples, recent_series = metric.samples()
+            for name, key, extra, value in samples:
+                lines.append(_sample_line(name, metric.labelnames, key, extra, value))
+
+            if metric.name.endswith("_seconds"):
+                summary_name = metric.name[:-len("_seconds")] + "_recent_seconds"
+            else:
+                summary_name = metric.name + "_recent"
+            lines.append(f"# HELP {summary_name} {metric.documentation} (last {RECENT_OBSERVATIONS} observations)")
+            lines.append(f"# TYPE {summary_name} summary")
+            for key, recent in recent_series:
+                for quantile, value in _quantiles(recent).items():
+                    lines.append(_sample_line(summary_name, metric.labelnames, key,
+                                              (("quantile", _format_value(quantile)),), value))
+                lines.append(_sample_line(summary_name + "_sum", metric.labelnames, key, (), sum(recent)))
+                lines.append(_sample_line(summary_name + "_count", metric.labelnames, key, (), len(recent)))
+        return "\n".join(lines) + "\n"
+
+
+class _StageTimer:
+    # A plain class instead of @contextmanager: no generator per use
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        STAGE_LATENCY.observe(time.perf_counter() - self.start, stage=self.stage)
+        return False
+
+
+def stage_timer(stage):
+    '''
+    with stage_timer("transform"): ...
+    Records the block's monotonic-clock duration in STAGE_LATENCY, also
+    when it raises.
+    '''
+    return _StageTimer(stage)
+
+
+def record_error(error):
+    '''
+    Counts one failure by the type of the original exception.
+    '''
+    error_type = "message" if isinstance(error, str) else type(error).__name__
+    ERRORS.inc(error_type=error_type)
+
+
+def _quantiles(sorted_values):
+    if not sorted_values:
+        return {quantile: float("nan") for quantile in QUANTILES}
+    last = len(sorted_values) - 1
+    return {quantile: sorted_values[min(last, int(round(quantile * last)))] for quantile in QUANTILES}
+
+
+def _sample_line(name, labelnames, key, extra, value):
+    labels = list(zip(labelnames, key)) + list(extra)
+    if labels:
+        rendered = ",".join(f'{label}="{_escape(label_value)}"' for label, label_value in labels)
+        return f"{name}{{{rendered}}} {_format_value(value)}"
+    return f"{name} {_format_value(value)}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value != value:
+        return "NaN"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "delivery_stage_latency_seconds", "Time spent in each stage of the prediction path", ["stage"]))
+REQUESTS = REGISTRY.register(Counter(
+    "delivery_http_requests_total", "HTTP requests by endpoint, method and status", ["endpoint", "method", "status"]))
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "delivery_http_request_latency_seconds", "End-to-end HTTP request latency", ["endpoint"]))
+ERRORS = REGISTRY.register(Counter(
+    "delivery_errors_total", "Errors raised as customException, by original exception type", ["error_type"]))
+MICRO_BATCH_SIZE = REGISTRY.register(Histogram(
+    "delivery_micro_batch_size_rows", "Rows per micro-batch", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)))
+MICRO_BATCH_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "delivery_micro_batch_queue_depth", "Rows waiting when the micro-batcher started its last batch"))
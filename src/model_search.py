@@ -0,0 +1,705 @@
+'''
+Hyperparameter search behind utils.evaluate_model.
+
+Instead of one GridSearchCV per model, every (model, candidate, fold) fit
+of every model is a task on ONE shared joblib pool sized by the core
+budget. Each fit is pinned to a single thread (n_jobs / nthread /
+thread_count = 1, and loky's inner_max_num_threads=1 for BLAS/OpenMP), so
+XGBoost or CatBoost can't oversubscribe the CPU on top of the pool.
+
+With a SearchCheckpoint (src/search_checkpoint.py) every finished fit is
+stored as it comes back from the pool, and fits already stored are not
+scheduled again, so an interrupted search resumes where it stopped.
+'''
+import time
+
+import dill
+import numpy as np
+from joblib import Parallel, delayed, parallel_config
+from sklearn.base import clone
+from sklearn.metrics import r2_score, mean_absolute_error
+from sklearn.model_selection import KFold, ParameterGrid
+
+from src.logger import logging
+
+# Estimator parameters that control internal threading
+THREAD_PARAMS = ("n_jobs", "nthread", "thread_count")
+
+# Error of a fit that was not started because the search deadline had passed
+SKIPPED_FIT = "not run: search time budget used up"
+
+
+def pin_threads(estimator, params=None):
+    '''
+    Returns a clone of `estimator` that uses a single thread, unless the
+    thread count is part of the searched `params`.
+    '''
+    estimator = clone(estimator)
+    available = estimator.get_params()
+    pinned = {
+        name: 1 for name in THREAD_PARAMS
+        if name in available and name not in (params or {})
+    }
+    if pinned:
+        estimator.set_params(**pinned)
+    return estimator
+
+
+def restore_threads(model, estimator, params=None):
+    '''
+    Gives a fitted `model` (made with pin_threads) the thread settings of
+    the original `estimator` back, so the saved model predicts with them
+    rather than on a single thread.
+    '''
+    original = estimator.get_params()
+    restored = {
+        name: original[name] for name in THREAD_PARAMS
+        if name in original and name not in (params or {})
+    }
+    if restored:
+        model.set_params(**restored)
+    return model
+
+
+def candidate_cost(params):
+    '''
+    Rough relative cost of a candidate, used to start the slowest fits first
+    so the pool does not end with one long straggler.
+    '''
+    n_trees = params.get("n_estimators", params.get("iterations", 1))
+    depth = params.get("depth", params.get("max_depth", 0)) or 0
+    return n_trees * (2 ** min(depth, 12))
+
+
+def fit_and_score(estimator, params, X, y, train_idx, val_idx, deadline=None):
+    '''
+    Fits one candidate on one CV fold. Returns (r2, wall seconds, cpu seconds, error).
+    A failing fit scores NaN, like GridSearchCV's default error_score.
+    Past `deadline` (a time.time() value) the fit is not run at all and
+    comes back as NaN with the SKIPPED_FIT error.
+    '''
+    if deadline is not None and time.time() >= deadline:
+        return np.nan, 0.0, 0.0, SKIPPED_FIT
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        model = pin_threads(estimator, params).set_params(**params)
+        model.fit(X[train_idx], y[train_idx])
+        score = r2_score(y[val_idx], model.predict(X[val_idx]))
+        error = None
+    except Exception as e:
+        score, error = np.nan, str(e)
+    return score, time.perf_counter() - wall_start, time.process_time() - cpu_start, error
+
+
+def refit_and_test(estimator, params, X_train, y_train, X_test, y_test):
+    '''
+    Fits the winning candidate on the full training set and scores it on
+    the test set. Returns (model, r2, mae, wall seconds, cpu seconds).
+    '''
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    model = pin_threads(estimator, params).set_params(**params)
+    model.fit(X_train, y_train)
+    y_test_pred = model.predict(X_test)
+    return (
+        restore_threads(model, estimator, params),
+        r2_score(y_test, y_test_pred),
+        mean_absolute_error(y_test, y_test_pred),
+        time.perf_counter() - wall_start,
+        time.process_time() - cpu_start,
+    )
+
+
+def run_pool(tasks, n_jobs, on_result=None):
+    '''
+    Runs `delayed(...)` tasks on the shared pool, results in task order.
+    `on_result(i, result)` is called as each result comes back (in order),
+    instead of only after the last one.
+    '''
+    with parallel_config(backend="loky", inner_max_num_threads=1):
+        if on_result is None:
+            return Parallel(n_jobs=n_jobs, batch_size=1, pre_dispatch="all")(tasks)
+        results = []
+        for result in Parallel(n_jobs=n_jobs, batch_size=1, pre_dispatch="all", return_as="generator")(tasks):
+            on_result(len(results), result)
+            results.append(result)
+        return results
+
+
+def _split_result(result, counts):
+    # One (score, wall, cpu, error) per checkpoint entry; a staged fit's
+    # time is booked on its largest count
+    if counts is None:
+        return [result]
+    scores, wall, cpu, error = result
+    last = len(counts) - 1
+    return [
+        (scores.get(count, np.nan), wall if i == last else 0.0, cpu if i == last else 0.0, error)
+        for i, count in enumerate(counts)
+    ]
+
+
+def _merge_results(stored, counts):
+    if counts is None:
+        return stored[0]
+    return (
+        {count: entry[0] for count, entry in zip(counts, stored)},
+        sum(entry[1] for entry in stored),
+        sum(entry[2] for entry in stored),
+        next((entry[3] for entry in stored if entry[3] is not None), None),
+    )
+
+
+def run_fits(jobs, n_jobs, checkpoint=None):
+    '''
+    Runs CV fits on the shared pool, results in job order. Every job is
+    (task, entries, counts): a delayed fit_and_score (counts=None) or
+    fit_and_score_staged call, and the (model_name, params, train_idx,
+    val_idx) fits it scores, one per tree count of a staged fit.
+    With a checkpoint, jobs whose fits are all stored are answered from it
+    and every other job is stored as soon as it finishes.
+    '''
+    if checkpoint is None:
+        return run_pool((task for task, _, _ in jobs), n_jobs)
+
+    results = [None] * len(jobs)
+    pending = []
+    for i, (_, entries, counts) in enumerate(jobs):
+        stored = checkpoint.load_fits(entries)
+        if stored is None:
+            pending.append(i)
+            continue
+        results[i] = _merge_results(stored, counts)
+        stats = checkpoint.stats[entries[0][0]]
+        stats["reused_fits"] += 1
+        stats["reused_seconds"] += results[i][1]
+    if len(pending) < len(jobs):
+        logging.info(f"Reusing {len(jobs) - len(pending)} of {len(jobs)} CV fits from the search checkpoint")
+
+    def store(position, result):
+        _, entries, counts = jobs[pending[position]]
+        if result[3] == SKIPPED_FIT:
+            return
+        checkpoint.save_fits(entries, _split_result(result, counts))
+        checkpoint.stats[entries[0][0]]["new_fits"] += 1
+
+    fresh = run_pool((jobs[i][0] for i in pending), n_jobs, on_result=store)
+    for i, result in zip(pending, fresh):
+        results[i] = result
+    return results
+
+
+def grid_search(X_train, y_train, X_test, y_test, models, param_grid, n_jobs=-1, cv=3, checkpoint=None):
+    '''
+    Exhaustive CV search of every model's grid on one shared pool.
+    Returns (report, best_models) in the same shape as evaluate_model.
+    '''
+    folds = list(KFold(n_splits=cv).split(X_train))
+    candidates = {
+        model_name: list(ParameterGrid(param_grid.get(model_name, {})))
+        for model_name in models
+    }
+
+    # === 1. CV FITS OF ALL MODELS, SLOWEST FIRST ===
+    jobs = [
+        (model_name, candidate, fold)
+        for model_name in models
+        for candidate in range(len(candidates[model_name]))
+        for fold in range(len(folds))
+    ]
+    jobs.sort(key=lambda job: -candidate_cost(candidates[job[0]][job[1]]))
+    logging.info(f"Scheduling {len(jobs)} CV fits for {len(models)} models on n_jobs={n_jobs}")
+
+    results = run_fits(
+        [
+            (
+                delayed(fit_and_score)(
+                    models[model_name], candidates[model_name][candidate],
+                    X_train, y_train, folds[fold][0], folds[fold][1]
+                ),
+                [(model_name, candidates[model_name][candidate], folds[fold][0], folds[fold][1])],
+                None,
+            )
+            for model_name, candidate, fold in jobs
+        ],
+        n_jobs, checkpoint,
+    )
+
+    scores = {name: np.full((len(candidates[name]), len(folds)), np.nan) for name in models}
+    timing = {name: {"fit_wall_time": 0.0, "fit_cpu_time": 0.0} for name in models}
+    for (model_name, candidate, fold), (score, wall, cpu, error) in zip(jobs, results):
+        scores[model_name][candidate, fold] = score
+        timing[model_name]["fit_wall_time"] += wall
+        timing[model_name]["fit_cpu_time"] += cpu
+        if error is not None:
+            logging.warning(f"{model_name} {candidates[model_name][candidate]} failed on fold {fold}: {error}")
+
+    # === 2. PICK EACH MODEL'S BEST CANDIDATE (first one wins ties, like GridSearchCV) ===
+    best_params = {}
+    for model_name in models:
+        mean_scores = scores[model_name].mean(axis=1)
+        if np.all(np.isnan(mean_scores)):
+            raise ValueError(f"All candidates failed for {model_name}")
+        best_params[model_name] = candidates[model_name][int(np.nanargmax(mean_scores))]
+
+    return finish_search(
+        X_train, y_train, X_test, y_test, models, best_params, timing,
+        n_fits={name: scores[name].size for name in models}, n_jobs=n_jobs, checkpoint=checkpoint,
+    )
+
+
+def finish_search(X_train, y_train, X_test, y_test, models, best_params, timing, n_fits, n_jobs, checkpoint=None):
+    '''
+    Refits every model's best candidate on the full training set (in the
+    pool) and builds the report/best_models pair. Refits stored in the
+    checkpoint are loaded instead.
+    '''
+    names = list(models)
+    refits = {}
+    if checkpoint is not None:
+        for name in names:
+            stored = checkpoint.load_refit(name, best_params[name])
+            if stored is not None:
+                # Refits stored by older runs still carry the pinned threads
+                refits[name] = (restore_threads(stored[0], models[name], best_params[name]),) + tuple(stored[1:])
+                checkpoint.stats[name]["reused_refits"] += 1
+                checkpoint.stats[name]["reused_seconds"] += stored[3]
+    pending = [name for name in names if name not in refits]
+
+    def store(position, result):
+        checkpoint.save_refit(pending[position], best_params[pending[position]], result)
+        checkpoint.stats[pending[position]]["new_refits"] += 1
+
+    fresh = run_pool(
+        (
+            delayed(refit_and_test)(models[name], best_params[name], X_train, y_train, X_test, y_test)
+            for name in pending
+        ),
+        n_jobs, on_result=store if checkpoint is not None else None,
+    )
+    refits.update(zip(pending, fresh))
+
+    report = {}
+    best_models = {}
+    for model_name in names:
+        model, test_r2, test_mae, wall, cpu = refits[model_name]
+        best_models[model_name] = model
+        report[model_name] = {
+            'r2_score': test_r2,
+            'mae': test_mae,
+            'best_params': best_params[model_name],
+            'fit_wall_time': timing[model_name]["fit_wall_time"] + wall,
+            'fit_cpu_time': timing[model_name]["fit_cpu_time"] + cpu,
+            'n_fits': n_fits[model_name] + 1,
+        }
+        logging.info(
+            f"Finished tuning {model_name}. Best R2: {test_r2:.4f} "
+            f"(wall {report[model_name]['fit_wall_time']:.1f}s, cpu {report[model_name]['fit_cpu_time']:.1f}s)"
+        )
+
+    return report, best_models
+
+
+# Estimator parameters that count boosting iterations / trees
+TREE_COUNT_PARAMS = ("n_estimators", "iterations")
+
+
+def _tree_count_param(estimator):
+    available = estimator.get_params()
+    for name in TREE_COUNT_PARAMS:
+        if name in available:
+            return name
+    return None
+
+
+def halving_search(X_train, y_train, X_test, y_test, models, param_grid, n_jobs=-1, cv=3,
+                   factor=3, min_resources=1000, resource="n_samples",
+                   model_time_budget=None, total_time_budget=None, random_state=42, checkpoint=None):
+    '''
+    Successive halving over every model's grid, on the same shared pool.
+
+    Round k scores each model's surviving candidates with `cv`-fold CV on a
+    growing resource, then keeps the best 1/`factor` of them:
+      * resource="n_samples": the first r_k rows of each fold's training part
+      * resource="iterations": the full folds, but each candidate's
+        n_estimators/iterations scaled down to r_k/r_max (models without a
+        tree count fall back to n_samples)
+    Rounds of all models run together. A model stops early when the next
+    round would take it past `model_time_budget` (seconds of fit time spent
+    on that model). `total_time_budget` is a wall-clock deadline for the
+    CV fits: once it passes, fits that have not started are skipped (the
+    ones running finish), and a model whose round was cut short keeps the
+    best candidate of its last complete round (the first of its grid if
+    that was the first round). The refits of the winners
+    come after it. Returns (report, best_models) like grid_search.
+    '''
+    deadline = None if total_time_budget is None else time.time() + total_time_budget
+    rng = np.random.RandomState(random_state)
+    folds = [
+        (rng.permutation(train_idx), val_idx)
+        for train_idx, val_idx in KFold(n_splits=cv).split(X_train)
+    ]
+    max_resources = min(len(train_idx) for train_idx, _ in folds)
+
+    candidates = {
+        model_name: list(ParameterGrid(param_grid.get(model_name, {})))
+        for model_name in models
+    }
+    alive = {name: list(range(len(candidates[name]))) for name in models}
+    best_params = {name: candidates[name][0] for name in models}
+    timing = {name: {"fit_wall_time": 0.0, "fit_cpu_time": 0.0} for name in models}
+    last_round_cost = {name: 0.0 for name in models}
+    n_fits = {name: 0 for name in models}
+    tree_param = {
+        name: _tree_count_param(models[name]) if resource == "iterations" else None
+        for name in models
+    }
+
+    round_number = 0
+    while True:
+        # === 1. WHICH MODELS STILL NEED A ROUND ===
+        searching = []
+        for name in models:
+            if len(alive[name]) <= 1:
+                continue
+            spent = timing[name]["fit_wall_time"]
+            if model_time_budget is not None and spent + last_round_cost[name] > model_time_budget:
+                logging.info(f"{name}: time budget reached after {spent:.1f}s, keeping best so far")
+                continue
+            searching.append(name)
+
+        if not searching:
+            break
+        if deadline is not None and time.time() >= deadline:
+            logging.info("Total search time budget reached, keeping best candidates so far")
+            break
+
+        # === 2. SCORE THE SURVIVORS ON THIS ROUND'S RESOURCE ===
+        jobs = []
+        for name in searching:
+            rounds_left = int(np.ceil(np.log(len(alive[name])) / np.log(factor)))
+            n_resources = int(max(min_resources, max_resources / factor ** max(rounds_left - 1, 0)))
+            n_resources = min(n_resources, max_resources)
+            fraction = n_resources / max_resources
+
+            for candidate in alive[name]:
+                params = dict(candidates[name][candidate])
+                n_rows = n_resources
+                count_param = tree_param[name]
+                base_count = params.get(count_param, models[name].get_params().get(count_param)) if count_param else None
+                if base_count:
+                    params[count_param] = max(1, int(round(base_count * fraction)))
+                    n_rows = max_resources
+                for fold in range(len(folds)):
+                    jobs.append((name, candidate, fold, params, n_rows))
+
+        jobs.sort(key=lambda job: -candidate_cost(job[3]) * job[4])
+        logging.info(f"Halving round {round_number}: {len(jobs)} fits for {len(searching)} models")
+
+        results = run_fits(
+            [
+                (
+                    delayed(fit_and_score)(
+                        models[name], params, X_train, y_train,
+                        folds[fold][0][:n_rows], folds[fold][1], deadline
+                    ),
+                    [(name, params, folds[fold][0][:n_rows], folds[fold][1])],
+                    None,
+                )
+                for name, candidate, fold, params, n_rows in jobs
+            ],
+            n_jobs, checkpoint,
+        )
+
+        # === 3. KEEP THE BEST 1/factor OF EACH MODEL ===
+        round_scores = {name: {} for name in searching}
+        round_cost = {name: 0.0 for name in searching}
+        cut_short = set()
+        for (name, candidate, fold, _, _), (score, wall, cpu, error) in zip(jobs, results):
+            if error == SKIPPED_FIT:
+                cut_short.add(name)
+                continue
+            round_scores[name].setdefault(candidate, []).append(score)
+            round_cost[name] += wall
+            timing[name]["fit_wall_time"] += wall
+            timing[name]["fit_cpu_time"] += cpu
+            n_fits[name] += 1
+            if error is not None:
+                logging.warning(f"{name} {candidates[name][candidate]} failed on fold {fold}: {error}")
+
+        for name in searching:
+            if name in cut_short:
+                # A partial round ranks candidates on different folds: ignore it
+                kept = "the previous round's best" if round_number else "the first candidate"
+                logging.info(f"{name}: total time budget used up during round {round_number}, keeping {kept}")
+                continue
+            mean_scores = {
+                candidate: np.mean(scores) for candidate, scores in round_scores[name].items()
+            }
+            ranked = sorted(
+                alive[name],
+                key=lambda candidate: -np.nan_to_num(mean_scores[candidate], nan=-np.inf),
+            )
+            if np.isnan(mean_scores[ranked[0]]):
+                raise ValueError(f"All candidates failed for {name}")
+            best_params[name] = candidates[name][ranked[0]]
+            alive[name] = ranked[:max(1, int(np.ceil(len(ranked) / factor)))]
+            last_round_cost[name] = round_cost[name]
+
+        round_number += 1
+        if cut_short:
+            break
+
+    for name in models:
+        if len(alive[name]) == 1:
+            best_params[name] = candidates[name][alive[name][0]]
+
+    return finish_search(
+        X_train, y_train, X_test, y_test, models, best_params, timing,
+        n_fits=n_fits, n_jobs=n_jobs, checkpoint=checkpoint,
+    )
+
+
+def staged_predictions(model, X, counts):
+    '''
+    Predictions of the first `count` trees/stages of a fitted ensemble, for
+    every count in `counts`, from that single fit. Returns {count: y_pred},
+    or None if the model type has no prefix predictions.
+    '''
+    kind = type(model).__name__
+    counts = sorted(counts)
+
+    if kind in ("GradientBoostingRegressor", "AdaBoostRegressor"):
+        # staged_predict stops early if boosting did, exactly like a shorter fit would
+        wanted = set(counts)
+        predictions = {}
+        last = None
+        for stage, y_pred in enumerate(model.staged_predict(X), start=1):
+            last = y_pred
+            if stage in wanted:
+                predictions[stage] = y_pred
+        for count in counts:
+            predictions.setdefault(count, last)
+        return predictions
+
+    if kind == "XGBRegressor":
+        return {count: model.predict(X, iteration_range=(0, count)) for count in counts}
+
+    if kind == "CatBoostRegressor":
+        return {count: model.predict(X, ntree_end=count) for count in counts}
+
+    if kind == "RandomForestRegressor":
+        # A forest's first k trees are the k-tree forest (same seeds in the same order)
+        tree_sum = np.zeros(X.shape[0])
+        predictions = {}
+        wanted = set(counts)
+        for n_trees, tree in enumerate(model.estimators_, start=1):
+            tree_sum += tree.predict(X)
+            if n_trees in wanted:
+                predictions[n_trees] = tree_sum / n_trees
+        return predictions
+
+    return None
+
+
+def supports_staging(estimator, grid_params):
+    '''
+    Name of the tree-count parameter that can be staged for this estimator
+    and grid, or None. CatBoost picks its learning rate from `iterations`
+    when none is given, so it is only staged with an explicit learning rate.
+    '''
+    kind = type(estimator).__name__
+    if kind not in ("GradientBoostingRegressor", "AdaBoostRegressor", "XGBRegressor",
+                    "CatBoostRegressor", "RandomForestRegressor"):
+        return None
+    count_param = "iterations" if kind == "CatBoostRegressor" else "n_estimators"
+    if len(grid_params.get(count_param, [])) < 2:
+        return None
+    if kind == "CatBoostRegressor" and "learning_rate" not in grid_params \
+            and estimator.get_params().get("learning_rate") is None:
+        return None
+    if kind == "GradientBoostingRegressor" and estimator.get_params().get("n_iter_no_change") is not None:
+        return None
+    return count_param
+
+
+def fit_and_score_staged(estimator, params, count_param, counts, X, y, train_idx, val_idx):
+    '''
+    Fits one candidate with the largest tree count on one CV fold and
+    scores every count in `counts` from it.
+    Returns ({count: r2}, wall seconds, cpu seconds, error).
+    '''
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        full_params = dict(params, **{count_param: max(counts)})
+        model = pin_threads(estimator, full_params).set_params(**full_params)
+        model.fit(X[train_idx], y[train_idx])
+        y_val = y[val_idx]
+        scores = {
+            count: r2_score(y_val, y_pred)
+            for count, y_pred in staged_predictions(model, X[val_idx], counts).items()
+        }
+        error = None
+    except Exception as e:
+        scores, error = {count: np.nan for count in counts}, str(e)
+    return scores, time.perf_counter() - wall_start, time.process_time() - cpu_start, error
+
+
+def staged_search(X_train, y_train, X_test, y_test, models, param_grid, n_jobs=-1, cv=3, checkpoint=None):
+    '''
+    Exhaustive CV search where tree ensembles are fitted once per
+    combination of their OTHER parameters: the n_estimators/iterations
+    values are all scored from that one fit (staged_predict, XGBoost
+    iteration_range, CatBoost ntree_end, prefixes of a random forest).
+    Other models are searched like grid_search. Same candidates, scores
+    and tie-breaking as the exhaustive grid, for roughly 1/len(n_estimators)
+    of the tree-model fits. Returns (report, best_models).
+    '''
+    folds = list(KFold(n_splits=cv).split(X_train))
+    candidates = {}
+    jobs = []
+    for model_name, estimator in models.items():
+        grid = param_grid.get(model_name, {})
+        candidates[model_name] = list(ParameterGrid(grid))
+        count_param = supports_staging(estimator, grid)
+
+        if count_param is None:
+            for candidate, params in enumerate(candidates[model_name]):
+                for fold in range(len(folds)):
+                    jobs.append((model_name, params, None, None, fold))
+            continue
+
+        counts = sorted(grid[count_param])
+        other_grid = {name: values for name, values in grid.items() if name != count_param}
+        for params in ParameterGrid(other_grid):
+            for fold in range(len(folds)):
+                jobs.append((model_name, params, count_param, counts, fold))
+
+    jobs.sort(key=lambda job: -candidate_cost(
+        dict(job[1], **({job[2]: max(job[3])} if job[2] else {}))
+    ))
+    logging.info(f"Scheduling {len(jobs)} CV fits (staged tree counts) for {len(models)} models on n_jobs={n_jobs}")
+
+    # A staged fit is checkpointed as one entry per tree count, so it can
+    # reuse (and serve) the same candidates' fits of the exhaustive grid
+    results = run_fits(
+        [
+            (
+                delayed(fit_and_score_staged)(
+                    models[model_name], params, count_param, counts,
+                    X_train, y_train, folds[fold][0], folds[fold][1]
+                ),
+                [
+                    (model_name, dict(params, **{count_param: count}), folds[fold][0], folds[fold][1])
+                    for count in counts
+                ],
+                counts,
+            ) if count_param else (
+                delayed(fit_and_score)(
+                    models[model_name], params, X_train, y_train, folds[fold][0], folds[fold][1]
+                ),
+                [(model_name, params, folds[fold][0], folds[fold][1])],
+                None,
+            )
+            for model_name, params, count_param, counts, fold in jobs
+        ],
+        n_jobs, checkpoint,
+    )
+
+    # === MAP EVERY SCORE BACK TO ITS CANDIDATE IN THE FULL GRID ORDER ===
+    scores = {name: np.full((len(candidates[name]), len(folds)), np.nan) for name in models}
+    timing = {name: {"fit_wall_time": 0.0, "fit_cpu_time": 0.0} for name in models}
+    n_fits = {name: 0 for name in models}
+    position = {
+        name: {tuple(sorted(params.items())): i for i, params in enumerate(candidates[name])}
+        for name in models
+    }
+    for (model_name, params, count_param, counts, fold), (result, wall, cpu, error) in zip(jobs, results):
+        timing[model_name]["fit_wall_time"] += wall
+        timing[model_name]["fit_cpu_time"] += cpu
+        n_fits[model_name] += 1
+        if error is not None:
+            logging.warning(f"{model_name} {params} failed on fold {fold}: {error}")
+
+        if count_param is None:
+            scored = {tuple(sorted(params.items())): result}
+        else:
+            scored = {
+                tuple(sorted(dict(params, **{count_param: count}).items())): score
+                for count, score in result.items()
+            }
+        for key, score in scored.items():
+            scores[model_name][position[model_name][key], fold] = score
+
+    best_params = {}
+    for model_name in models:
+        mean_scores = scores[model_name].mean(axis=1)
+        if np.all(np.isnan(mean_scores)):
+            raise ValueError(f"All candidates failed for {model_name}")
+        best_params[model_name] = candidates[model_name][int(np.nanargmax(mean_scores))]
+
+    return finish_search(
+        X_train, y_train, X_test, y_test, models, best_params, timing,
+        n_fits=n_fits, n_jobs=n_jobs, checkpoint=checkpoint,
+    )
+
+
+# Report keys added by measure_serving_cost
+SERVING_COST_KEYS = ('single_row_p50_ms', 'single_row_p99_ms', 'batch_1k_ms',
+                     'artifact_size_bytes', 'load_time_ms')
+
+
+def measure_serving_cost(model, X, single_row_calls=200, batch_size=1000, batch_repeats=5):
+    '''
+    What it costs to serve `model`: predict latency on one row (p50/p99
+    over `single_row_calls` different rows of X) and on a `batch_size`-row
+    batch (median of `batch_repeats`), plus the size of its pickle and the
+    time to load it back. Runs in the calling process, one model at a
+    time, so the numbers are not skewed by other fits.
+    '''
+    n_rows = len(X)
+    rows = np.asarray(X[np.arange(single_row_calls) % n_rows])
+    batch = np.asarray(X[np.arange(batch_size) % n_rows])
+
+    model.predict(rows[:1])  # first call may allocate/compile
+    single = []
+    for i in range(single_row_calls):
+        start = time.perf_counter()
+        model.predict(rows[i:i + 1])
+        single.append(time.perf_counter() - start)
+
+    batched = []
+    for _ in range(batch_repeats):
+        start = time.perf_counter()
+        model.predict(batch)
+        batched.append(time.perf_counter() - start)
+
+    # The same dill pickle save_object writes and the ArtifactStore loads
+    payload = dill.dumps(model)
+    start = time.perf_counter()
+    dill.loads(payload)
+    load_seconds = time.perf_counter() - start
+
+    single_ms = 1000 * np.asarray(single)
+    return {
+        'single_row_p50_ms': float(np.percentile(single_ms, 50)),
+        'single_row_p99_ms': float(np.percentile(single_ms, 99)),
+        # Per 1000 rows, whatever batch_size was
+        'batch_1k_ms': float(1000 * np.median(batched) * 1000 / batch_size),
+        'artifact_size_bytes': len(payload),
+        'load_time_ms': 1000 * load_seconds,
+    }
+
+
+def add_serving_costs(report, best_models, X_test, **options):
+    '''
+    Adds measure_serving_cost's numbers to every model's report entry.
+    '''
+    for model_name, model in best_models.items():
+        report[model_name].update(measure_serving_cost(model, X_test, **options))
+        cost = report[model_name]
+        logging.info(
+            f"{model_name}: single row p50 {cost['single_row_p50_ms']:.3f} ms / "
+            f"p99 {cost['single_row_p99_ms']:.3f} ms, 1k rows {cost['batch_1k_ms']:.1f} ms, "
+            f"{cost['artifact_size_bytes'] / 1e6:.2f} MB, load {cost['load_time_ms']:.1f} ms"
+        )
+    return report
@@ -0,0 +1,417 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Optional
+
+import dill
+import numpy as np
+
+from src.exception import customException
+from src.logger import logging
+from src.pipeline.compiled_encoder import CompiledEncoder
+from src.pipeline.flat_trees import FlatTreeEnsemble
+from src.pipeline.eta_table import EtaLookupTable
+
+
+@dataclass
+class ArtifactStoreConfig:
+    model_file_path: str = os.path.join('artifacts', 'best_model.pkl')
+    preprocessor_file_path: str = os.path.join('artifacts', 'preprocessor.pkl')
+    manifest_file_path: str = os.path.join('artifacts', 'manifest.json')
+    # Optional exports written by ModelTrainer.export_flat_model and
+    # DataTransformation.export_compiled_encoder
+    flat_model_file_path: str = os.path.join('artifacts', 'best_model_flat.npz')
+    compiled_encoder_file_path: str = os.path.join('artifacts', 'preprocessor_compiled.pkl')
+    # Optional ETA lookup table (EtaTableBuilder): its JSON header, the
+    # values it points at are memory-mapped
+    eta_table_file_path: str = os.path.join('artifacts', 'eta_table.json')
+    # Unpickle the model/preprocessor only when they are first used. With
+    # both exports present, the compiled encoder + flat backend never need
+    # them, so a worker starts without importing sklearn or the model library.
+    lazy_unpickle: bool = os.environ.get("ARTIFACTS_LAZY_UNPICKLE", "1") == "1"
+    # How often the background watcher looks for new artifacts (seconds)
+    check_interval_seconds: float = 2.0
+
+
+class _Lazy:
+    '''
+    A value computed once, on first get().
+    '''
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._factory is not None:
+            with self._lock:
+                if self._factory is not None:
+                    self._value = self._factory()
+                    # Drops whatever the factory held (e.g. the pickle bytes)
+                    self._factory = None
+        return self._value
+
+
+class _Pickled(_Lazy):
+    '''
+    Verified pickle bytes, unpickled once on first get().
+    '''
+
+    def __init__(self, payload):
+        super().__init__(lambda: dill.loads(payload))
+
+
+class ArtifactBundle:
+    '''
+    A model and the preprocessor it was trained with.
+    They are always loaded and swapped together, never one at a time.
+
+    `model` and `preprocessor` may be given as _Pickled bytes (already
+    checked against the manifest); they are then unpickled on first access.
+    `encoder` and `flat_model` may likewise be _Lazy, built the first time
+    a predict path asks for them.
+    '''
+    __slots__ = ("_model", "_preprocessor", "version", "loaded_at", "_encoder", "_flat_model", "eta_table")
+
+    def __init__(self, model: Any, preprocessor: Any, version: str, loaded_at: float,
+                 encoder: Any = None, flat_model: Any = None,
+                 eta_table: Optional[EtaLookupTable] = None):
+        self._model = model
+        self._preprocessor = preprocessor
+        self.version = version
+        self.loaded_at = loaded_at
+        self._encoder = encoder
+        self._flat_model = flat_model
+        # Precomputed predictions of this model/preprocessor pair, None if
+        # no table was built for them
+        self.eta_table = eta_table
+
+    @property
+    def model(self):
+        return _resolved(self._model)
+
+    @property
+    def preprocessor(self):
+        return _resolved(self._preprocessor)
+
+    @property
+    def encoder(self) -> Optional[CompiledEncoder]:
+        # Pandas-free copy of `preprocessor`, None if it could not be compiled
+        return _resolved(self._encoder)
+
+    @property
+    def flat_model(self) -> Optional[FlatTreeEnsemble]:
+        # Flattened copy of `model`, None if it is not a supported tree model
+        return _resolved(self._flat_model)
+
+
+class ArtifactStore:
+    '''
+    Keeps the model/preprocessor pair in memory for the whole process.
+
+    The predict path only reads `self._bundle`, which is replaced in a single
+    assignment, so it never takes a lock and never sees a half-swapped pair.
+    A daemon thread polls the artifacts and loads a new pair when training
+    publishes one:
+
+    * If `manifest.json` exists (written by the training pipeline after BOTH
+      files are saved) its version is the trigger. It points at the
+      published copies in artifacts/versions/<version>/, which training
+      never rewrites, and they are only loaded when their sha256 matches.
+    * Without a manifest the two files are loaded once, at startup. They
+      are not hot-reloaded: a change to them may be half of a new pair.
+    '''
+
+    def __init__(self, config: Optional[ArtifactStoreConfig] = None):
+        self.config = config or ArtifactStoreConfig()
+        self._bundle: Optional[ArtifactBundle] = None
+        self._signature = None
+        self._reload_lock = threading.Lock()
+        self._watcher_pid = None
+        self._warming_pid = None
+
+    def get(self) -> ArtifactBundle:
+        '''
+        Returns the current bundle, loading it on first use.
+        '''
+        bundle = self._bundle
+        if bundle is None:
+            bundle = self._initial_load()
+        if self._watcher_pid != os.getpid():
+            self._start_watcher()
+        return bundle
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._bundle is not None
+
+    def preload(self, encoder: bool = True, flat_model: bool = True) -> ArtifactBundle:
+        '''
+        Loads the artifacts and runs one warm-up prediction WITHOUT starting
+        the watcher thread. Meant for a pre-fork server master: workers
+        inherit the loaded objects copy-on-write and each starts its own
+        watcher on its first get(). `encoder` / `flat_model` say whether the
+        serving config uses the compiled encoder / flat backend; only those
+        are built here.
+        '''
+        bundle = self._bundle or self._initial_load()
+        # Unpickle everything here, even with lazy_unpickle, so the workers
+        # share it instead of each importing sklearn and the model library
+        bundle.model, bundle.preprocessor
+        try:
+            if encoder and bundle.encoder is not None:
+                n_features = bundle.encoder.n_features
+            else:
+                n_features = len(bundle.preprocessor.get_feature_names_out())
+            bundle.model.predict(np.zeros((1, n_features)))
+            if flat_model and bundle.flat_model is not None:
+                bundle.flat_model.predict(np.zeros((1, n_features)))
+        except Exception as e:
+            # The artifacts are loaded; a failed warm-up only costs latency later
+            logging.warning(f"Warm-up prediction failed: {e}")
+        logging.info(f"Preloaded artifacts version {bundle.version}")
+        return bundle
+
+    def warm_in_background(self):
+        '''
+        Starts loading the artifacts on a daemon thread (once per process)
+        so a readiness probe can report progress instead of blocking.
+        '''
+        # A held reload lock means a load is already in progress
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            if self._bundle is not None or self._warming_pid == os.getpid():
+                return
+            self._warming_pid = os.getpid()
+        finally:
+            self._reload_lock.release()
+
+        def warm():
+            try:
+                self.get()
+            except Exception:
+                logging.error("Background artifact warm-up failed")
+                self._warming_pid = None
+
+        threading.Thread(target=warm, name="artifact-store-warmup", daemon=True).start()
+
+    def refresh(self) -> bool:
+        '''
+        Checks the artifacts once and swaps in a new pair if they changed.
+        Returns True when a new bundle was installed.
+        '''
+        with self._reload_lock:
+            try:
+                signature = self._current_signature()
+                if signature is None or signature == self._signature:
+                    return False
+                if signature[0] == "files" and self._bundle is not None:
+                    # Training may have saved only one of the two files so far
+                    logging.warning("Artifacts changed but there is no manifest to publish them; "
+                                    "restart to load them")
+                    self._signature = signature
+                    return False
+
+                loaded = self._load_pair(signature)
+                if loaded is None:
+                    return False
+
+                model_bytes, preprocessor_bytes, version, model_sha256, preprocessor_sha256 = loaded
+                model, preprocessor = _Pickled(model_bytes), _Pickled(preprocessor_bytes)
+                if not self.config.lazy_unpickle:
+                    model, preprocessor = model.get(), preprocessor.get()
+                self._bundle = ArtifactBundle(
+                    model=model,
+                    preprocessor=preprocessor,
+                    version=version,
+                    loaded_at=time.time(),
+                    # Only built when a predict path uses them, so the native
+                    # backend never pays for flattening on a (re)load
+                    encoder=_Lazy(partial(_load_encoder, preprocessor, preprocessor_sha256,
+                                          self.config.compiled_encoder_file_path)),
+                    flat_model=_Lazy(partial(_flatten_model, model, model_sha256,
+                                             self.config.flat_model_file_path)),
+                    eta_table=_load_eta_table(model_sha256, preprocessor_sha256, self.config.eta_table_file_path),
+                )
+                self._signature = signature
+                logging.info(f"Loaded artifacts version {version}")
+                return True
+
+            except Exception as e:
+                raise customException(e)
+
+    def _initial_load(self) -> ArtifactBundle:
+        # Concurrent first callers queue on the reload lock; only the first
+        # one actually loads, the rest see an unchanged signature.
+        self.refresh()
+        bundle = self._bundle
+        if bundle is None:
+            raise customException(
+                f"Artifacts are not available at {self.config.model_file_path} "
+                f"and {self.config.preprocessor_file_path}"
+            )
+        return bundle
+
+    def _start_watcher(self):
+        # Threads do not survive fork (gunicorn workers), so the watcher is
+        # started per process the first time that process asks for the bundle.
+        with self._reload_lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+        watcher = threading.Thread(
+            target=self._watch, name="artifact-store-watcher", daemon=True
+        )
+        watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.config.check_interval_seconds)
+            try:
+                self.refresh()
+            except Exception:
+                # Keep serving the bundle we already have
+                logging.error("Artifact reload failed, keeping current artifacts")
+
+    def _current_signature(self):
+        manifest_stat = _stat_signature(self.config.manifest_file_path)
+        if manifest_stat is not None:
+            return ("manifest",) + manifest_stat
+
+        model_stat = _stat_signature(self.config.model_file_path)
+        preprocessor_stat = _stat_signature(self.config.preprocessor_file_path)
+        if model_stat is None or preprocessor_stat is None:
+            return None
+        return ("files",) + model_stat + preprocessor_stat
+
+    def _load_pair(self, signature):
+        if signature[0] == "manifest":
+            return self._load_from_manifest()
+
+        model_bytes = _read_bytes(self.config.model_file_path)
+        preprocessor_bytes = _read_bytes(self.config.preprocessor_file_path)
+
+        # A file was replaced while we were reading: try again next poll
+        if self._current_signature() != signature:
+            logging.info("Artifacts changed while loading, retrying later")
+            return None
+
+        version = hashlib.sha256(repr(signature).encode()).hexdigest()[:12]
+        return (model_bytes, preprocessor_bytes, version,
+                hashlib.sha256(model_bytes).hexdigest(), hashlib.sha256(preprocessor_bytes).hexdigest())
+
+    def _load_from_manifest(self):
+        with open(self.config.manifest_file_path) as file_obj:
+            manifest = json.load(file_obj)
+
+        # The published copies; manifests written before those existed
+        # point at the files training writes
+        model_bytes = _read_bytes(manifest["model"].get("path", self.config.model_file_path))
+        preprocessor_bytes = _read_bytes(manifest["preprocessor"].get("path", self.config.preprocessor_file_path))
+
+        # A copy that does not match (an older manifest while training rewrites
+        # the files) is never mixed with the other one: keep the previous pair
+        if (
+            hashlib.sha256(model_bytes).hexdigest() != manifest["model"]["sha256"]
+            or hashlib.sha256(preprocessor_bytes).hexdigest() != manifest["preprocessor"]["sha256"]
+        ):
+            logging.info("Artifacts do not match manifest yet, retrying later")
+            return None
+
+        return (model_bytes, preprocessor_bytes, manifest["version"],
+                manifest["model"]["sha256"], manifest["preprocessor"]["sha256"])
+
+
+def _resolved(artifact):
+    return artifact.get() if isinstance(artifact, _Lazy) else artifact
+
+
+def _load_encoder(preprocessor, preprocessor_sha256, compiled_encoder_file_path):
+    # The exported encoder when it was compiled from this very pickle,
+    # otherwise compile the preprocessor here
+    if os.path.exists(compiled_encoder_file_path):
+        try:
+            encoder = _load_file(compiled_encoder_file_path)
+            if getattr(encoder, "source_sha256", None) == preprocessor_sha256:
+                return encoder
+            logging.info("Compiled encoder export does not match the preprocessor, compiling it again")
+        except Exception:
+            logging.warning(f"Could not read {compiled_encoder_file_path}, compiling the preprocessor again")
+    try:
+        return CompiledEncoder.from_preprocessor(_resolved(preprocessor))
+    except (ValueError, AttributeError) as e:
+        logging.warning(f"Preprocessor cannot be compiled, using sklearn transform only: {e}")
+        return None
+
+
+def _flatten_model(model, model_sha256, flat_model_file_path):
+    # The exported arrays when they were made from this very pickle,
+    # otherwise flatten the loaded model here
+    if os.path.exists(flat_model_file_path):
+        try:
+            flat_model = FlatTreeEnsemble.load(flat_model_file_path)
+            if flat_model.source_sha256 == model_sha256:
+                return flat_model
+            logging.info("Flat model export does not match the model, flattening it again")
+        except Exception:
+            logging.warning(f"Could not read {flat_model_file_path}, flattening the model again")
+    try:
+        return FlatTreeEnsemble.from_model(_resolved(model))
+    except ValueError as e:
+        logging.info(f"No flat model backend: {e}")
+        return None
+
+
+def _load_eta_table(model_sha256, preprocessor_sha256, eta_table_file_path):
+    # Only a table computed with this very model and preprocessor; unlike
+    # the other exports it is never rebuilt at load time
+    if not os.path.exists(eta_table_file_path):
+        return None
+    try:
+        table = EtaLookupTable.load(eta_table_file_path)
+    except Exception:
+        logging.warning(f"Could not read {eta_table_file_path}, serving without the ETA table")
+        return None
+    if table.source_sha256 != model_sha256 or table.preprocessor_sha256 != preprocessor_sha256:
+        logging.info("ETA table was built for other artifacts, serving without it")
+        return None
+    return table
+
+
+def _stat_signature(file_path):
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _read_bytes(file_path):
+    with open(file_path, "rb") as file_obj:
+        return file_obj.read()
+
+
+def _load_file(file_path):
+    return dill.loads(_read_bytes(file_path))
+
+
+_store: Optional[ArtifactStore] = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    '''
+    Returns the process-wide ArtifactStore.
+    '''
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ArtifactStore()
+    return _store
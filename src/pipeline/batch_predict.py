@@ -0,0 +1,177 @@
+'''
+Offline bulk scoring of order files.
+
+    python -m src.pipeline.batch_predict orders.csv predictions.csv
+    python -m src.pipeline.batch_predict orders.parquet out.parquet --workers 4 --chunk-size 100000
+
+The input is streamed in fixed-size chunks, each chunk goes through the
+fitted preprocessor and model in one call, and its predictions are written
+before the next chunk is read. At most `2 * workers` chunks are in memory
+at any time, so memory use does not depend on the size of the file.
+'''
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.exception import customException
+from src.logger import logging
+from src.pipeline.artifact_store import ArtifactStoreConfig
+from src.utils import load_object
+
+PREDICTION_COLUMN = "Predicted_Delivery_Time_min"
+
+# Model/preprocessor for the current process (each pool worker loads its own once)
+_worker_artifacts = None
+
+
+def _init_worker(model_path, preprocessor_path):
+    global _worker_artifacts
+    _worker_artifacts = (load_object(model_path), load_object(preprocessor_path))
+
+
+def score_chunk(chunk):
+    '''
+    Adds the prediction column (minutes) to one chunk of orders.
+    '''
+    model, preprocessor = _worker_artifacts
+    data_scaled = preprocessor.transform(chunk)
+    chunk[PREDICTION_COLUMN] = np.round(np.asarray(model.predict(data_scaled), dtype=float) * 60, 2)
+    return chunk
+
+
+def read_chunks(input_path, chunk_size):
+    '''
+    Yields DataFrames of at most `chunk_size` rows from a CSV or Parquet file.
+    '''
+    if input_path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(input_path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(input_path, chunksize=chunk_size)
+
+
+class ChunkWriter:
+    '''
+    Appends scored chunks to a CSV or Parquet file as they arrive.
+    '''
+
+    def __init__(self, output_path, output_format):
+        self.output_path = output_path
+        self.output_format = output_format
+        self._parquet_writer = None
+        self._wrote_header = False
+
+    def write(self, chunk):
+        if self.output_format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.output_path, table.schema)
+            else:
+                # CSV chunks can infer different dtypes (e.g. int vs float)
+                table = table.cast(self._parquet_writer.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            chunk.to_csv(
+                self.output_path,
+                mode="a" if self._wrote_header else "w",
+                header=not self._wrote_header,
+                index=False,
+            )
+            self._wrote_header = True
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+
+def run_batch_prediction(input_path, output_path, chunk_size=50000, workers=1,
+                         output_format=None, model_path=None, preprocessor_path=None):
+    '''
+    Scores `input_path` into `output_path` and returns (rows, seconds).
+    '''
+    try:
+        store_config = ArtifactStoreConfig()
+        model_path = model_path or store_config.model_file_path
+        preprocessor_path = preprocessor_path or store_config.preprocessor_file_path
+        if output_format is None:
+            output_format = "parquet" if output_path.endswith(".parquet") else "csv"
+
+        logging.info(f"Batch prediction: {input_path} -> {output_path} "
+                     f"(chunk_size={chunk_size}, workers={workers}, format={output_format})")
+
+        start = time.perf_counter()
+        rows = 0
+        writer = ChunkWriter(output_path, output_format)
+        try:
+            if workers <= 1:
+                _init_worker(model_path, preprocessor_path)
+                for chunk in read_chunks(input_path, chunk_size):
+                    scored = score_chunk(chunk)
+                    writer.write(scored)
+                    rows += len(scored)
+            else:
+                with ProcessPoolExecutor(
+                    max_workers=workers,
+                    initializer=_init_worker,
+                    initargs=(model_path, preprocessor_path),
+                ) as pool:
+                    # Bounded window of in-flight chunks, written back in input order
+                    pending = deque()
+                    for chunk in read_chunks(input_path, chunk_size):
+                        pending.append(pool.submit(score_chunk, chunk))
+                        if len(pending) >= 2 * workers:
+                            scored = pending.popleft().result()
+                            writer.write(scored)
+                            rows += len(scored)
+                    while pending:
+                        scored = pending.popleft().result()
+                        writer.write(scored)
+                        rows += len(scored)
+        finally:
+            writer.close()
+
+        elapsed = time.perf_counter() - start
+        logging.info(f"Batch prediction finished: {rows} rows in {elapsed:.2f}s")
+        return rows, elapsed
+
+    except Exception as e:
+        raise customException(e)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a CSV/Parquet file of orders in chunks.")
+    parser.add_argument("input_path", help="orders file (.csv or .parquet)")
+    parser.add_argument("output_path", help="where to write the scored orders")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="rows per chunk (default: 50000)")
+    parser.add_argument("--workers", type=int, default=1, help="processes scoring chunks in parallel (default: 1)")
+    parser.add_argument("--format", dest="output_format", choices=["csv", "parquet"],
+                        help="output format (default: from the output file extension)")
+    parser.add_argument("--model-path", help="model pickle (default: artifacts/best_model.pkl)")
+    parser.add_argument("--preprocessor-path", help="preprocessor pickle (default: artifacts/preprocessor.pkl)")
+    args = parser.parse_args(argv)
+
+    rows, elapsed = run_batch_prediction(
+        input_path=args.input_path,
+        output_path=args.output_path,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        output_format=args.output_format,
+        model_path=args.model_path,
+        preprocessor_path=args.preprocessor_path,
+    )
+    rate = rows / elapsed if elapsed > 0 else float("inf")
+    print(f"Scored {rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec) -> {args.output_path}")
+
+
+if __name__ == "__main__":
+    main()
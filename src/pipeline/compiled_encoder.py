@@ -0,0 +1,304 @@
+import numpy as np
+
+from src.exception import customException
+
+
+class CompiledEncoder:
+    '''
+    A pandas-free copy of the fitted preprocessor for single-row scoring.
+
+    `from_preprocessor` reads the fitted ColumnTransformer (imputer
+    statistics, scaler centers/scales and one-hot category tables) into flat
+    arrays and dicts. `encode` then maps one raw order, given as a dict or as
+    a tuple in the training column order, straight to the feature vector.
+    The arithmetic is the same as sklearn's (x - center) / scale in float64,
+    so the output is identical to `preprocessor.transform`.
+
+    Supported pipeline steps: SimpleImputer, OneHotEncoder, RobustScaler,
+    StandardScaler and the normalize_category_values FunctionTransformer.
+    Anything else raises ValueError at compile time so the caller can keep
+    using the sklearn preprocessor.
+    '''
+
+    def __init__(self, input_columns, n_features,
+                 num_columns, num_fill, num_center, num_scale, num_out_idx,
+                 cat_columns, cat_fill, cat_tables, cat_out_slices, cat_base, cat_hot,
+                 cat_strip=None):
+        self.input_columns = list(input_columns)
+        self.n_features = n_features
+
+        self.num_columns = list(num_columns)
+        self.num_fill = num_fill
+        self.num_center = num_center
+        self.num_scale = num_scale
+        self.num_out_idx = num_out_idx
+
+        self.cat_columns = list(cat_columns)
+        self.cat_fill = list(cat_fill)
+        self.cat_tables = cat_tables
+        self.cat_out_slices = cat_out_slices
+        # Output value of every one-hot column when its category is off / on
+        self.cat_base = cat_base
+        self.cat_hot = cat_hot
+        # Whether each categorical value is whitespace-stripped before lookup
+        self.cat_strip = list(cat_strip) if cat_strip is not None else [False] * len(self.cat_columns)
+        # sha256 of the preprocessor pickle this was compiled from, set when
+        # it is exported (DataTransformation.export_compiled_encoder)
+        self.source_sha256 = ""
+
+        position = {column: i for i, column in enumerate(self.input_columns)}
+        self._num_positions = [position[column] for column in self.num_columns]
+        self._cat_positions = [position[column] for column in self.cat_columns]
+
+        # Every output position not written per row starts from its "off" value
+        self._template = np.zeros(n_features, dtype=np.float64)
+        for out_slice in cat_out_slices:
+            self._template[out_slice] = cat_base[out_slice]
+
+    @classmethod
+    def from_preprocessor(cls, preprocessor):
+        '''
+        Compiles a fitted ColumnTransformer. Raises ValueError for
+        transformers this encoder cannot reproduce exactly.
+        '''
+        input_columns = list(preprocessor.feature_names_in_)
+        n_features = 0
+
+        num_columns, num_fill, num_center, num_scale, num_out_idx = [], [], [], [], []
+        cat_columns, cat_fill, cat_tables, cat_out_slices, cat_strip = [], [], [], [], []
+        cat_base, cat_hot = [], []
+
+        for name, transformer, columns in preprocessor.transformers_:
+            if transformer == "drop" or name == "remainder":
+                if transformer != "drop":
+                    raise ValueError("remainder columns are not supported")
+                continue
+            columns = list(columns)
+            steps = [step for _, step in getattr(transformer, "steps", [(name, transformer)])]
+            out_slice = preprocessor.output_indices_[name]
+
+            if any(type(step).__name__ == "OneHotEncoder" for step in steps):
+                tables, fills, base, hot, slices, strip = _compile_categorical(steps, columns, out_slice.start)
+                cat_strip += [strip] * len(columns)
+                cat_columns += columns
+                cat_fill += fills
+                cat_tables += tables
+                cat_out_slices += slices
+                cat_base.append(base)
+                cat_hot.append(hot)
+            else:
+                fill, center, scale = _compile_numerical(steps, len(columns))
+                num_columns += columns
+                num_fill.append(fill)
+                num_center.append(center)
+                num_scale.append(scale)
+                num_out_idx.append(np.arange(out_slice.start, out_slice.stop))
+
+            n_features = max(n_features, out_slice.stop)
+
+        full_base = np.zeros(n_features, dtype=np.float64)
+        full_hot = np.zeros(n_features, dtype=np.float64)
+        # Scatter the per-transformer one-hot values into full-width vectors
+        offset = 0
+        flat_base = np.concatenate(cat_base) if cat_base else np.empty(0)
+        flat_hot = np.concatenate(cat_hot) if cat_hot else np.empty(0)
+        for out_slice in cat_out_slices:
+            width = out_slice.stop - out_slice.start
+            full_base[out_slice] = flat_base[offset:offset + width]
+            full_hot[out_slice] = flat_hot[offset:offset + width]
+            offset += width
+
+        return cls(
+            input_columns=input_columns,
+            n_features=n_features,
+            num_columns=num_columns,
+            num_fill=np.concatenate(num_fill) if num_fill else np.empty(0),
+            num_center=np.concatenate(num_center) if num_center else np.empty(0),
+            num_scale=np.concatenate(num_scale) if num_scale else np.empty(0),
+            num_out_idx=np.concatenate(num_out_idx) if num_out_idx else np.empty(0, dtype=int),
+            cat_columns=cat_columns,
+            cat_fill=cat_fill,
+            cat_tables=cat_tables,
+            cat_out_slices=cat_out_slices,
+            cat_base=full_base,
+            cat_hot=full_hot,
+            cat_strip=cat_strip,
+        )
+
+    def encode(self, row):
+        '''
+        One raw order (dict, or tuple/list in `input_columns` order)
+        -> 1-D float64 feature vector.
+        '''
+        try:
+            if isinstance(row, dict):
+                num_values = [row[column] for column in self.num_columns]
+                cat_values = [row[column] for column in self.cat_columns]
+            else:
+                num_values = [row[i] for i in self._num_positions]
+                cat_values = [row[i] for i in self._cat_positions]
+
+            out = self._template.copy()
+
+            nums = np.array([np.nan if value is None else value for value in num_values], dtype=np.float64)
+            missing = np.isnan(nums)
+            if missing.any():
+                nums[missing] = self.num_fill[missing]
+            out[self.num_out_idx] = (nums - self.num_center) / self.num_scale
+
+            for j, value in enumerate(cat_values):
+                if value is None or value != value:
+                    value = self.cat_fill[j]
+                elif self.cat_strip[j] and isinstance(value, str):
+                    value = value.strip()
+                index = self.cat_tables[j].get(value)
+                if index is not None:
+                    out[index] = self.cat_hot[index]
+
+            return out
+
+        except Exception as e:
+            raise customException(e)
+
+    def transform(self, rows):
+        '''
+        Several raw orders -> 2-D feature matrix (one `encode` per row).
+        '''
+        return np.vstack([self.encode(row) for row in rows])
+
+    def transform_arrays(self, numerical, categorical, numerical_columns, categorical_columns):
+        '''
+        Column-ordered arrays (as from CustomData.many_to_arrays) -> 2-D
+        feature matrix. The numerical part is encoded as whole columns;
+        only the category lookups run per value.
+        '''
+        try:
+            numerical = np.asarray(numerical, dtype=np.float64)
+            categorical = np.asarray(categorical, dtype=object)
+            if list(numerical_columns) != self.num_columns:
+                numerical = numerical[:, [list(numerical_columns).index(column) for column in self.num_columns]]
+            if list(categorical_columns) != self.cat_columns:
+                categorical = categorical[:, [list(categorical_columns).index(column) for column in self.cat_columns]]
+
+            n_rows = numerical.shape[0]
+            out = np.tile(self._template, (n_rows, 1))
+
+            missing = np.isnan(numerical)
+            if missing.any():
+                numerical = np.where(missing, self.num_fill, numerical)
+            out[:, self.num_out_idx] = (numerical - self.num_center) / self.num_scale
+
+            for j, table in enumerate(self.cat_tables):
+                fill = self.cat_fill[j]
+                strip = self.cat_strip[j]
+                for i, value in enumerate(categorical[:, j]):
+                    if value is None or value != value:
+                        value = fill
+                    elif strip and isinstance(value, str):
+                        value = value.strip()
+                    index = table.get(value)
+                    if index is not None:
+                        out[i, index] = self.cat_hot[index]
+
+            return out
+
+        except Exception as e:
+            raise customException(e)
+
+
+def _compile_numerical(steps, n_columns):
+    fill = None
+    center = np.zeros(n_columns)
+    scale = np.ones(n_columns)
+    scaled = False
+
+    for step in steps:
+        kind = type(step).__name__
+        if kind == "SimpleImputer" and not scaled:
+            _check_imputer(step)
+            fill = np.asarray(step.statistics_, dtype=np.float64)
+        elif kind in ("RobustScaler", "StandardScaler") and not scaled:
+            center, scale = _scaler_constants(step, n_columns)
+            scaled = True
+        else:
+            raise ValueError(f"cannot compile numerical step {kind}")
+
+    if fill is None:
+        # No imputer: missing values stay NaN, as they would in sklearn
+        fill = np.full(n_columns, np.nan)
+    elif np.isnan(fill).any():
+        # sklearn drops all-missing columns in that case; not reproduced here
+        raise ValueError("numerical imputer has NaN statistics")
+    return fill, center, scale
+
+
+def _compile_categorical(steps, columns, out_start):
+    fills = [None] * len(columns)
+    encoder = None
+    strip = False
+    center = None
+    scale = None
+
+    for step in steps:
+        kind = type(step).__name__
+        if kind == "FunctionTransformer" and encoder is None \
+                and getattr(step.func, "__name__", None) == "normalize_category_values":
+            strip = True
+        elif kind == "SimpleImputer" and encoder is None:
+            _check_imputer(step)
+            fills = list(step.statistics_)
+        elif kind == "OneHotEncoder" and encoder is None:
+            if getattr(step, "drop_idx_", None) is not None:
+                raise ValueError("OneHotEncoder with drop is not supported")
+            if getattr(step, "_infrequent_enabled", False):
+                raise ValueError("OneHotEncoder with infrequent categories is not supported")
+            if step.handle_unknown not in ("ignore", "infrequent_if_exist"):
+                raise ValueError("OneHotEncoder must use handle_unknown='ignore'")
+            encoder = step
+        elif kind in ("RobustScaler", "StandardScaler") and encoder is not None and center is None:
+            width = sum(len(categories) for categories in encoder.categories_)
+            center, scale = _scaler_constants(step, width)
+        else:
+            raise ValueError(f"cannot compile categorical step {kind}")
+
+    width = sum(len(categories) for categories in encoder.categories_)
+    if center is None:
+        center, scale = np.zeros(width), np.ones(width)
+
+    # Same operation order as the scaler: (x - center) / scale
+    base = (0.0 - center) / scale
+    hot = (1.0 - center) / scale
+
+    tables, slices = [], []
+    offset = out_start
+    for categories in encoder.categories_:
+        tables.append({category: offset + i for i, category in enumerate(categories.tolist())})
+        slices.append(slice(offset, offset + len(categories)))
+        offset += len(categories)
+
+    return tables, fills, base, hot, slices, strip
+
+
+def _check_imputer(imputer):
+    missing_values = imputer.missing_values
+    if not (missing_values is None or (isinstance(missing_values, float) and np.isnan(missing_values))):
+        raise ValueError("only NaN/None missing_values are supported")
+    if getattr(imputer, "add_indicator", False):
+        raise ValueError("SimpleImputer(add_indicator=True) is not supported")
+
+
+def _scaler_constants(scaler, n_columns):
+    kind = type(scaler).__name__
+    center = np.zeros(n_columns)
+    scale = np.ones(n_columns)
+    if kind == "RobustScaler":
+        if scaler.with_centering:
+            center = np.asarray(scaler.center_, dtype=np.float64)
+        if scaler.with_scaling:
+            scale = np.asarray(scaler.scale_, dtype=np.float64)
+    else:
+        if scaler.with_mean:
+            center = np.asarray(scaler.mean_, dtype=np.float64)
+        if scaler.with_std:
+            scale = np.asarray(scaler.scale_, dtype=np.float64)
+    return center, scale
@@ -0,0 +1,289 @@
+import os
+import glob
+import json
+import hashlib
+import tempfile
+import threading
+
+import numpy as np
+
+from src.components.feature_columns import NUMERICAL_COLUMNS, CATEGORICAL_COLUMNS
+
+# Bump when the layout below changes
+ETA_TABLE_FORMAT_VERSION = 4
+
+# Slack on the per-feature bounds, so a value sitting exactly on a grid
+# point is not rejected over float rounding
+_BOUND_SLACK = 1e-9
+
+
+class EtaLookupTable:
+    '''
+    Precomputed model predictions on a quantized grid, for answering
+    common orders without the preprocessor or the model.
+
+    The key of an order is
+      * its values of `key_categorical`, matched exactly against the
+        `combos` (the most frequent combinations of the training data),
+        after the same whitespace stripping the preprocessor applies
+        (the columns in `strip_categorical`)
+      * its values of the `numeric` key features, each snapped to a grid
+        of `step` from `low` (n_bins points); the order only hits when it
+        lies within `max_error` of its grid point, the error bound
+        configured for that feature
+    Every other input was fixed at a reference value of each combination
+    when the table was built (`fixed_numerical` / `fixed_categorical`, one
+    value per combo), and the order only hits when it is close to it: a
+    numerical one within its `max_error`, a categorical one equal to it.
+    Cells whose value is NaN (the model was not flat around them) are
+    misses too.
+
+    `values` is a flat float32 array (combo-major, then the numeric key
+    features in order, like np.ravel_multi_index), usually memory-mapped
+    from its .npy file, so lookups are index arithmetic and one gather and
+    the pages are shared between workers. Everything needed to use it is in
+    the JSON header, including the name of that .npy file, the sha256 of
+    the model and preprocessor it was computed with and the build report.
+
+    Only numpy is used, so serving from the table imports nothing heavy.
+    '''
+
+    def __init__(self, values, key_categorical, combos, numeric, fixed_numerical, fixed_categorical,
+                 strip_categorical=None, source_sha256=None, preprocessor_sha256=None, report=None):
+        self.values = values
+        self.key_categorical = list(key_categorical)
+        self.strip_categorical = sorted(strip_categorical or [])
+        self.combos = [tuple(combo) for combo in combos]
+        # [{"name", "low", "step", "n_bins", "max_error"}, ...]
+        self.numeric = [dict(spec) for spec in numeric]
+        # {name: {"values": per combo, "max_error"}} / {name: per combo}
+        self.fixed_numerical = {name: dict(spec) for name, spec in fixed_numerical.items()}
+        self.fixed_categorical = dict(fixed_categorical)
+        self.source_sha256 = source_sha256
+        self.preprocessor_sha256 = preprocessor_sha256
+        self.report = report or {}
+
+        self.shape = (len(self.combos),) + tuple(spec["n_bins"] for spec in self.numeric)
+        if len(self.values) != int(np.prod(self.shape)):
+            raise ValueError(f"Table has {len(self.values)} values, expected {int(np.prod(self.shape))}")
+
+        unbounded = [name for name, spec in self.fixed_numerical.items() if spec.get("max_error") is None]
+        if unbounded:
+            raise ValueError(f"Fixed numerical inputs without a max_error: {unbounded}")
+        for name, values in [(name, spec["values"]) for name, spec in self.fixed_numerical.items()] \
+                + list(self.fixed_categorical.items()):
+            if len(values) != len(self.combos):
+                raise ValueError(f"{name} has {len(values)} reference values for {len(self.combos)} combinations")
+
+        # Each key column's values get integer codes, and each combination
+        # the mixed-radix number of its codes; lookups search those numbers
+        self._categorical_index = [CATEGORICAL_COLUMNS.index(name) for name in self.key_categorical]
+        self._strip_key = [name in self.strip_categorical for name in self.key_categorical]
+        self._vocabularies = [
+            {value: code for code, value in enumerate(sorted({combo[j] for combo in self.combos}))}
+            for j in range(len(self.key_categorical))
+        ]
+        combo_codes = np.zeros(len(self.combos), dtype=np.int64)
+        for j, vocabulary in enumerate(self._vocabularies):
+            combo_codes = combo_codes * len(vocabulary) + [vocabulary[combo[j]] for combo in self.combos]
+        self._combo_order = np.argsort(combo_codes)
+        self._combo_codes = combo_codes[self._combo_order]
+        self._numeric_index = [NUMERICAL_COLUMNS.index(spec["name"]) for spec in self.numeric]
+        self._fixed_numerical = [
+            (NUMERICAL_COLUMNS.index(name), np.asarray(spec["values"], dtype=np.float64), spec["max_error"])
+            for name, spec in self.fixed_numerical.items()
+        ]
+        self._fixed_categorical = []
+        for name, values in self.fixed_categorical.items():
+            vocabulary = {value: code for code, value in enumerate(sorted(set(values)))}
+            self._fixed_categorical.append((
+                CATEGORICAL_COLUMNS.index(name), vocabulary,
+                np.array([vocabulary[value] for value in values], dtype=np.int64), name in self.strip_categorical,
+            ))
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.audited = 0
+        self.max_audited_deviation = 0.0
+        self._hits_since_audit = 0
+
+    @property
+    def n_cells(self):
+        return len(self.values)
+
+    def grid_points(self, spec_index):
+        spec = self.numeric[spec_index]
+        return spec["low"] + spec["step"] * np.arange(spec["n_bins"])
+
+    def lookup(self, numerical, categorical):
+        '''
+        Table answers for encoded-to-be inputs: `numerical` (n, 11) floats in
+        NUMERICAL_COLUMNS order and `categorical` (n, 7) in
+        CATEGORICAL_COLUMNS order (CustomData.many_to_arrays). Returns
+        (predictions, hit mask); rows that miss get NaN.
+        '''
+        numerical = np.asarray(numerical, dtype=np.float64).reshape(-1, len(NUMERICAL_COLUMNS))
+        n = len(numerical)
+        categorical = np.asarray(categorical, dtype=object).reshape(n, -1)
+
+        # === 1. CATEGORICAL COMBINATION ===
+        hit = np.ones(n, dtype=bool)
+        combo_code = np.zeros(n, dtype=np.int64)
+        for column, vocabulary, strip in zip(self._categorical_index, self._vocabularies, self._strip_key):
+            codes = _codes(categorical[:, column], vocabulary, strip)
+            hit &= codes >= 0
+            combo_code = combo_code * len(vocabulary) + codes
+        position = np.minimum(np.searchsorted(self._combo_codes, combo_code), len(self._combo_codes) - 1)
+        hit &= self._combo_codes[position] == combo_code
+        combo = np.where(hit, self._combo_order[position], 0)
+        flat_index = combo
+
+        # The combination's reference values of the other inputs
+        for column, vocabulary, reference, strip in self._fixed_categorical:
+            hit &= _codes(categorical[:, column], vocabulary, strip) == reference[combo]
+
+        # === 2. NUMERIC GRID POSITION, WITHIN EACH FEATURE'S BOUND ===
+        # NaN compares False everywhere, so a missing value is a miss
+        with np.errstate(invalid="ignore"):
+            for column, spec in zip(self._numeric_index, self.numeric):
+                x = numerical[:, column]
+                position = np.rint((x - spec["low"]) / spec["step"])
+                hit &= (position >= 0) & (position < spec["n_bins"])
+                hit &= np.abs(x - (spec["low"] + position * spec["step"])) <= spec["max_error"] + _BOUND_SLACK
+                flat_index = flat_index * spec["n_bins"] + np.where(hit, position, 0).astype(np.int64)
+
+            for column, reference, max_error in self._fixed_numerical:
+                hit &= np.abs(numerical[:, column] - reference[combo]) <= max_error + _BOUND_SLACK
+
+        predictions = np.full(n, np.nan)
+        predictions[hit] = self.values[flat_index[hit]]
+        hit &= ~np.isnan(predictions)
+
+        n_hits = int(hit.sum())
+        with self._lock:
+            self.hits += n_hits
+            self.misses += n - n_hits
+            self._hits_since_audit += n_hits
+        return predictions, hit
+
+    def take_audit(self, audit_every):
+        '''
+        True once per `audit_every` hits: the caller then also scores this
+        batch's hits with the model and reports them to record_audit.
+        '''
+        if not audit_every:
+            return False
+        with self._lock:
+            if self._hits_since_audit < audit_every:
+                return False
+            self._hits_since_audit = 0
+            return True
+
+    def record_audit(self, table_values, model_values):
+        deviation = np.abs(np.asarray(table_values) - np.asarray(model_values))
+        with self._lock:
+            self.audited += len(deviation)
+            if len(deviation):
+                self.max_audited_deviation = max(self.max_audited_deviation, float(deviation.max()))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "cells": self.n_cells,
+            "combos": len(self.combos),
+            "audited": self.audited,
+            "max_audited_deviation": self.max_audited_deviation,
+            # Measured on the held-out set when the table was built
+            "build_report": self.report,
+        }
+
+    # === SAVE / LOAD ===
+
+    def save(self, file_path, keep_values=3):
+        '''
+        Writes the values to `<name>-<sha256 prefix>.npy` next to the
+        `file_path` header, then the header pointing at them, each through
+        a temporary file renamed into place. A values file is never
+        rewritten, so servers that memory-mapped an older one keep reading
+        it; only the newest `keep_values` of them are kept.
+        '''
+        # Training-time only: serving imports this module without src.utils
+        from src.utils import replace_file
+
+        dir_path = os.path.dirname(file_path) or "."
+        os.makedirs(dir_path, exist_ok=True)
+        values = np.ascontiguousarray(self.values, dtype=np.float32)
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        values_file = f"{stem}-{hashlib.sha256(memoryview(values).cast('B')).hexdigest()[:12]}.npy"
+
+        values_path = os.path.join(dir_path, values_file)
+        if not os.path.exists(values_path):
+            fd, tmp_path = tempfile.mkstemp(dir=dir_path, suffix=".tmp")
+            with os.fdopen(fd, "wb") as file_obj:
+                np.save(file_obj, values)
+            replace_file(tmp_path, values_path)
+        os.utime(values_path)
+
+        header = {
+            "format_version": ETA_TABLE_FORMAT_VERSION,
+            "values_file": values_file,
+            "key_categorical": self.key_categorical,
+            "strip_categorical": self.strip_categorical,
+            "combos": [list(combo) for combo in self.combos],
+            "numeric": self.numeric,
+            "fixed_numerical": self.fixed_numerical,
+            "fixed_categorical": self.fixed_categorical,
+            "source_sha256": self.source_sha256,
+            "preprocessor_sha256": self.preprocessor_sha256,
+            "report": self.report,
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=dir_path, suffix=".tmp")
+        with os.fdopen(fd, "w") as file_obj:
+            json.dump(header, file_obj, indent=1)
+        replace_file(tmp_path, file_path)
+
+        older = sorted(
+            (path for path in glob.glob(os.path.join(dir_path, f"{glob.escape(stem)}-*.npy")) if path != values_path),
+            key=os.path.getmtime,
+        )
+        for path in older[:max(0, len(older) - (keep_values - 1))]:
+            os.remove(path)
+
+    @classmethod
+    def load(cls, file_path, mmap=True):
+        with open(file_path) as file_obj:
+            header = json.load(file_obj)
+        if header.get("format_version") != ETA_TABLE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported ETA table format {header.get('format_version')}")
+        values_path = os.path.join(os.path.dirname(file_path), header["values_file"])
+        values = np.load(values_path, mmap_mode="r" if mmap else None)
+        return cls(
+            values=values,
+            key_categorical=header["key_categorical"],
+            strip_categorical=header["strip_categorical"],
+            combos=header["combos"],
+            numeric=header["numeric"],
+            fixed_numerical=header["fixed_numerical"],
+            fixed_categorical=header["fixed_categorical"],
+            source_sha256=header["source_sha256"],
+            preprocessor_sha256=header["preprocessor_sha256"],
+            report=header.get("report"),
+        )
+
+
+def _codes(values, vocabulary, strip):
+    # Code of every value, -1 when it is not in the vocabulary. Only the
+    # distinct values of the batch go through the vocabulary (and strip);
+    # the rows are then mapped by a C-level dict lookup, no Python code
+    # runs per row.
+    values = np.asarray(values, dtype=object).tolist()
+    # "Medium " is "Medium" for a preprocessor that strips
+    mapping = {
+        value: vocabulary.get(value.strip() if strip and isinstance(value, str) else value, -1)
+        for value in set(values)
+    }
+    return np.fromiter(map(mapping.__getitem__, values), dtype=np.int64, count=len(values))
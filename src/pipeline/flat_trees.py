@@ -0,0 +1,375 @@
+import os
+import json
+import tempfile
+
+import numpy as np
+
+from src.exception import customException
+
+# Aim for about this many (row, tree, level) cells per evaluation chunk,
+# so big batches do not allocate rows x trees x depth at once
+_CHUNK_CELLS = 1 << 22
+
+
+class FlatTreeEnsemble:
+    '''
+    A fitted tree model flattened into contiguous NumPy arrays, scored
+    without the framework that trained it.
+
+    `from_model` reads a DecisionTreeRegressor, RandomForestRegressor,
+    GradientBoostingRegressor (squared error), AdaBoostRegressor,
+    XGBRegressor (gbtree) or CatBoostRegressor (symmetric trees). Anything
+    else raises ValueError so the caller can keep using model.predict.
+
+    Two layouts:
+
+    * "binary": all nodes of all trees in one set of arrays (feature,
+      threshold, left, right, default_left, value) and one root index per
+      tree. Leaves point to themselves, so `predict` walks every tree for
+      every row in lockstep for exactly `max_depth` steps.
+    * "oblivious" (CatBoost): one split per level, the same for the whole
+      level, so a row's leaf is just the bits `x[feature] > border` of all
+      levels. Each distinct split is evaluated once per row and its bit
+      reused by every tree that has it.
+
+    Every split sends a row left when float32(x) <= threshold, which is how
+    sklearn compares; XGBoost's x < t and CatBoost's x > border are
+    rewritten to that form when flattening. Tree outputs are combined as
+    `base_score + scale * sum(tree_weights * tree outputs)`, or as the
+    weighted median of the tree outputs for AdaBoost.
+    '''
+
+    def __init__(self, layout, aggregation, tree_weights, base_score=0.0, scale=1.0,
+                 max_depth=0, float32_sum=False, source="", source_sha256="", **arrays):
+        self.layout = layout
+        self.aggregation = aggregation
+        self.tree_weights = np.asarray(tree_weights, dtype=np.float64)
+        self.base_score = float(base_score)
+        self.scale = float(scale)
+        self.max_depth = int(max_depth)
+        # XGBoost adds its leaves up in float32; doing the same keeps the
+        # predictions bit-for-bit instead of ~1e-6 apart
+        self.float32_sum = bool(float32_sum)
+        # Model class and the sha256 of the pickle this was exported from
+        self.source = source
+        self.source_sha256 = source_sha256
+        self.arrays = {name: np.ascontiguousarray(value) for name, value in arrays.items()}
+
+    @property
+    def n_trees(self):
+        return len(self.tree_weights)
+
+    # === SCORING ===
+
+    def predict(self, X):
+        '''
+        Predictions for a 2-D array of preprocessed rows, like model.predict.
+        '''
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim != 2:
+            raise ValueError(f"Expected a 2-D array, got shape {X.shape}")
+
+        cells_per_row = max(1, self.n_trees * max(1, self.max_depth))
+        chunk = max(1, _CHUNK_CELLS // cells_per_row)
+        outputs = [self._tree_outputs(X[start:start + chunk]) for start in range(0, len(X), chunk)]
+        tree_outputs = np.concatenate(outputs) if outputs else np.empty((0, self.n_trees))
+        return self._combine(tree_outputs)
+
+    def _tree_outputs(self, X):
+        # (rows, trees) matrix of leaf values
+        if self.layout == "oblivious":
+            return self._oblivious_outputs(X)
+        return self._binary_outputs(X)
+
+    def _binary_outputs(self, X):
+        a = self.arrays
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(a["roots"], (len(X), self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            x = X[rows, a["feature"][node]]
+            go_left = x <= a["threshold"][node]
+            missing = np.isnan(x)
+            if missing.any():
+                go_left |= missing & a["default_left"][node]
+            node = np.where(go_left, a["left"][node], a["right"][node])
+        return a["value"][node]
+
+    def _oblivious_outputs(self, X):
+        a = self.arrays
+        # (rows, distinct splits) bits, then each tree's levels pick theirs
+        x = X[:, a["split_features"]]
+        bits = x > a["split_borders"]
+        missing = np.isnan(x)
+        if missing.any():
+            bits = np.where(missing, a["split_nan_bits"], bits)
+        bits = bits.astype(np.int32)
+
+        leaf = np.zeros((len(X), self.n_trees), dtype=np.int32)
+        for level in range(self.max_depth):
+            leaf |= bits[:, a["level_splits"][:, level]] << level
+        return a["leaf_values"][np.arange(self.n_trees), leaf]
+
+    def _combine(self, tree_outputs):
+        if self.aggregation == "weighted_median":
+            return self._weighted_median(tree_outputs)
+
+        if self.float32_sum:
+            total = np.full(len(tree_outputs), self.base_score, dtype=np.float32)
+            for tree in range(self.n_trees):
+                total += tree_outputs[:, tree].astype(np.float32)
+            return total.astype(np.float64)
+        return self.base_score + self.scale * (tree_outputs @ self.tree_weights)
+
+    def _weighted_median(self, tree_outputs):
+        # Same steps as AdaBoostRegressor._get_median_predict
+        sorted_idx = np.argsort(tree_outputs, axis=1)
+        weight_cdf = np.cumsum(self.tree_weights[sorted_idx], axis=1)
+        median_or_above = weight_cdf >= 0.5 * weight_cdf[:, -1][:, np.newaxis]
+        median_idx = median_or_above.argmax(axis=1)
+        rows = np.arange(len(tree_outputs))
+        return tree_outputs[rows, sorted_idx[rows, median_idx]]
+
+    # === SAVING / LOADING ===
+
+    def save(self, file_path):
+        '''
+        Writes the arrays to one .npz (atomically, like save_object).
+        '''
+        # Training-time only: serving imports this module without src.utils
+        from src.utils import replace_file
+
+        try:
+            dir_path = os.path.dirname(file_path)
+            os.makedirs(dir_path or ".", exist_ok=True)
+            header = {
+                "layout": self.layout, "aggregation": self.aggregation,
+                "base_score": self.base_score, "scale": self.scale, "max_depth": self.max_depth,
+                "float32_sum": self.float32_sum, "source": self.source, "source_sha256": self.source_sha256,
+            }
+            fd, tmp_path = tempfile.mkstemp(dir=dir_path or ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as file_obj:
+                    np.savez(file_obj, header=np.array(json.dumps(header)),
+                             tree_weights=self.tree_weights, **self.arrays)
+                replace_file(tmp_path, file_path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+        except Exception as e:
+            raise customException(e)
+
+    @classmethod
+    def load(cls, file_path):
+        try:
+            with np.load(file_path, allow_pickle=False) as data:
+                header = json.loads(str(data["header"]))
+                arrays = {name: data[name] for name in data.files if name != "header"}
+            return cls(**header, **arrays)
+
+        except Exception as e:
+            raise customException(e)
+
+    # === FLATTENING ===
+
+    @classmethod
+    def from_model(cls, model):
+        '''
+        Flattens a fitted model; ValueError if its type is not supported.
+        '''
+        name = type(model).__name__
+        flatteners = {
+            "DecisionTreeRegressor": _from_sklearn_tree,
+            "ExtraTreeRegressor": _from_sklearn_tree,
+            "RandomForestRegressor": _from_sklearn_forest,
+            "ExtraTreesRegressor": _from_sklearn_forest,
+            "GradientBoostingRegressor": _from_sklearn_boosting,
+            "AdaBoostRegressor": _from_sklearn_adaboost,
+            "XGBRegressor": _from_xgboost,
+            "CatBoostRegressor": _from_catboost,
+        }
+        if name not in flatteners:
+            raise ValueError(f"{name} is not a supported tree model")
+        flat = flatteners[name](model)
+        flat.source = name
+        return flat
+
+
+def _binary_arrays(trees):
+    '''
+    Concatenates per-tree node lists into the "binary" layout. Every tree
+    is a dict of equally long arrays feature, threshold, left, right,
+    default_left, value, with left = right = -1 on leaves.
+    '''
+    roots, offset, depth = [], 0, 0
+    columns = {name: [] for name in ("feature", "threshold", "left", "right", "default_left", "value")}
+    for tree in trees:
+        left = np.asarray(tree["left"], dtype=np.int64)
+        right = np.asarray(tree["right"], dtype=np.int64)
+        leaf = left < 0
+        own = np.arange(len(left))
+        # Leaves loop back to themselves and compare on feature 0
+        columns["left"].append(np.where(leaf, own, left) + offset)
+        columns["right"].append(np.where(leaf, own, right) + offset)
+        columns["feature"].append(np.where(leaf, 0, tree["feature"]))
+        columns["threshold"].append(np.where(leaf, np.inf, tree["threshold"]))
+        columns["default_left"].append(np.asarray(tree["default_left"], dtype=bool))
+        columns["value"].append(np.asarray(tree["value"], dtype=np.float64))
+        roots.append(offset)
+        offset += len(left)
+        depth = max(depth, _tree_depth(left, right))
+
+    arrays = {
+        "feature": np.concatenate(columns["feature"]).astype(np.int32),
+        "threshold": np.concatenate(columns["threshold"]).astype(np.float64),
+        "left": np.concatenate(columns["left"]).astype(np.int32),
+        "right": np.concatenate(columns["right"]).astype(np.int32),
+        "default_left": np.concatenate(columns["default_left"]),
+        "value": np.concatenate(columns["value"]),
+        "roots": np.asarray(roots, dtype=np.int32),
+    }
+    return arrays, depth
+
+
+def _tree_depth(left, right):
+    depth, level = 0, np.array([0])
+    while True:
+        level = level[left[level] >= 0]
+        if len(level) == 0:
+            return depth
+        level = np.concatenate([left[level], right[level]])
+        depth += 1
+
+
+def _sklearn_nodes(estimator):
+    tree = estimator.tree_
+    if tree.n_outputs != 1:
+        raise ValueError("Only single-output trees are supported")
+    missing_left = getattr(tree, "missing_go_to_left", np.zeros(tree.node_count, dtype=np.uint8))
+    return {
+        "feature": tree.feature,
+        "threshold": tree.threshold,
+        "left": tree.children_left,
+        "right": tree.children_right,
+        "default_left": missing_left.astype(bool),
+        "value": tree.value[:, 0, 0],
+    }
+
+
+def _from_sklearn_tree(model):
+    arrays, depth = _binary_arrays([_sklearn_nodes(model)])
+    return FlatTreeEnsemble("binary", "sum", [1.0], max_depth=depth, **arrays)
+
+
+def _from_sklearn_forest(model):
+    n_trees = len(model.estimators_)
+    arrays, depth = _binary_arrays([_sklearn_nodes(tree) for tree in model.estimators_])
+    return FlatTreeEnsemble("binary", "sum", np.full(n_trees, 1.0 / n_trees), max_depth=depth, **arrays)
+
+
+def _from_sklearn_boosting(model):
+    if model.loss != "squared_error":
+        raise ValueError(f"GradientBoostingRegressor with loss={model.loss!r} is not supported")
+    if model.init_ == "zero":
+        base_score = 0.0
+    elif hasattr(model.init_, "constant_"):
+        base_score = float(np.ravel(model.init_.constant_)[0])
+    else:
+        raise ValueError("Only a constant (DummyRegressor) init estimator is supported")
+
+    trees = [_sklearn_nodes(stage[0]) for stage in model.estimators_]
+    arrays, depth = _binary_arrays(trees)
+    return FlatTreeEnsemble("binary", "sum", np.full(len(trees), model.learning_rate),
+                            base_score=base_score, max_depth=depth, **arrays)
+
+
+def _from_sklearn_adaboost(model):
+    estimators = model.estimators_
+    if not all(hasattr(estimator, "tree_") for estimator in estimators):
+        raise ValueError("AdaBoostRegressor is only supported with tree base estimators")
+    arrays, depth = _binary_arrays([_sklearn_nodes(estimator) for estimator in estimators])
+    return FlatTreeEnsemble("binary", "weighted_median", model.estimator_weights_[:len(estimators)],
+                            max_depth=depth, **arrays)
+
+
+def _from_xgboost(model):
+    booster = model.get_booster()
+    learner = json.loads(booster.save_raw(raw_format="json"))["learner"]
+    if learner["gradient_booster"]["name"] != "gbtree":
+        raise ValueError(f"XGBoost booster {learner['gradient_booster']['name']!r} is not supported")
+    objective = learner["objective"]["name"]
+    if not objective.startswith("reg:") or objective in ("reg:logistic", "reg:gamma", "reg:tweedie"):
+        raise ValueError(f"XGBoost objective {objective!r} is not supported")
+
+    trees = learner["gradient_booster"]["model"]["trees"]
+    # predict() stops at the best iteration when early stopping was used
+    best_iteration = booster.attr("best_iteration")
+    if best_iteration is not None:
+        per_round = int(learner["gradient_booster"]["model"]["gbtree_model_param"].get("num_parallel_tree", 1))
+        trees = trees[:(int(best_iteration) + 1) * per_round]
+
+    nodes = []
+    for tree in trees:
+        left = np.asarray(tree["left_children"], dtype=np.int64)
+        conditions = np.asarray(tree["split_conditions"], dtype=np.float32)
+        nodes.append({
+            "feature": np.asarray(tree["split_indices"], dtype=np.int64),
+            # float32 x < t  <=>  x <= the float32 just below t
+            "threshold": np.nextafter(conditions, np.float32(-np.inf)).astype(np.float64),
+            "left": left,
+            "right": np.asarray(tree["right_children"], dtype=np.int64),
+            "default_left": np.asarray(tree["default_left"], dtype=bool),
+            # Leaves keep their value in split_conditions
+            "value": conditions.astype(np.float64),
+        })
+
+    # "5E-1", or "[5E-1]" (one per target) in newer versions
+    base_score = float(str(learner["learner_model_param"]["base_score"]).strip("[]").split(",")[0])
+    arrays, depth = _binary_arrays(nodes)
+    return FlatTreeEnsemble("binary", "sum", np.ones(len(nodes)), base_score=base_score,
+                            max_depth=depth, float32_sum=True, **arrays)
+
+
+def _from_catboost(model):
+    file_descriptor, json_path = tempfile.mkstemp(suffix=".json")
+    os.close(file_descriptor)
+    try:
+        model.save_model(json_path, format="json")
+        with open(json_path) as file_obj:
+            exported = json.load(file_obj)
+    finally:
+        os.remove(json_path)
+
+    if "oblivious_trees" not in exported:
+        raise ValueError("Only symmetric (oblivious) CatBoost trees are supported")
+    float_features = exported["features_info"].get("float_features", [])
+    if exported["features_info"].get("categorical_features"):
+        raise ValueError("CatBoost models with categorical features are not supported")
+
+    trees = exported["oblivious_trees"]
+    depth = max(len(tree["splits"]) for tree in trees)
+    # Split 0 is a padding split that is never true (border +inf): unused
+    # levels of shallower trees point to it and always give bit 0
+    splits = {(0, np.inf, False): 0}
+    level_splits = np.zeros((len(trees), depth), dtype=np.int32)
+    leaf_values = np.zeros((len(trees), 1 << depth))
+
+    for index, tree in enumerate(trees):
+        for level, split in enumerate(tree["splits"]):
+            if split["split_type"] != "FloatFeature":
+                raise ValueError(f"CatBoost split type {split['split_type']!r} is not supported")
+            feature = float_features[split["float_feature_index"]]
+            key = (feature["flat_feature_index"], split["border"], feature.get("nan_value_treatment") == "AsTrue")
+            level_splits[index, level] = splits.setdefault(key, len(splits))
+        leaf_values[index, :len(tree["leaf_values"])] = tree["leaf_values"]
+
+    split_features, split_borders, split_nan_bits = zip(*splits)
+    scale, bias = exported.get("scale_and_bias", [1.0, [0.0]])
+    bias = bias[0] if isinstance(bias, list) else bias
+    return FlatTreeEnsemble(
+        "oblivious", "sum", np.ones(len(trees)), base_score=bias, scale=scale, max_depth=depth,
+        split_features=np.asarray(split_features, dtype=np.int32),
+        split_borders=np.asarray(split_borders, dtype=np.float64),
+        split_nan_bits=np.asarray(split_nan_bits, dtype=bool),
+        level_splits=level_splits, leaf_values=leaf_values,
+    )
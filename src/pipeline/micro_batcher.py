@@ -0,0 +1,172 @@
+import os
+import time
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from dataclasses import dataclass
+
+from src.exception import customException
+from src.logger import logging
+from src.metrics import MICRO_BATCH_SIZE, MICRO_BATCH_QUEUE_DEPTH
+
+
+@dataclass
+class MicroBatcherConfig:
+    # How long the first row of a batch waits for others to join (ms).
+    # Only applied once concurrent rows have been seen (see _work);
+    # 0 always scores whatever is already queued without waiting.
+    window_ms: float = float(os.environ.get("MICROBATCH_WINDOW_MS", "2"))
+    # A batch is flushed as soon as it holds this many rows
+    max_batch_size: int = int(os.environ.get("MICROBATCH_MAX_BATCH", "64"))
+    # How long a caller waits for its result before giving up (seconds)
+    result_timeout_seconds: float = 30.0
+
+
+class MicroBatcher:
+    '''
+    Groups single-row predictions from concurrent requests into batches.
+
+    Request threads call `predict(row)`, which queues the row and blocks on
+    a Future. One worker thread takes the first queued row, keeps collecting
+    until `window_ms` has passed since that row arrived or `max_batch_size`
+    rows are in hand, and scores them all with a single `predict_fn(rows)`
+    call (one transform + one model.predict). Each caller then gets its own
+    value back.
+
+    Works with threaded Flask and gunicorn gthread workers; the worker
+    thread is started per process on first use, like the artifact watcher.
+    '''
+
+    def __init__(self, predict_fn, config=None):
+        self.predict_fn = predict_fn
+        self.config = config or MicroBatcherConfig()
+        self._queue = None
+        self._worker_pid = None
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._n_rows = 0
+        self._n_batches = 0
+        self._n_errors = 0
+        self._max_queue_depth = 0
+        self._total_wait_seconds = 0.0
+
+    def submit(self, row):
+        '''
+        Queues one row and returns a Future for its prediction.
+        '''
+        if self._worker_pid != os.getpid():
+            self._start_worker()
+        future = Future()
+        self._queue.put((row, future, time.perf_counter()))
+        return future
+
+    def predict(self, row):
+        '''
+        Scores one row through the shared batch and returns its prediction.
+        '''
+        try:
+            return self.submit(row).result(timeout=self.config.result_timeout_seconds)
+
+        except Exception as e:
+            raise customException(e)
+
+    def stats(self):
+        '''
+        Queue depth and batch-size counters since the process started.
+        '''
+        with self._stats_lock:
+            n_batches = self._n_batches
+            return {
+                "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+                "max_queue_depth": self._max_queue_depth,
+                "batches": n_batches,
+                "rows": self._n_rows,
+                "errors": self._n_errors,
+                "mean_batch_size": self._n_rows / n_batches if n_batches else 0.0,
+                "max_batch_size": max(self._batch_sizes) if self._batch_sizes else 0,
+                "mean_wait_ms": 1000 * self._total_wait_seconds / self._n_rows if self._n_rows else 0.0,
+                # {batch size: number of batches of that size}
+                "batch_sizes": dict(sorted(self._batch_sizes.items())),
+                "window_ms": self.config.window_ms,
+                "max_batch_size_limit": self.config.max_batch_size,
+            }
+
+    def _start_worker(self):
+        # Threads (and anything queued) do not survive fork, so every
+        # process gets its own queue and worker on first submit.
+        with self._start_lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._queue = queue.SimpleQueue()
+            worker = threading.Thread(target=self._work, args=(self._queue,), name="micro-batcher", daemon=True)
+            worker.start()
+            self._worker_pid = os.getpid()
+
+    def _work(self, work_queue):
+        window = self.config.window_ms / 1000
+        max_batch_size = max(1, self.config.max_batch_size)
+        concurrent = False
+        while True:
+            batch = [work_queue.get()]
+            queue_depth = work_queue.qsize() + 1
+            # A lone caller (last batch had one row, nothing else queued)
+            # is scored at once instead of paying the window for nothing
+            concurrent = concurrent or queue_depth > 1
+            deadline = batch[0][2] + (window if concurrent else 0.0)
+
+            # === 1. COLLECT UNTIL THE WINDOW CLOSES OR THE BATCH IS FULL ===
+            while len(batch) < max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    if remaining > 0:
+                        batch.append(work_queue.get(timeout=remaining))
+                    else:
+                        # Window is over: only take rows that are already waiting
+                        batch.append(work_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # === 2. SCORE THE BATCH AND HAND OUT THE RESULTS ===
+            started = time.perf_counter()
+            n_errors = self._run_batch(batch)
+            self._record(batch, started, queue_depth, n_errors)
+            concurrent = len(batch) > 1
+
+    def _run_batch(self, batch):
+        rows = [row for row, _, _ in batch]
+        try:
+            predictions = list(self.predict_fn(rows))
+            if len(predictions) != len(rows):
+                raise ValueError(f"predict_fn returned {len(predictions)} values for {len(rows)} rows")
+            for (_, future, _), prediction in zip(batch, predictions):
+                future.set_result(prediction)
+            return 0
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return 1
+            # One bad row must not fail the other callers: score them one by one
+            logging.warning("Micro-batch of %d rows failed, scoring rows individually", len(batch))
+            n_errors = 0
+            for row, future, _ in batch:
+                try:
+                    future.set_result(self.predict_fn([row])[0])
+                except Exception as row_error:
+                    future.set_exception(row_error)
+                    n_errors += 1
+            return n_errors
+
+    def _record(self, batch, started, queue_depth, n_errors):
+        with self._stats_lock:
+            self._n_batches += 1
+            self._n_rows += len(batch)
+            self._n_errors += n_errors
+            self._batch_sizes[len(batch)] += 1
+            self._max_queue_depth = max(self._max_queue_depth, queue_depth)
+            self._total_wait_seconds += sum(started - enqueued for _, _, enqueued in batch)
+        MICRO_BATCH_SIZE.observe(len(batch))
+        MICRO_BATCH_QUEUE_DEPTH.set(queue_depth)
+
@@ -1,53 +1,335 @@
 import sys
 import os
-import pandas as pd
+import threading
+import numpy as np
+from dataclasses import dataclass
 from src.exception import customException
 from src.logger import logging
-from src.utils import load_object
+from src.metrics import stage_timer
+from src.pipeline.artifact_store import get_artifact_store
+from src.pipeline.micro_batcher import MicroBatcher
+from src.components.feature_columns import FEATURE_FIELDS, RAW_ORDER_FIELDS, NUMERICAL_COLUMNS, CATEGORICAL_COLUMNS
+from src.features import compute_order_features
+
+# pandas is imported inside the functions that build a DataFrame: the
+# compiled-encoder single-order path never needs it, so workers start faster
+
+
+@dataclass
+class PredictPipelineConfig:
+    # How single orders are encoded in predict_record:
+    # "compiled" = pandas-free CompiledEncoder, "sklearn" = preprocessor.transform
+    encoder: str = os.environ.get("PREDICT_ENCODER", "compiled")
+    # Score concurrent predict_record calls together through a MicroBatcher
+    micro_batching: bool = os.environ.get("PREDICT_MICRO_BATCHING", "1") == "1"
+    # Who scores the encoded rows: "native" = model.predict, "flat" = the
+    # pure-NumPy FlatTreeEnsemble (falls back to native for non-tree models)
+    backend: str = os.environ.get("PREDICT_BACKEND", "native")
+    # Answer orders covered by the ETA lookup table from it, the rest with
+    # the model (needs artifacts/eta_table.json built for these artifacts)
+    eta_table: bool = os.environ.get("PREDICT_ETA_TABLE", "0") == "1"
+    # Every this many table hits, a batch's hits are also scored by the
+    # model to track the table's deviation while serving (0 = never)
+    eta_table_audit_every: int = int(os.environ.get("PREDICT_ETA_TABLE_AUDIT_EVERY", "1000"))
 
 
 class PredictPipeline:
-    def __init__(self):
-        pass
+    def __init__(self, artifact_store=None, config=None):
+        # The model and preprocessor live in a process-wide store, so creating
+        # a PredictPipeline per request is cheap and nothing is unpickled here.
+        self.artifact_store = artifact_store or get_artifact_store()
+        self.predict_config = config or PredictPipelineConfig()
 
     def predict(self, features):
         '''
         This function takes the features DataFrame and runs prediction.
         '''
         try:
-            # === 1. DEFINE FILE PATHS ===
-            model_path = os.path.join('artifacts', 'best_model.pkl')
-            preprocessor_path = os.path.join('artifacts', 'preprocessor.pkl')
-            
-            logging.info("Loading saved model and preprocessor...")
-            
-            # === 2. LOAD SAVED OBJECTS ===
-            model = load_object(file_path=model_path)
-            preprocessor = load_object(file_path=preprocessor_path)
-            
-            logging.info("Loaded objects successfully.")
+            # === 1. GET THE RESIDENT MODEL AND PREPROCESSOR ===
+            # One read of the bundle, so both objects always come from the
+            # same training run even if a reload happens meanwhile.
+            with stage_timer("load_artifacts"):
+                bundle = self.artifact_store.get()
 
-           
+            # Lazy %-args: the Index is only formatted if DEBUG is enabled
+            logging.debug("Final columns for preprocessing: %s", features.columns)
 
-            logging.info("Feature Engineering skipped, features provided directly.")
-            logging.info(f"Final columns for preprocessing: {features.columns.to_list()}")
-
-            # === 4. TRANSFORM & PREDICT ===
+            # === 2. TRANSFORM & PREDICT ===
             # Use the loaded preprocessor to transform the new data
-            data_scaled = preprocessor.transform(features) 
+            with stage_timer("transform"):
+                data_scaled = bundle.preprocessor.transform(features) 
             
             # Use the loaded model to make a prediction
-            prediction = model.predict(data_scaled)
+            with stage_timer("predict"):
+                prediction = self.model_predict(bundle, data_scaled)
             
             return prediction[0] # Return the single predicted value
 
         except Exception as e:
             raise customException(e)
+
+    def predict_record(self, record):
+        '''
+        Scores one order given as a CustomData, a dict or a tuple in training
+        column order without building a DataFrame when the compiled encoder is
+        selected. With micro-batching on, the order is scored together with
+        those of concurrent requests. Returns the predicted value in hours.
+        '''
+        try:
+            if self.predict_config.micro_batching:
+                # Queue wait + the shared batch's stages (timed in predict_records)
+                with stage_timer("micro_batch"):
+                    return self.micro_batcher().predict(record)
+            return self.predict_records([record])[0]
+
+        except Exception as e:
+            raise customException(e)
+
+    def predict_records(self, records):
+        '''
+        Scores a list of orders (CustomData, dicts or tuples) with one
+        encode and one predict call, all against the same bundle. Returns a
+        float array. In ETA table mode, CustomData orders the table covers
+        are answered from it and only the others are encoded and scored.
+        '''
+        try:
+            with stage_timer("load_artifacts"):
+                bundle = self.artifact_store.get()
+
+            if self.use_eta_table(bundle) and all(isinstance(record, CustomData) for record in records):
+                numerical, categorical = CustomData.many_to_arrays(records)
+                return self.table_predict(
+                    bundle, numerical, categorical,
+                    lambda positions: self.score_records(bundle, [records[i] for i in positions]),
+                )
+            return self.score_records(bundle, records)
+
+        except Exception as e:
+            raise customException(e)
+
+    def score_records(self, bundle, records):
+        '''
+        Encodes and scores records with the model, see predict_records.
+        '''
+        with stage_timer("transform"):
+            compiled = self.predict_config.encoder == "compiled" and bundle.encoder is not None
+            if compiled and all(isinstance(record, CustomData) for record in records):
+                numerical, categorical = CustomData.many_to_arrays(records)
+                data_scaled = bundle.encoder.transform_arrays(
+                    numerical, categorical, NUMERICAL_COLUMNS, CATEGORICAL_COLUMNS)
+            elif compiled:
+                data_scaled = bundle.encoder.transform(
+                    [record.get_data_as_dict() if isinstance(record, CustomData) else record for record in records])
+            else:
+                import pandas as pd
+
+                columns = list(bundle.preprocessor.feature_names_in_)
+                records = [
+                    record.get_data_as_dict() if isinstance(record, CustomData)
+                    else record if isinstance(record, dict) else dict(zip(columns, record))
+                    for record in records
+                ]
+                data_scaled = bundle.preprocessor.transform(pd.DataFrame(records, columns=columns))
+
+        with stage_timer("predict"):
+            return np.asarray(self.model_predict(bundle, data_scaled), dtype=float)
+
+    def use_eta_table(self, bundle):
+        return self.predict_config.eta_table and bundle.eta_table is not None
+
+    def table_predict(self, bundle, numerical, categorical, score_rows):
+        '''
+        Answers the orders the ETA table covers from it; `score_rows(positions)`
+        scores the others with the model. Now and then (eta_table_audit_every)
+        the hits are scored too, to record how far the table is from the model.
+        '''
+        table = bundle.eta_table
+        with stage_timer("eta_table"):
+            predictions, hit = table.lookup(numerical, categorical)
+
+        audit = hit.any() and table.take_audit(self.predict_config.eta_table_audit_every)
+        positions = np.arange(len(hit)) if audit else np.flatnonzero(~hit)
+        if len(positions):
+            scored = np.asarray(score_rows(positions), dtype=float)
+            if audit:
+                table.record_audit(predictions[hit], scored[hit])
+                predictions[~hit] = scored[~hit]
+            else:
+                predictions[positions] = scored
+        return predictions
+
+    def model_predict(self, bundle, data_scaled):
+        '''
+        Scores encoded rows with the configured backend.
+        '''
+        if self.predict_config.backend == "flat" and bundle.flat_model is not None:
+            return bundle.flat_model.predict(data_scaled)
+        return bundle.model.predict(data_scaled)
+
+    def micro_batcher(self):
+        '''
+        The process-wide MicroBatcher for this artifact store, encoder, backend
+        and table mode.
+        '''
+        key = (id(self.artifact_store), self.predict_config.encoder, self.predict_config.backend,
+               self.predict_config.eta_table)
+        batcher = _micro_batchers.get(key)
+        if batcher is None:
+            with _micro_batchers_lock:
+                batcher = _micro_batchers.get(key)
+                if batcher is None:
+                    scorer = PredictPipeline(self.artifact_store, PredictPipelineConfig(
+                        encoder=self.predict_config.encoder, micro_batching=False,
+                        backend=self.predict_config.backend, eta_table=self.predict_config.eta_table,
+                        eta_table_audit_every=self.predict_config.eta_table_audit_every))
+                    batcher = _micro_batchers[key] = MicroBatcher(scorer.predict_records)
+        return batcher
+
+    def predict_batch(self, features):
+        '''
+        Scores a whole DataFrame of orders with one transform and one
+        predict call (only for the rows the ETA table does not answer, in
+        table mode). Returns the predictions (in hours) in row order.
+        '''
+        try:
+            with stage_timer("load_artifacts"):
+                bundle = self.artifact_store.get()
+
+            def score_rows(positions=None):
+                rows = features if positions is None else features.iloc[positions]
+                with stage_timer("transform"):
+                    data_scaled = bundle.preprocessor.transform(rows)
+                with stage_timer("predict"):
+                    return np.asarray(self.model_predict(bundle, data_scaled), dtype=float)
+
+            if self.use_eta_table(bundle):
+                return self.table_predict(
+                    bundle, features[NUMERICAL_COLUMNS].to_numpy(dtype=np.float64),
+                    features[CATEGORICAL_COLUMNS].astype(object).to_numpy(), score_rows,
+                )
+            return score_rows()
+
+        except Exception as e:
+            raise customException(e)
             
 
 
+# Shared by every PredictPipeline of the process, so rows from concurrent
+# requests end up in the same queue
+_micro_batchers = {}
+_micro_batchers_lock = threading.Lock()
+
+_FIELD_TYPES = tuple(FEATURE_FIELDS.items())
+
+
+
+
+def build_batch_frame(records, fields=None):
+    '''
+    Validates a list of order mappings in bulk and builds one DataFrame.
+    `fields` ({name: float or str}) defaults to the 18 FEATURE_FIELDS.
+
+    Columns are type-checked as whole vectors (pd.to_numeric), not row by
+    row. Returns (frame, valid_positions, errors) where `frame` holds only
+    the valid rows, `valid_positions` maps them back to the input list and
+    `errors` is {input position: message} for the rejected ones.
+    '''
+    import pandas as pd
+
+    errors = {}
+    positions = []
+    rows = []
+    for position, record in enumerate(records):
+        if isinstance(record, dict):
+            positions.append(position)
+            rows.append(record)
+        else:
+            errors[position] = "order must be a JSON object"
+
+    field_types = fields or FEATURE_FIELDS
+    fields = list(field_types)
+    raw = pd.DataFrame.from_records(rows, columns=fields) if rows else pd.DataFrame(columns=fields)
+    frame = pd.DataFrame(index=raw.index)
+    problems = pd.DataFrame(False, index=raw.index, columns=fields)
+
+    for field, field_type in field_types.items():
+        column = raw[field]
+        missing = column.isna()
+        if field_type is float:
+            # Booleans would silently become 0/1, so they count as invalid.
+            # Only mixed (object) columns need the per-value check.
+            if pd.api.types.is_bool_dtype(column):
+                column = column.astype(object).where(False)
+            elif column.dtype == object:
+                column = column.mask(column.map(lambda value: isinstance(value, bool)))
+            values = pd.to_numeric(column, errors="coerce").astype(float)
+            problems[field] = missing | values.isna() | ~np.isfinite(values.fillna(0.0))
+        else:
+            values = column
+            problems[field] = missing | ~column.map(lambda value: isinstance(value, str))
+        frame[field] = values
+
+    bad_rows = problems.any(axis=1).to_numpy()
+    if bad_rows.any():
+        # Messages are only built for the rejected rows
+        for row in np.flatnonzero(bad_rows):
+            bad_fields = problems.columns[problems.iloc[row].to_numpy()]
+            detail = []
+            for field in bad_fields:
+                state = "missing" if pd.isna(raw.at[row, field]) else f"expected {field_types[field].__name__}"
+                detail.append(f"{field} ({state})")
+            errors[positions[row]] = "invalid fields: " + ", ".join(detail)
+
+    valid = ~bad_rows
+    frame = frame[valid].reset_index(drop=True)
+    valid_positions = [position for position, ok in zip(positions, valid) if ok]
+
+    return frame, valid_positions, errors
+
+
+def build_raw_batch_frame(records, distance_cache=None):
+    '''
+    build_batch_frame for raw orders (RAW_ORDER_FIELDS: coordinates,
+    Order_Date, Order_Time, Pickup_Time, ...). The derived features are
+    computed for the whole batch with src.features, exactly as in
+    training (Distance_km through `distance_cache` if one is given). Returns (frame of the 18 FEATURE_FIELDS, valid_positions,
+    errors), like build_batch_frame.
+    '''
+    import pandas as pd
+
+    raw, positions, errors = build_batch_frame(records, RAW_ORDER_FIELDS)
+    features, problems = compute_order_features(raw, distance_cache)
+
+    unparseable = np.zeros(len(raw), dtype=bool)
+    for bad_rows in problems.values():
+        unparseable |= bad_rows
+    # Messages are only built for the rejected rows
+    for row in np.flatnonzero(unparseable):
+        bad_fields = [field for field, bad_rows in problems.items() if bad_rows[row]]
+        errors[positions[row]] = "invalid fields: " + ", ".join(f"{field} (unparseable)" for field in bad_fields)
+
+    valid = ~unparseable
+    frame = pd.DataFrame({
+        field: (features[field] if field in features else raw[field].to_numpy())[valid]
+        for field in FEATURE_FIELDS
+    })
+    valid_positions = [position for position, ok in zip(positions, valid) if ok]
+
+    return frame, valid_positions, errors
+
+
 class CustomData:
-    
+    '''
+    One order's 18 model inputs.
+
+    A __slots__ record (no per-instance __dict__). Besides the DataFrame
+    the sklearn preprocessor wants, it converts straight to the arrays of
+    the compiled path: to_numpy_row() / many_to_arrays() give the
+    numerical and categorical values in NUMERICAL_COLUMNS and
+    CATEGORICAL_COLUMNS order, so pandas is only used when asked for.
+    '''
+    __slots__ = tuple(FEATURE_FIELDS)
+
     def __init__(self,
                  Agent_Age: float,
                  Agent_Rating: float,
@@ -88,12 +370,66 @@ class CustomData:
         self.Pickup_Minute = Pickup_Minute
         self.Total_preparation_time = Total_preparation_time
 
+    @classmethod
+    def from_mapping(cls, mapping):
+        '''
+        Builds a record from a form or JSON mapping, converting every field
+        with its FEATURE_FIELDS type (float(...) / str(...)). Raises
+        TypeError/ValueError for a missing or non-numeric field, like the
+        old per-field float(request.form.get(...)) calls.
+        '''
+        record = cls.__new__(cls)
+        for field, field_type in _FIELD_TYPES:
+            setattr(record, field, field_type(mapping.get(field)))
+        return record
+
+    @classmethod
+    def many_from_mappings(cls, mappings):
+        '''
+        from_mapping for a list of mappings.
+        '''
+        return [cls.from_mapping(mapping) for mapping in mappings]
+
+    def to_numpy_row(self):
+        '''
+        (numerical, categorical): a float64 array in NUMERICAL_COLUMNS order
+        and an object array in CATEGORICAL_COLUMNS order.
+        '''
+        numerical = np.array([getattr(self, column) for column in NUMERICAL_COLUMNS], dtype=np.float64)
+        categorical = np.array([getattr(self, column) for column in CATEGORICAL_COLUMNS], dtype=object)
+        return numerical, categorical
+
+    @staticmethod
+    def many_to_arrays(records):
+        '''
+        Several records -> (numerical (n, 11) float64, categorical (n, 7)
+        object), columns ordered as in DataTransformation.
+        '''
+        numerical = np.array([[getattr(record, column) for column in NUMERICAL_COLUMNS] for record in records],
+                             dtype=np.float64).reshape(len(records), len(NUMERICAL_COLUMNS))
+        categorical = np.empty((len(records), len(CATEGORICAL_COLUMNS)), dtype=object)
+        for i, record in enumerate(records):
+            categorical[i] = [getattr(record, column) for column in CATEGORICAL_COLUMNS]
+        return numerical, categorical
+
+    def __repr__(self):
+        fields = ", ".join(f"{field}={getattr(self, field)!r}" for field in FEATURE_FIELDS)
+        return f"CustomData({fields})"
+
+    def get_data_as_dict(self):
+        '''
+        The same inputs as a plain dict, for PredictPipeline.predict_record.
+        '''
+        return {field: getattr(self, field) for field in FEATURE_FIELDS}
+
     def get_data_as_data_frame(self):
         '''
         This function takes all the raw inputs from the web form
         and converts them into a pandas DataFrame.
         This is the *input* for our PredictPipeline.
         '''
+        import pandas as pd
+
         try:
             custom_data_input_dict = {
                 "Agent_Age": [self.Agent_Age],
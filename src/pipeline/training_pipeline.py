@@ -1,4 +1,5 @@
 import sys
+import argparse
 from src.exception import customException
 from src.logger import logging
 
@@ -6,20 +7,56 @@ from src.logger import logging
 from src.components.data_ingestion import DataIngestion
 from src.components.data_transformation import DataTransformation
 from src.components.model_trainer import ModelTrainer
+from src.components.out_of_core import OutOfCoreTraining, OutOfCoreTrainingConfig
+from src.components.eta_table_builder import EtaTableBuilder
+from src.pipeline.artifact_store import ArtifactStoreConfig
+from src.utils import write_artifact_manifest
 
 # This is the "General Manager" 👨‍💼 script
 if __name__ == "__main__":
     
+    # Cached stages are skipped when their inputs did not change;
+    # these flags rerun them anyway.
+    parser = argparse.ArgumentParser(description="Run the training pipeline.")
+    parser.add_argument("--force-ingestion", action="store_true", help="rerun data ingestion even on a cache hit")
+    parser.add_argument("--force-transformation", action="store_true", help="rerun data transformation even on a cache hit")
+    parser.add_argument("--force-search", action="store_true",
+                        help="refit every search candidate instead of reusing the search checkpoint")
+    parser.add_argument("--eta-table", action="store_true",
+                        help="also build the ETA lookup table for the new artifacts")
+    parser.add_argument("--force", action="store_true", help="rerun every stage")
+    parser.add_argument("--out-of-core", action="store_true",
+                        help="stream the raw file in chunks instead of loading it (no stage cache)")
+    parser.add_argument("--learner", choices=["xgboost", "sgd"], default="xgboost",
+                        help="incremental learner of the out-of-core mode")
+    parser.add_argument("--chunk-rows", type=int, default=50_000, help="rows per chunk in the out-of-core mode")
+    args = parser.parse_args()
+
     # This is the GM's "To-Do List"
     try:
         logging.info("Starting the training pipeline...")
 
+        if args.out_of_core:
+            # === ALL THREE STATIONS, ONE CHUNK AT A TIME ===
+            # For order files that do not fit in memory
+            out_of_core = OutOfCoreTraining(OutOfCoreTrainingConfig(learner=args.learner, chunk_rows=args.chunk_rows))
+            best_r2_score, preprocessor_path, model_path = out_of_core.initiate_out_of_core_training()
+            version = write_artifact_manifest(
+                manifest_path=ArtifactStoreConfig().manifest_file_path,
+                model_path=model_path,
+                preprocessor_path=preprocessor_path
+            )
+            logging.info(f"Out-of-core training complete (R2 {best_r2_score:.4f}), published artifacts version {version}")
+            sys.exit(0)
+
         # === 1. TELL THE "PREP CHEF" TO START ===
         logging.info("Running Data Ingestion...")
         ingestion_obj = DataIngestion()
         
         # The Prep Chef returns the file paths for the clean data
-        train_data_path, test_data_path = ingestion_obj.initiate_data_ingestion()
+        train_data_path, test_data_path = ingestion_obj.initiate_data_ingestion(
+            force=args.force or args.force_ingestion
+        )
         
         logging.info(f"Data ingestion complete. Train/Test files are at: {train_data_path}, {test_data_path}")
 
@@ -28,9 +65,11 @@ if __name__ == "__main__":
         transformation_obj = DataTransformation()
         
         
-        train_arr, test_arr, _ = transformation_obj.initiate_data_transformation(
+        # (X, y) pairs, memory-mapped from the saved .npy files
+        train_data, test_data, preprocessor_path = transformation_obj.initiate_data_transformation(
             train_path=train_data_path, 
-            test_path=test_data_path
+            test_path=test_data_path,
+            force=args.force or args.force_transformation
         )
         
         logging.info("Data transformation complete.")
@@ -41,11 +80,33 @@ if __name__ == "__main__":
         
         
         best_r2_score = trainer_obj.initiate_model_training(
-            train_array=train_arr,
-            test_array=test_arr
+            train_array=train_data,
+            test_array=test_data,
+            force=args.force or args.force_search
         )
         
         logging.info(f"Model training complete. Best model R2 score: {best_r2_score}")
+
+        # === 4. (OPTIONAL) PRECOMPUTE THE COMMON ORDERS ===
+        # Before publishing, so servers find the table with the new pair
+        if args.eta_table:
+            logging.info("Building the ETA lookup table...")
+            try:
+                EtaTableBuilder().initiate_eta_table_build()
+            except customException as e:
+                # The table is optional: a model whose table is out of
+                # tolerance is still published, and served without one
+                logging.error(f"ETA table not built, publishing without it: {e}")
+
+        # === 5. PUBLISH THE NEW MODEL/PREPROCESSOR PAIR ===
+        # Running servers pick up the new pair only once this manifest
+        # is written, so they never mix a new preprocessor with an old model.
+        version = write_artifact_manifest(
+            manifest_path=ArtifactStoreConfig().manifest_file_path,
+            model_path=trainer_obj.model_trainer_config.trained_model_file_path,
+            preprocessor_path=preprocessor_path
+        )
+        logging.info(f"Published artifacts version {version}")
         logging.info("Training pipeline finished successfully! 🚀")
 
     except Exception as e:
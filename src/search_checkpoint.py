@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import sqlite3
+import hashlib
+from datetime import datetime, timezone
+
+import dill
+import numpy as np
+
+from src.logger import logging
+from src.utils import file_sha256
+from src.model_search import THREAD_PARAMS
+
+# Bump to invalidate every stored fit at once
+CHECKPOINT_FORMAT_VERSION = 1
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cv_fits (
+    train_key TEXT, model_key TEXT, params TEXT, fold_key TEXT,
+    score REAL, wall_time REAL, cpu_time REAL, error TEXT, created_at TEXT,
+    PRIMARY KEY (train_key, model_key, params, fold_key)
+);
+CREATE TABLE IF NOT EXISTS refits (
+    data_key TEXT, model_key TEXT, params TEXT,
+    model BLOB, r2_score REAL, mae REAL, wall_time REAL, cpu_time REAL, created_at TEXT,
+    PRIMARY KEY (data_key, model_key, params)
+);
+'''
+
+
+def _hash_arrays(sha, *arrays):
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        sha.update(f"{array.dtype.str}{array.shape}".encode())
+        sha.update(memoryview(array).cast("B"))
+    return sha
+
+
+def _params_key(params):
+    return json.dumps(params, sort_keys=True, default=repr)
+
+
+class SearchCheckpoint:
+    '''
+    On-disk record (sqlite) of the finished work of a hyperparameter search,
+    so a search that dies halfway resumes instead of starting over.
+
+    Every CV fit is stored under
+      * the train data key: sha256 of X_train/y_train, the search code
+        (src/model_search.py) and CHECKPOINT_FORMAT_VERSION
+      * the model key: estimator class, library version and its
+        non-searched parameters (thread counts excluded, they are pinned)
+      * the candidate's parameters (JSON, sorted keys)
+      * the fold key: sha1 of the fold's train/validation row indices, so
+        grid, staged and halving searches (which fit on subsets of the
+        folds) only share fits that really are the same
+    with its score, fit times and error. The refit of each model's best
+    candidate is stored the same way (keyed on train AND test data) with
+    the fitted estimator itself, pickled with dill.
+
+    model_search looks fits up before scheduling them and stores each
+    result as soon as it comes back from the pool. `stats` counts the
+    reused and newly computed fits per model for the summary.
+    '''
+
+    def __init__(self, path, X_train, y_train, X_test, y_test, models, reuse=True):
+        self.path = path
+        # reuse=False recomputes everything (the results are still stored)
+        self.reuse = reuse
+
+        sha = hashlib.sha256(f"{CHECKPOINT_FORMAT_VERSION}:".encode())
+        sha.update(file_sha256(sys.modules["src.model_search"].__file__).encode())
+        self.train_key = _hash_arrays(sha, X_train, y_train).hexdigest()
+        self.data_key = _hash_arrays(hashlib.sha256(self.train_key.encode()), X_test, y_test).hexdigest()
+        self.model_keys = {name: self._model_key(estimator) for name, estimator in models.items()}
+        self.stats = {
+            name: {"reused_fits": 0, "new_fits": 0, "reused_refits": 0, "new_refits": 0, "reused_seconds": 0.0}
+            for name in models
+        }
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(_SCHEMA)
+        stored = self.connection.execute(
+            "SELECT COUNT(*) FROM cv_fits WHERE train_key = ?", (self.train_key,)
+        ).fetchone()[0]
+        logging.info(f"Search checkpoint {path}: {stored} stored CV fits for this data (key {self.train_key[:12]})")
+
+    @staticmethod
+    def _model_key(estimator):
+        kind = type(estimator)
+        library = sys.modules.get(kind.__module__.split(".")[0])
+        params = {
+            name: value for name, value in estimator.get_params(deep=False).items()
+            if name not in THREAD_PARAMS
+        }
+        return (f"{kind.__module__}.{kind.__qualname__}=={getattr(library, '__version__', '?')}:"
+                f"{_params_key(params)}")
+
+    @staticmethod
+    def fold_key(train_idx, val_idx):
+        return _hash_arrays(hashlib.sha1(), np.asarray(train_idx, dtype=np.int64),
+                            np.asarray(val_idx, dtype=np.int64)).hexdigest()
+
+    # === CV FITS ===
+
+    def load_fits(self, entries):
+        '''
+        Stored (score, wall, cpu, error) of every (model_name, params,
+        train_idx, val_idx) entry, or None if any of them is missing.
+        '''
+        if not self.reuse:
+            return None
+        stored = []
+        for model_name, params, train_idx, val_idx in entries:
+            row = self.connection.execute(
+                "SELECT score, wall_time, cpu_time, error FROM cv_fits "
+                "WHERE train_key = ? AND model_key = ? AND params = ? AND fold_key = ?",
+                (self.train_key, self.model_keys[model_name], _params_key(params), self.fold_key(train_idx, val_idx)),
+            ).fetchone()
+            if row is None:
+                return None
+            score, wall, cpu, error = row
+            # sqlite keeps NaN as NULL
+            stored.append((np.nan if score is None else score, wall, cpu, error))
+        return stored
+
+    def save_fits(self, entries, results):
+        now = datetime.now(timezone.utc).isoformat()
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO cv_fits VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (self.train_key, self.model_keys[model_name], _params_key(params), self.fold_key(train_idx, val_idx),
+                 None if np.isnan(score) else float(score), wall, cpu, error, now)
+                for (model_name, params, train_idx, val_idx), (score, wall, cpu, error) in zip(entries, results)
+            ],
+        )
+        self.connection.commit()
+
+    # === REFITS OF THE BEST CANDIDATES ===
+
+    def load_refit(self, model_name, params):
+        '''
+        Stored (model, r2, mae, wall, cpu) of the refit, or None.
+        '''
+        if not self.reuse:
+            return None
+        row = self.connection.execute(
+            "SELECT model, r2_score, mae, wall_time, cpu_time FROM refits "
+            "WHERE data_key = ? AND model_key = ? AND params = ?",
+            (self.data_key, self.model_keys[model_name], _params_key(params)),
+        ).fetchone()
+        if row is None:
+            return None
+        return (dill.loads(row[0]),) + tuple(row[1:])
+
+    def save_refit(self, model_name, params, result):
+        model, r2, mae, wall, cpu = result
+        self.connection.execute(
+            "INSERT OR REPLACE INTO refits VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (self.data_key, self.model_keys[model_name], _params_key(params), dill.dumps(model),
+             float(r2), float(mae), wall, cpu, datetime.now(timezone.utc).isoformat()),
+        )
+        self.connection.commit()
+
+    # === SUMMARY ===
+
+    def summary(self):
+        '''
+        Logs, per model and in total, how many fits were reused from the
+        checkpoint and how many were computed in this run. Returns the totals.
+        '''
+        totals = {key: sum(stats[key] for stats in self.stats.values()) for key in
+                  ("reused_fits", "new_fits", "reused_refits", "new_refits", "reused_seconds")}
+        for name, stats in self.stats.items():
+            logging.info(
+                f"{name}: {stats['reused_fits']} CV fits reused, {stats['new_fits']} new; "
+                f"refit {'reused' if stats['reused_refits'] else 'new'}"
+            )
+        logging.info(
+            f"Search checkpoint: reused {totals['reused_fits']} CV fits and {totals['reused_refits']} refits "
+            f"({totals['reused_seconds']:.1f}s of fit time), computed {totals['new_fits']} CV fits "
+            f"and {totals['new_refits']} refits"
+        )
+        return totals
+
+    def close(self):
+        self.connection.close()
@@ -1,13 +1,19 @@
 import os
 import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
 import dill
+import numpy as np
 
 from src.logger import logging
 from src.exception import customException
 
 from math import radians,sin,cos,atan2,sqrt
-from sklearn.metrics import r2_score, mean_absolute_error
-from sklearn.model_selection import GridSearchCV
+# The array versions live with the rest of the feature engineering
+from src.features import Haversine_distance_vectorized, get_part_of_day_vectorized
 
 def Haversine_distance(lat1,long1,lat2,long2):
     R=6371
@@ -28,68 +34,228 @@ def get_part_of_day(hour):
         return 'Evening'
     else:
         return 'Night'
-    
 
-def evaluate_model(X_train, y_train, X_test, y_test, models, param_grid):
-    
+def evaluate_model(X_train, y_train, X_test, y_test, models, param_grid, n_jobs=-1, cv=3,
+                   strategy="grid", measure_serving=True, checkpoint_path=None, reuse_checkpoint=True,
+                   **strategy_options):
+    '''
+    Tunes every model on its grid with `cv`-fold CV and scores the best
+    candidate of each on the test set.
+
+    All candidate fits of all models share one process pool of `n_jobs`
+    single-threaded workers (-1 = every core), see src/model_search.py.
+    `strategy` is "grid" (exhaustive), "staged" (exhaustive, but one fit
+    per tree-ensemble candidate scores all its n_estimators values) or
+    "halving" (successive halving; `strategy_options` go to
+    model_search.halving_search).
+    Returns (report, best_models); report[name] has r2_score, mae,
+    best_params plus fit_wall_time / fit_cpu_time (seconds summed over all
+    of that model's fits) and n_fits. With `measure_serving` it also has
+    single_row_p50_ms / single_row_p99_ms, batch_1k_ms, artifact_size_bytes
+    and load_time_ms (model_search.measure_serving_cost).
+
+    With `checkpoint_path`, every finished CV fit and refit is stored in that
+    sqlite file (search_checkpoint.SearchCheckpoint) and reused by the next
+    run on the same data, so an interrupted search only fits what is
+    missing (`reuse_checkpoint=False` refits everything). report[name] then
+    also has reused_fits and new_fits.
+    '''
     try:
-        report = {}
-        best_models = {}  
-        logging.info("Starting model evaluation with GridSearchCV...")
+        from src.model_search import grid_search, halving_search, staged_search, add_serving_costs
 
-        for model_name, model in models.items():
-            logging.info(f"Tuning model: {model_name}")
-            
-            
-            model_params = param_grid.get(model_name, {})
+        searches = {"grid": grid_search, "halving": halving_search, "staged": staged_search}
+        if strategy not in searches:
+            raise ValueError(f"Unknown search strategy {strategy!r}, expected one of {list(searches)}")
 
-            
-            gs = GridSearchCV(
-                estimator=model,
-                param_grid=model_params,
-                cv=3,      
-                 
-                scoring='r2'
-            )
+        checkpoint = None
+        if checkpoint_path is not None:
+            from src.search_checkpoint import SearchCheckpoint
+            checkpoint = SearchCheckpoint(checkpoint_path, X_train, y_train, X_test, y_test, models,
+                                          reuse=reuse_checkpoint)
 
-            
-            gs.fit(X_train, y_train)
+        logging.info(f"Starting model evaluation with the {strategy} search...")
+        try:
+            report, best_models = searches[strategy](
+                X_train, y_train, X_test, y_test,
+                models=models, param_grid=param_grid, n_jobs=n_jobs, cv=cv, checkpoint=checkpoint,
+                **strategy_options
+            )
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
 
-            
-            best_model_from_grid = gs.best_estimator_
-            
-            # Store this best model
-            best_models[model_name] = best_model_from_grid
-            
-            # --- Now, evaluate this best model ---
-            y_test_pred = best_model_from_grid.predict(X_test)
-            test_model_r2 = r2_score(y_test, y_test_pred)
-            test_model_mae = mean_absolute_error(y_test, y_test_pred)
-            
-            
-            report[model_name] = {
-                'r2_score': test_model_r2,
-                'mae': test_model_mae,
-                'best_params': gs.best_params_  
-            }
-            
-            logging.info(f"Finished tuning {model_name}. Best R2: {test_model_r2:.4f}")
+        if checkpoint is not None:
+            checkpoint.summary()
+            for name, stats in checkpoint.stats.items():
+                report[name]['reused_fits'] = stats['reused_fits'] + stats['reused_refits']
+                report[name]['new_fits'] = stats['new_fits'] + stats['new_refits']
 
-        return report, best_models  
+        if measure_serving:
+            logging.info("Measuring serving latency, artifact size and load time...")
+            add_serving_costs(report, best_models, X_test)
+        return report, best_models
         
     except Exception as e:
         raise customException(e)
     
+def write_frame(df, file_path):
+    '''
+    Writes a DataFrame as CSV, Parquet or Feather, picked by file extension.
+    '''
+    try:
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        extension = os.path.splitext(file_path)[1]
+        if extension == ".parquet":
+            df.to_parquet(file_path, index=False)
+        elif extension == ".feather":
+            df.reset_index(drop=True).to_feather(file_path)
+        else:
+            df.to_csv(file_path, index=False, header=True)
+
+    except Exception as e:
+        raise customException(e)
+
+def read_frame(file_path, columns=None, csv_dtypes=None):
+    '''
+    Reads a DataFrame written by write_frame (format picked by extension).
+    `csv_dtypes` is passed to pd.read_csv (Parquet/Feather keep their dtypes).
+    '''
+    try:
+        import pandas as pd
+
+        extension = os.path.splitext(file_path)[1]
+        if extension == ".parquet":
+            return pd.read_parquet(file_path, columns=columns)
+        if extension == ".feather":
+            return pd.read_feather(file_path, columns=columns)
+        return pd.read_csv(file_path, usecols=columns, dtype=csv_dtypes)
+
+    except Exception as e:
+        raise customException(e)
+
+def save_matrix(file_path, matrix):
+    '''
+    Saves a feature matrix or target vector: dense arrays as .npy,
+    scipy sparse matrices as CSR in .npz.
+    '''
+    try:
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        if file_path.endswith(".npz"):
+            import scipy.sparse
+
+            scipy.sparse.save_npz(file_path, scipy.sparse.csr_matrix(matrix), compressed=False)
+        else:
+            np.save(file_path, np.asarray(matrix))
+
+    except Exception as e:
+        raise customException(e)
+
+def load_matrix(file_path, mmap=True):
+    '''
+    Loads a matrix saved by save_matrix. Dense .npy files are memory-mapped
+    read-only by default, so nothing is copied into RAM up front.
+    '''
+    try:
+        if file_path.endswith(".npz"):
+            import scipy.sparse
+
+            return scipy.sparse.load_npz(file_path)
+        return np.load(file_path, mmap_mode="r" if mmap else None)
+
+    except Exception as e:
+        raise customException(e)
+
+def replace_file(tmp_path, file_path):
+    '''
+    Renames a finished temp file over `file_path`. mkstemp creates files
+    as 0600; they get the mode open() would have given them (0666 minus
+    the umask) first, so a server running as another user can read them.
+    '''
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(tmp_path, 0o666 & ~umask)
+    os.replace(tmp_path, file_path)
+
 def save_object(file_path,obj):
     try:
         dir_path = os.path.dirname(file_path)
         os.makedirs(dir_path, exist_ok=True)
         
-        with open(file_path, "wb") as file_obj:
-            dill.dump(obj, file_obj)
+        # Write to a temp file and rename it, so a reader (e.g. the serving
+        # ArtifactStore) never sees a half-written pickle.
+        fd, tmp_path = tempfile.mkstemp(dir=dir_path or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file_obj:
+                dill.dump(obj, file_obj)
+            replace_file(tmp_path, file_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
             
     except Exception as e:
         raise customException(e)
+
+def file_sha256(file_path):
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as file_obj:
+        for block in iter(lambda: file_obj.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+def write_artifact_manifest(manifest_path, model_path, preprocessor_path, keep_versions=3):
+    '''
+    Publishes a model/preprocessor pair for serving.
+    Must be called after BOTH files are saved. The pair is copied into
+    versions/<version>/ next to the manifest and the manifest points at
+    those copies, so the next training run can overwrite model_path and
+    preprocessor_path while servers (and workers starting meanwhile) keep
+    reading the published pair. Only the newest `keep_versions` versions
+    are kept.
+    '''
+    try:
+        model_sha256 = file_sha256(model_path)
+        preprocessor_sha256 = file_sha256(preprocessor_path)
+        version = hashlib.sha256((model_sha256 + preprocessor_sha256).encode()).hexdigest()[:12]
+
+        dir_path = os.path.dirname(manifest_path)
+        version_dir = os.path.join(dir_path, "versions", version)
+        os.makedirs(version_dir, exist_ok=True)
+        published = {}
+        for name, source_path in (("model", model_path), ("preprocessor", preprocessor_path)):
+            target_path = os.path.join(version_dir, os.path.basename(source_path))
+            if not os.path.exists(target_path):
+                fd, tmp_path = tempfile.mkstemp(dir=version_dir, suffix=".tmp")
+                os.close(fd)
+                shutil.copyfile(source_path, tmp_path)
+                replace_file(tmp_path, target_path)
+            published[name] = target_path
+
+        manifest = {
+            "model": {"path": published["model"], "sha256": model_sha256},
+            "preprocessor": {"path": published["preprocessor"], "sha256": preprocessor_sha256},
+            "created_at": time.time(),
+            "version": version,
+        }
+
+        fd, tmp_path = tempfile.mkstemp(dir=dir_path or ".", suffix=".tmp")
+        with os.fdopen(fd, "w") as file_obj:
+            json.dump(manifest, file_obj, indent=2)
+        replace_file(tmp_path, manifest_path)
+
+        # Older versions go last, once nothing new points at them. A worker
+        # still reading one keeps its open files (unlink, not truncate).
+        versions_dir = os.path.join(dir_path, "versions")
+        old_versions = sorted(
+            (entry for entry in os.listdir(versions_dir) if entry != version),
+            key=lambda entry: os.path.getmtime(os.path.join(versions_dir, entry)),
+        )
+        for entry in old_versions[:max(0, len(old_versions) - (keep_versions - 1))]:
+            shutil.rmtree(os.path.join(versions_dir, entry), ignore_errors=True)
+
+        return version
+
+    except Exception as e:
+        raise customException(e)
     
 def load_object(file_path):
     try:
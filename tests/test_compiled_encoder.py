@@ -0,0 +1,56 @@
+'''
+CompiledEncoder reproduces the fitted preprocessor exactly, on the orders
+of artifacts/test.csv.
+'''
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.components.feature_columns import NUMERICAL_COLUMNS, CATEGORICAL_COLUMNS
+from src.pipeline.compiled_encoder import CompiledEncoder
+from src.utils import load_object
+
+TEST_DATA_PATH = "artifacts/test.csv"
+PREPROCESSOR_PATH = "artifacts/preprocessor.pkl"
+TARGET_COLUMN = "Delivery_Time_hour"
+
+
+@pytest.fixture(scope="module")
+def preprocessor():
+    return load_object(PREPROCESSOR_PATH)
+
+
+@pytest.fixture(scope="module")
+def features():
+    return pd.read_csv(TEST_DATA_PATH).drop(columns=[TARGET_COLUMN])
+
+
+def _expected(preprocessor, frame):
+    expected = preprocessor.transform(frame)
+    return expected.toarray() if hasattr(expected, "toarray") else np.asarray(expected)
+
+
+def test_encode_matches_transform(preprocessor, features):
+    encoder = CompiledEncoder.from_preprocessor(preprocessor)
+
+    np.testing.assert_array_equal(encoder.transform(features.to_dict("records")), _expected(preprocessor, features))
+
+
+def test_transform_arrays_matches_transform(preprocessor, features):
+    encoder = CompiledEncoder.from_preprocessor(preprocessor)
+    encoded = encoder.transform_arrays(
+        features[NUMERICAL_COLUMNS].to_numpy(dtype=np.float64), features[CATEGORICAL_COLUMNS].to_numpy(dtype=object),
+        NUMERICAL_COLUMNS, CATEGORICAL_COLUMNS,
+    )
+
+    np.testing.assert_array_equal(encoded, _expected(preprocessor, features))
+
+
+def test_missing_values_match_transform(preprocessor, features):
+    # Every column missing on some rows: the imputers' fill values
+    frame = features.head(200).copy()
+    for i, column in enumerate(NUMERICAL_COLUMNS + CATEGORICAL_COLUMNS):
+        frame.loc[frame.index[i::25], column] = np.nan
+    encoder = CompiledEncoder.from_preprocessor(preprocessor)
+
+    np.testing.assert_array_equal(encoder.transform(frame.to_dict("records")), _expected(preprocessor, frame))
@@ -0,0 +1,55 @@
+'''
+The vectorized feature functions (src.features) give the same values as
+the scalar versions in src.utils, on the orders of artifacts/test.csv.
+'''
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.features import Haversine_distance_vectorized, get_part_of_day_vectorized
+from src.utils import Haversine_distance, get_part_of_day
+
+TEST_DATA_PATH = "artifacts/test.csv"
+
+
+@pytest.fixture(scope="module")
+def test_df():
+    return pd.read_csv(TEST_DATA_PATH)
+
+
+def test_part_of_day_matches_scalar(test_df):
+    hours = test_df['Order_Hour'].to_numpy()
+    expected = [get_part_of_day(hour) for hour in hours]
+
+    assert list(get_part_of_day_vectorized(hours)) == expected
+    # The column was written by the scalar version at ingestion
+    assert list(get_part_of_day_vectorized(hours)) == list(test_df['part_of_day'])
+
+
+def test_part_of_day_edges_and_nan():
+    hours = np.array([0, 4.99, 5, 11.99, 12, 16.99, 17, 20.99, 21, 23, np.nan])
+    expected = [get_part_of_day(hour) for hour in hours]
+
+    assert list(get_part_of_day_vectorized(hours)) == expected
+
+
+def test_haversine_matches_scalar(test_df):
+    # The split has no coordinates: place each drop Distance_km away from a
+    # store at a random bearing, so the distances are the real ones
+    rng = np.random.default_rng(0)
+    n_rows = len(test_df)
+    store_lat = rng.uniform(10, 30, n_rows)
+    store_long = rng.uniform(70, 90, n_rows)
+    bearing = rng.uniform(0, 2 * np.pi, n_rows)
+    angle = test_df['Distance_km'].to_numpy() / 6371
+    lat1 = np.radians(store_lat)
+    lat2 = np.arcsin(np.sin(lat1) * np.cos(angle) + np.cos(lat1) * np.sin(angle) * np.cos(bearing))
+    drop_lat = np.degrees(lat2)
+    drop_long = store_long + np.degrees(np.arctan2(np.sin(bearing) * np.sin(angle) * np.cos(lat1),
+                                                   np.cos(angle) - np.sin(lat1) * np.sin(lat2)))
+
+    vectorized = Haversine_distance_vectorized(store_lat, store_long, drop_lat, drop_long)
+    scalar = [Haversine_distance(*order) for order in zip(store_lat, store_long, drop_lat, drop_long)]
+
+    np.testing.assert_allclose(vectorized, scalar, rtol=1e-12, atol=1e-12)
+    np.testing.assert_allclose(vectorized, test_df['Distance_km'], rtol=1e-9, atol=1e-9)
@@ -0,0 +1,67 @@
+'''
+FlatTreeEnsemble predicts within 1e-6 of model.predict, on the orders of
+artifacts/test.csv: the committed model, and small models of every
+other supported kind fitted on the same rows.
+'''
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import AdaBoostRegressor, GradientBoostingRegressor, RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+
+from src.pipeline.flat_trees import FlatTreeEnsemble
+from src.utils import load_object
+
+TEST_DATA_PATH = "artifacts/test.csv"
+MODEL_PATH = "artifacts/best_model.pkl"
+PREPROCESSOR_PATH = "artifacts/preprocessor.pkl"
+TARGET_COLUMN = "Delivery_Time_hour"
+TOLERANCE = 1e-6
+
+
+@pytest.fixture(scope="module")
+def test_arrays():
+    test_df = pd.read_csv(TEST_DATA_PATH)
+    X = load_object(PREPROCESSOR_PATH).transform(test_df.drop(columns=[TARGET_COLUMN]))
+    X = X.toarray() if hasattr(X, "toarray") else np.asarray(X)
+    return X, test_df[TARGET_COLUMN].to_numpy()
+
+
+def _assert_close(model, X, tmp_path):
+    flat_model = FlatTreeEnsemble.from_model(model)
+    expected = model.predict(X)
+
+    np.testing.assert_allclose(flat_model.predict(X), expected, rtol=0, atol=TOLERANCE)
+    # The exported arrays score the same
+    flat_model.save(str(tmp_path / "flat.npz"))
+    np.testing.assert_allclose(FlatTreeEnsemble.load(str(tmp_path / "flat.npz")).predict(X), expected,
+                               rtol=0, atol=TOLERANCE)
+
+
+def test_committed_model(test_arrays, tmp_path):
+    X, _ = test_arrays
+    _assert_close(load_object(MODEL_PATH), X, tmp_path)
+
+
+@pytest.mark.parametrize("make_model", [
+    lambda: DecisionTreeRegressor(max_depth=8, random_state=0),
+    lambda: RandomForestRegressor(n_estimators=10, max_depth=6, random_state=0),
+    lambda: GradientBoostingRegressor(n_estimators=20, max_depth=3, random_state=0),
+    lambda: AdaBoostRegressor(DecisionTreeRegressor(max_depth=3), n_estimators=10, random_state=0),
+], ids=["decision_tree", "random_forest", "gradient_boosting", "adaboost"])
+def test_sklearn_models(test_arrays, tmp_path, make_model):
+    X, y = test_arrays
+    _assert_close(make_model().fit(X, y), X, tmp_path)
+
+
+def test_xgboost_model(test_arrays, tmp_path):
+    xgboost = pytest.importorskip("xgboost")
+    X, y = test_arrays
+    _assert_close(xgboost.XGBRegressor(n_estimators=20, max_depth=4, random_state=0).fit(X, y), X, tmp_path)
+
+
+def test_catboost_model(test_arrays, tmp_path):
+    catboost = pytest.importorskip("catboost")
+    X, y = test_arrays
+    model = catboost.CatBoostRegressor(iterations=20, depth=4, random_seed=0, verbose=False, allow_writing_files=False)
+    _assert_close(model.fit(X, y), X, tmp_path)